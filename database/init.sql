@@ -1,12 +1,115 @@
 -- database/init.sql
+-- Partitioned by day on timestamp: retention drops whole partitions (see app/maintenance.py)
 CREATE TABLE IF NOT EXISTS image_result (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     original_filename VARCHAR(255),
     image_path VARCHAR(255),
     processed_image_path VARCHAR(255),
-    yolo_detections TEXT,
+    yolo_detections JSONB,       -- [{"bbox": [x1, y1, x2, y2], "confidence": c, "class": name}, ...]
     cnn_probability FLOAT,
     processing_time FLOAT,
-    timestamp TIMESTAMP WITHOUT TIME ZONE DEFAULT (NOW() AT TIME ZONE 'utc'),
-    model_type VARCHAR(50)
-);
\ No newline at end of file
+    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc'),
+    model_type VARCHAR(50),
+    content_hash CHAR(64),       -- SHA-256 of the uploaded bytes
+    model_version VARCHAR(100),  -- Weights that produced the result (see app/inference.py)
+    status VARCHAR(20) NOT NULL DEFAULT 'done',  -- pending/running/done/failed (async jobs, see app/jobs.py)
+    error TEXT,
+    callback_url TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_at TIMESTAMP WITHOUT TIME ZONE,
+    max_confidence REAL,         -- Highest detection confidence, NULL without detections (set by the app)
+    PRIMARY KEY (id, timestamp)  -- Must include the partition key
+) PARTITION BY RANGE (timestamp);
+
+-- Resolves duplicate uploads for the result cache
+CREATE INDEX IF NOT EXISTS idx_image_result_content_hash
+    ON image_result (content_hash, model_type, model_version);
+
+-- Async job queue: workers only scan unfinished rows
+CREATE INDEX IF NOT EXISTS idx_image_result_unfinished
+    ON image_result (id) WHERE status IN ('pending', 'running');
+
+-- Time-window and per-model queries and keyset pagination on (timestamp, id) (see app/queries.py)
+CREATE INDEX IF NOT EXISTS idx_image_result_timestamp_id
+    ON image_result (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_image_result_model_type_timestamp_id
+    ON image_result (model_type, timestamp, id);
+
+-- "Frames with confidence > X": only rows that have detections
+CREATE INDEX IF NOT EXISTS idx_image_result_max_confidence
+    ON image_result (max_confidence, timestamp) WHERE max_confidence IS NOT NULL;
+
+-- Containment queries on detections, e.g. yolo_detections @> '[{"class": "smoke"}]'
+CREATE INDEX IF NOT EXISTS idx_image_result_detections
+    ON image_result USING GIN (yolo_detections jsonb_path_ops);
+
+-- Daily partitions image_result_pYYYYMMDD; rows outside them land in the default partition
+CREATE OR REPLACE FUNCTION image_result_ensure_partitions(first_day DATE, last_day DATE) RETURNS INTEGER AS $$
+DECLARE
+    day DATE := first_day;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE day <= last_day LOOP
+        partition_name := 'image_result_p' || to_char(day, 'YYYYMMDD');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF image_result FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, day, day + 1);
+            created := created + 1;
+        END IF;
+        day := day + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TABLE IF NOT EXISTS image_result_default PARTITION OF image_result DEFAULT;
+SELECT image_result_ensure_partitions((NOW() AT TIME ZONE 'utc')::date - 1, (NOW() AT TIME ZONE 'utc')::date + 7);
+
+-- Hourly per-model rollups, kept after the raw partitions are dropped
+CREATE TABLE IF NOT EXISTS image_result_hourly (
+    hour TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    model_type VARCHAR(50) NOT NULL,
+    frames INTEGER NOT NULL,                  -- Finished results
+    failed INTEGER NOT NULL,                  -- Failed async jobs
+    frames_with_detections INTEGER NOT NULL,
+    mean_cnn_probability FLOAT,               -- CNN rows only
+    max_confidence REAL,                      -- Highest detection confidence in the hour
+    PRIMARY KEY (hour, model_type)
+);
+
+-- Video clips (see app/video.py): one summary row per clip, per-frame results in video_frame
+CREATE TABLE IF NOT EXISTS video_clip (
+    id SERIAL PRIMARY KEY,
+    original_filename VARCHAR(255),
+    video_path VARCHAR(255),                  -- Blob key of the stored clip
+    content_hash CHAR(64),
+    model_type VARCHAR(50) NOT NULL,
+    model_version VARCHAR(100),
+    frame_stride INTEGER NOT NULL,            -- Every Nth frame was scored
+    fps REAL,
+    width INTEGER,
+    height INTEGER,
+    duration_seconds REAL,
+    frames_decoded INTEGER NOT NULL,          -- Frames read from the stream, scored or skipped
+    frames_scored INTEGER NOT NULL,
+    positive_frames INTEGER NOT NULL,         -- YOLO: frames with detections; CNN: probability >= threshold
+    first_positive_seconds REAL,              -- Clip time of the first positive frame
+    max_confidence REAL,                      -- Highest detection confidence in the clip
+    max_cnn_probability FLOAT,
+    mean_cnn_probability FLOAT,
+    processing_time FLOAT,
+    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
+
+CREATE INDEX IF NOT EXISTS idx_video_clip_timestamp_id ON video_clip (timestamp, id);
+
+CREATE TABLE IF NOT EXISTS video_frame (
+    clip_id INTEGER NOT NULL REFERENCES video_clip (id) ON DELETE CASCADE,
+    frame_index INTEGER NOT NULL,             -- Index in the decoded stream
+    time_seconds REAL,
+    yolo_detections JSONB,
+    cnn_probability FLOAT,
+    max_confidence REAL,
+    PRIMARY KEY (clip_id, frame_index)
+);
@@ -0,0 +1,7 @@
+-- database/migrations/001_result_cache_columns.sql
+-- Content-hash result cache: lets duplicate uploads be resolved from the database.
+ALTER TABLE image_result ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+ALTER TABLE image_result ADD COLUMN IF NOT EXISTS model_version VARCHAR(100);
+
+CREATE INDEX IF NOT EXISTS idx_image_result_content_hash
+    ON image_result (content_hash, model_type, model_version);
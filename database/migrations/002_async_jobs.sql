@@ -0,0 +1,10 @@
+-- database/migrations/002_async_jobs.sql
+-- Async /predict jobs: image_result rows double as the job queue.
+ALTER TABLE image_result ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'done';
+ALTER TABLE image_result ADD COLUMN IF NOT EXISTS error TEXT;
+ALTER TABLE image_result ADD COLUMN IF NOT EXISTS callback_url TEXT;
+ALTER TABLE image_result ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE image_result ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP WITHOUT TIME ZONE;
+
+CREATE INDEX IF NOT EXISTS idx_image_result_unfinished
+    ON image_result (id) WHERE status IN ('pending', 'running');
@@ -0,0 +1,28 @@
+-- database/migrations/003_jsonb_detections.sql
+-- Detections as JSONB plus an indexed max confidence, so detection queries filter in SQL.
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_name = 'image_result' AND column_name = 'yolo_detections') <> 'jsonb' THEN
+        ALTER TABLE image_result
+            ALTER COLUMN yolo_detections TYPE JSONB
+            USING COALESCE(NULLIF(yolo_detections, ''), '[]')::jsonb;
+    END IF;
+END $$;
+
+ALTER TABLE image_result ADD COLUMN IF NOT EXISTS max_confidence REAL;
+
+UPDATE image_result
+SET max_confidence = (
+    SELECT MAX((d ->> 'confidence')::real) FROM jsonb_array_elements(yolo_detections) AS d
+)
+WHERE max_confidence IS NULL AND jsonb_typeof(yolo_detections) = 'array' AND yolo_detections <> '[]'::jsonb;
+
+CREATE INDEX IF NOT EXISTS idx_image_result_timestamp
+    ON image_result (timestamp);
+CREATE INDEX IF NOT EXISTS idx_image_result_model_type_timestamp
+    ON image_result (model_type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_image_result_max_confidence
+    ON image_result (max_confidence, timestamp) WHERE max_confidence IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_image_result_detections
+    ON image_result USING GIN (yolo_detections jsonb_path_ops);
@@ -0,0 +1,9 @@
+-- database/migrations/004_results_keyset_indexes.sql
+-- /results keyset pagination orders by (timestamp, id); these supersede the timestamp-only indexes from 003.
+CREATE INDEX IF NOT EXISTS idx_image_result_timestamp_id
+    ON image_result (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_image_result_model_type_timestamp_id
+    ON image_result (model_type, timestamp, id);
+
+DROP INDEX IF EXISTS idx_image_result_timestamp;
+DROP INDEX IF EXISTS idx_image_result_model_type_timestamp;
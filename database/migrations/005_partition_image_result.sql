@@ -0,0 +1,73 @@
+-- database/migrations/005_partition_image_result.sql
+-- Converts image_result into a table range-partitioned by day on timestamp, adds the
+-- partition helper and the hourly rollup table. Copies existing rows; run during a
+-- maintenance window. A no-op for the conversion if image_result is already partitioned.
+CREATE OR REPLACE FUNCTION image_result_ensure_partitions(first_day DATE, last_day DATE) RETURNS INTEGER AS $$
+DECLARE
+    day DATE := first_day;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE day <= last_day LOOP
+        partition_name := 'image_result_p' || to_char(day, 'YYYYMMDD');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format('CREATE TABLE %I PARTITION OF image_result FOR VALUES FROM (%L) TO (%L)',
+                           partition_name, day, day + 1);
+            created := created + 1;
+        END IF;
+        day := day + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    first_day DATE;
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'image_result'::regclass) THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE image_result RENAME TO image_result_unpartitioned;
+    ALTER TABLE image_result_unpartitioned RENAME CONSTRAINT image_result_pkey TO image_result_unpartitioned_pkey;
+    UPDATE image_result_unpartitioned SET timestamp = (NOW() AT TIME ZONE 'utc') WHERE timestamp IS NULL;
+
+    -- Same columns and defaults (including the id sequence), partitioned on timestamp
+    CREATE TABLE image_result (LIKE image_result_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (timestamp);
+    ALTER TABLE image_result ALTER COLUMN timestamp SET NOT NULL;
+    ALTER TABLE image_result ADD PRIMARY KEY (id, timestamp);
+    ALTER SEQUENCE image_result_id_seq OWNED BY image_result.id;
+
+    CREATE TABLE image_result_default PARTITION OF image_result DEFAULT;
+    SELECT COALESCE(MIN(timestamp)::date, (NOW() AT TIME ZONE 'utc')::date) INTO first_day FROM image_result_unpartitioned;
+    PERFORM image_result_ensure_partitions(first_day, (NOW() AT TIME ZONE 'utc')::date + 7);
+
+    INSERT INTO image_result SELECT * FROM image_result_unpartitioned;
+    DROP TABLE image_result_unpartitioned;
+END $$;
+
+-- Recreated on the partitioned parent (cascade to every partition)
+CREATE INDEX IF NOT EXISTS idx_image_result_content_hash
+    ON image_result (content_hash, model_type, model_version);
+CREATE INDEX IF NOT EXISTS idx_image_result_unfinished
+    ON image_result (id) WHERE status IN ('pending', 'running');
+CREATE INDEX IF NOT EXISTS idx_image_result_timestamp_id
+    ON image_result (timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_image_result_model_type_timestamp_id
+    ON image_result (model_type, timestamp, id);
+CREATE INDEX IF NOT EXISTS idx_image_result_max_confidence
+    ON image_result (max_confidence, timestamp) WHERE max_confidence IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_image_result_detections
+    ON image_result USING GIN (yolo_detections jsonb_path_ops);
+
+CREATE TABLE IF NOT EXISTS image_result_hourly (
+    hour TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    model_type VARCHAR(50) NOT NULL,
+    frames INTEGER NOT NULL,
+    failed INTEGER NOT NULL,
+    frames_with_detections INTEGER NOT NULL,
+    mean_cnn_probability FLOAT,
+    max_confidence REAL,
+    PRIMARY KEY (hour, model_type)
+);
@@ -0,0 +1,37 @@
+-- database/migrations/006_video_clips.sql
+-- Video clip ingestion (see machine_learning/app/video.py): one summary row per clip
+-- plus the sampled frames' results. Idempotent.
+CREATE TABLE IF NOT EXISTS video_clip (
+    id SERIAL PRIMARY KEY,
+    original_filename VARCHAR(255),
+    video_path VARCHAR(255),                  -- Blob key of the stored clip
+    content_hash CHAR(64),
+    model_type VARCHAR(50) NOT NULL,
+    model_version VARCHAR(100),
+    frame_stride INTEGER NOT NULL,            -- Every Nth frame was scored
+    fps REAL,
+    width INTEGER,
+    height INTEGER,
+    duration_seconds REAL,
+    frames_decoded INTEGER NOT NULL,          -- Frames read from the stream, scored or skipped
+    frames_scored INTEGER NOT NULL,
+    positive_frames INTEGER NOT NULL,         -- YOLO: frames with detections; CNN: probability >= threshold
+    first_positive_seconds REAL,              -- Clip time of the first positive frame
+    max_confidence REAL,                      -- Highest detection confidence in the clip
+    max_cnn_probability FLOAT,
+    mean_cnn_probability FLOAT,
+    processing_time FLOAT,
+    timestamp TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (NOW() AT TIME ZONE 'utc')
+);
+
+CREATE INDEX IF NOT EXISTS idx_video_clip_timestamp_id ON video_clip (timestamp, id);
+
+CREATE TABLE IF NOT EXISTS video_frame (
+    clip_id INTEGER NOT NULL REFERENCES video_clip (id) ON DELETE CASCADE,
+    frame_index INTEGER NOT NULL,             -- Index in the decoded stream
+    time_seconds REAL,
+    yolo_detections JSONB,
+    cnn_probability FLOAT,
+    max_confidence REAL,
+    PRIMARY KEY (clip_id, frame_index)
+);
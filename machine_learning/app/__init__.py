@@ -7,8 +7,29 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
     CORS(app)
 
+    # Connection pool is created up front so its size and timeouts apply from the first request
+    from app.db import init_db_pool
+    init_db_pool(app)
+
     from app.api import bp as api_bp
     app.register_blueprint(api_bp)
 
+    # Load models from local files and warm them up before serving traffic
+    from app.inference import startup
+    startup()
+
+    # Background workers for mode=async /predict jobs
+    from app.jobs import start_job_workers
+    start_job_workers(app)
+
+    # Optional batched write-behind of image_result rows
+    from app.api import INSERT_RESULT_COLUMNS
+    from app.write_behind import start_result_writer
+    start_result_writer(app, INSERT_RESULT_COLUMNS)
+
+    # Daily partitions, hourly rollups and retention
+    from app.maintenance import start_maintenance
+    start_maintenance(app)
+
 
     return app
\ No newline at end of file
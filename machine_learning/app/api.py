@@ -1,20 +1,33 @@
 # app/api.py
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, current_app, url_for, g
 import time
 import base64
-import io
 import os
-import uuid
 import logging
 import json
+import tarfile
+import tempfile
+import zipfile
 from datetime import datetime
 
-from PIL import Image, ImageDraw
 from config import Config  # Assuming you have a Config class
-from app.db import get_db_connection, close_db_connection  # Import from db.py
-from models.yolo import predict_with_yolo, load_yolo_model
-from models.cnn import predict_with_cnn, load_cnn_model, preprocess_image_for_cnn
-from preprocessing import preprocess_image_for_yolo
+from app.db import get_db_connection, close_db_connection, register_statement, execute_prepared, pool_stats  # Import from db.py
+from psycopg2.extras import execute_values
+from app.cache import result_cache
+from app.dedup import frame_deduplicator
+from app.inference import readiness, model_version, process_pool_stats, detect_yolo_batch, predict_cnn_batch
+from preprocessing import (preprocess_image_for_yolo, preprocess_batch_for_cnn, yolo_frame_mapping, CNN_INPUT_SIZE,
+                           YOLO_INPUT_SIZE)
+from app.utils import UploadedImage, UploadError, max_detection_confidence
+from app.storage import store_upload, ref_exists, storage_stats
+from app.batching import batching_stats
+from app.pipeline import score_upload, decoded_for, PredictionError
+from app.rendering import result_image, result_etag, render_cache
+from app.jobs import submit_job, callback_allowed, job_stats
+from app import write_behind
+from app.queries import find_detections, list_results
+from app.maintenance import maintenance_stats
+from app.video import VideoError, video_ingestor, video_extension, spool_video, store_video, save_clip, load_clip
 
 
 # Configure logging
@@ -22,34 +35,246 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 
 bp = Blueprint('api', __name__)
 
-# --- Helper Functions (Defined *within* api.py) ---
-def save_image(image_bytes, upload_folder, filename):
-    """Saves an image to the specified folder and sets correct permissions."""
-
-    if not os.path.exists(upload_folder):
-        os.makedirs(upload_folder, exist_ok=True)  # Ensure directory exists
-
-    image_path = os.path.join(upload_folder, filename)
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+RESPONSE_MODES = {'base64', 'url', 'binary'}
+
+INSERT_RESULT_COLUMNS = "original_filename, image_path, processed_image_path, yolo_detections, cnn_probability, processing_time, timestamp, model_type, content_hash, model_version, max_confidence"
+
+# Hot statements, prepared once per pooled connection (see app/db.py)
+register_statement(
+    'insert_result',
+    f"INSERT INTO image_result ({INSERT_RESULT_COLUMNS}) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11) RETURNING id"
+)
+register_statement(
+    'select_result',
+    "SELECT id, original_filename, image_path, processed_image_path, yolo_detections, cnn_probability, "
+    "processing_time, timestamp, model_type, status, error FROM image_result WHERE id = $1"
+)
+register_statement(
+    'select_image_paths',
+    "SELECT processed_image_path, image_path, yolo_detections FROM image_result WHERE id = $1"
+)
 
+# --- Helper Functions (Defined *within* api.py) ---
+def allowed_image(filename):
+    """True if the filename has one of the accepted image extensions."""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+def insert_results(rows):
+    """Inserts image_result rows with a single multi-row INSERT and returns their ids in order.
+
+    Each row is a tuple matching INSERT_RESULT_COLUMNS. Raises on failure.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError('Failed to connect to database')
     try:
-        with open(image_path, 'wb') as f:  # Open in binary write mode
-            f.write(image_bytes)
+        cur = conn.cursor()
+        returned = execute_values(
+            cur,
+            f"INSERT INTO image_result ({INSERT_RESULT_COLUMNS}) VALUES %s RETURNING id",
+            rows,
+            page_size=max(len(rows), 1),
+            fetch=True,
+        )
+        conn.commit()
+        return [row[0] for row in returned]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db_connection(conn)
+
+def check_member_size(name, size):
+    """Oversized archive members are refused from the declared size, before reading them."""
+    if size > Config.MAX_UPLOAD_BYTES:
+        raise UploadError(f'{name}: image too large (max {Config.MAX_UPLOAD_BYTES} bytes)', 413)
+
+class BatchBudget:
+    """Image count and cumulative byte limits of one /predict/batch request, checked before each image is read."""
+
+    def __init__(self, max_images=None, max_bytes=None):
+        self.max_images = Config.BATCH_MAX_IMAGES if max_images is None else max_images
+        self.max_bytes = Config.BATCH_MAX_BYTES if max_bytes is None else max_bytes
+        self.images = 0
+        self.bytes = 0
+
+    def take(self, name, size):
+        """Accounts for one more image of size bytes; raises UploadError (413) as soon as a limit is crossed."""
+        check_member_size(name, size)
+        self.images += 1
+        self.bytes += size
+        if self.images > self.max_images:
+            raise UploadError(f'Too many images (max {self.max_images})', 413)
+        if self.bytes > self.max_bytes:
+            raise UploadError(f'Batch too large (max {self.max_bytes} bytes uncompressed)', 413)
+
+    def settle(self, declared, actual):
+        """Replaces a member's declared size with the bytes actually read (archive headers can lie)."""
+        self.bytes += actual - declared
+        if self.bytes > self.max_bytes:
+            raise UploadError(f'Batch too large (max {self.max_bytes} bytes uncompressed)', 413)
+
+def read_archive_member(stream, name, budget, declared_size):
+    """One archive member through UploadedImage.from_stream, like a request upload (None if not an image)."""
+    try:
+        with stream:
+            upload = UploadedImage.from_stream(stream, os.path.basename(name))
+    except UploadError as e:
+        if e.status != 400:
+            raise UploadError(f'{name}: {e.message}', e.status)
+        return None
+    try:
+        budget.settle(declared_size, upload.size)
+    except UploadError:
+        upload.close()
+        raise
+    return upload
+
+def spool_archive(stream, max_bytes, chunk_size=None):
+    """Copies a non-seekable archive body (zip needs to seek to its central directory) into a spooled
+    temp file in chunks; raises UploadError (413) as soon as it passes max_bytes.
+    """
+    chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+    spool = tempfile.SpooledTemporaryFile(max_size=Config.UPLOAD_SPOOL_MAX_MEMORY)
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadError(f'Archive too large (max {max_bytes} bytes)', 413)
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+def iter_archive_images(fileobj, content_type='', budget=None):
+    """Yields an UploadedImage for every accepted image inside a zip or tar stream.
+
+    Members are counted against budget (a BatchBudget) from their declared
+    size before they are read, so an oversized archive is refused without
+    decompressing the rest of it. A zip body that cannot seek is first
+    spooled, up to the budget's byte limit. Each member is then spooled, size- and
+    pixel-checked exactly like a request upload; members that turn out not
+    to be images are skipped.
+    """
+    budget = budget or BatchBudget()
+    if 'zip' in content_type or (fileobj.seekable() and zipfile.is_zipfile(fileobj)):
+        spooled = None if fileobj.seekable() else spool_archive(fileobj, budget.max_bytes)
+        try:
+            if spooled is not None:
+                fileobj = spooled
+            fileobj.seek(0)
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and allowed_image(info.filename):
+                        budget.take(info.filename, info.file_size)
+                        upload = read_archive_member(archive.open(info), info.filename, budget, info.file_size)
+                        if upload is not None:
+                            yield upload
+        finally:
+            if spooled is not None:
+                spooled.close()
+        return
+
+    if fileobj.seekable():
+        fileobj.seek(0)
+    # Stream mode: members are read sequentially without seeking
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile() and allowed_image(member.name):
+                budget.take(member.name, member.size)
+                upload = read_archive_member(archive.extractfile(member), member.name, budget, member.size)
+                if upload is not None:
+                    yield upload
+
+def track_upload(upload):
+    """Registers an upload to be closed when the request ends (see close_uploads)."""
+    g.setdefault('uploads', []).append(upload)
+    return upload
+
+@bp.teardown_request
+def close_uploads(exc):
+    """Releases the spooled files of every upload the request created."""
+    for upload in g.pop('uploads', ()):
+        upload.close()
+
+def collect_batch_images():
+    """Gathers UploadedImages from multipart 'images' files, an 'archive' file or a raw zip/tar body.
+
+    Multipart files are streamed and sniffed like /predict uploads; files that
+    are not images are skipped, oversized ones raise UploadError. Every image
+    counts against one BatchBudget, so BATCH_MAX_IMAGES and BATCH_MAX_BYTES
+    are enforced while reading rather than after.
+    """
+    budget = BatchBudget()
+    images = []
+    for image_file in request.files.getlist('images'):
+        if not image_file.filename:
+            continue
+        try:
+            upload = track_upload(UploadedImage.from_stream(image_file.stream, image_file.filename))
+        except UploadError as e:
+            if e.status != 400:
+                raise UploadError(f'{image_file.filename}: {e.message}', e.status)
+            continue
+        budget.take(image_file.filename, upload.size)
+        images.append(upload)
+
+    archive_file = request.files.get('archive')
+    if archive_file is not None:
+        images.extend(map(track_upload, iter_archive_images(archive_file.stream, archive_file.mimetype or '', budget)))
+    elif not request.files and request.mimetype in ('application/zip', 'application/x-tar', 'application/gzip', 'application/x-gzip'):
+        images.extend(map(track_upload, iter_archive_images(request.stream, request.mimetype, budget)))
+
+    return images
+
+def get_response_mode():
+    """Reads the requested response mode ('base64', 'url' or 'binary') from the form or query string."""
+    mode = (request.form.get('response') or request.args.get('response') or Config.DEFAULT_RESPONSE_MODE).lower()
+    return mode if mode in RESPONSE_MODES else None
+
+def image_response(data, etag):
+    """JPEG response with the validators /get_image clients revalidate against."""
+    response = current_app.response_class(data, mimetype='image/jpeg')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = Config.IMAGE_CACHE_MAX_AGE
+    return response
+
+def build_result_response(result_data, image_path, processed_image_path, mode):
+    """Shapes a result for the requested mode.
+
+    base64: JSON with the image inlined as 'image_with_boxes' (what the front end uses).
+    url:    JSON metadata plus 'image_url' pointing at /get_image/<id>; no pixels.
+    binary: the JPEG streamed as the body, with the key metadata in X-* headers.
+
+    The boxes are drawn on the stored original here (see app/rendering.py).
+    """
+    if mode == 'url':
+        result_data['image_url'] = url_for('api.get_image', image_id=result_data['id'])
+        return jsonify(result_data), 200
 
-        # Set permissions AFTER saving the file (THIS IS THE KEY FIX)
-        os.chmod(image_path, 0o644)  # Set permissions to rw-r--r-- (644 in octal)
+    data, etag = result_image(image_path, processed_image_path, result_data['yolo_detections'])
+    if mode == 'binary':
+        response = image_response(data, etag)
+        response.headers['X-Result-Id'] = str(result_data['id'])
+        response.headers['X-Model-Type'] = str(result_data.get('model_type', ''))
+        response.headers['X-Cnn-Probability'] = str(result_data['cnn_probability'])
+        response.headers['X-Detection-Count'] = str(len(result_data['yolo_detections'] or []))
+        response.headers['Link'] = f"<{url_for('api.get_result', image_id=result_data['id'], response='url')}>; rel=\"describedby\""
+        return response, 200
 
-        return image_path
-
-    except Exception as e:
-        print(f"Error in save_image: {e}")  # More specific error logging
-        raise  # Re-raise the exception to be caught in the calling function
+    result_data['image_with_boxes'] = base64.b64encode(data).decode('utf-8')
+    return jsonify(result_data), 200
 
 # --- Routes ---
 
-# Load models globally, but handle potential failures
-yolo_model = load_yolo_model()  # Ensure these functions exist and handle loading
-cnn_model = load_cnn_model()
-
 @bp.route('/predict', methods=['POST'])
 def predict():
     start_time = time.time()
@@ -62,157 +287,385 @@ def predict():
     if image_file.filename == '':
         return jsonify({'error': 'No image provided'}), 400
 
-    allowed_extensions = {'png', 'jpg', 'jpeg', 'gif'}
-    if '.' not in image_file.filename or image_file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
-        return jsonify({'error': 'Invalid image format'}), 400
+    response_mode = get_response_mode()
+    if response_mode is None:
+        return jsonify({'error': 'Invalid response mode'}), 400
+
+    model_type = request.form.get('model_type')
+    if not model_type:
+        return jsonify({'error': 'model_type is required'}), 400
+    if model_type not in ('cnn', 'yolo'):
+        return jsonify({'error': 'Invalid model_type'}), 400
+
+    # mode=async: queue the image and return a job id to poll at /results/<id>
+    async_mode = request.form.get('mode') == 'async'
+    callback_url = request.form.get('callback_url')
+    if callback_url and not callback_allowed(callback_url):
+        return jsonify({'error': 'callback_url not allowed'}), 400
 
-    image_bytes = image_file.read()
+    # Streamed to a spooled file while hashed and sniffed (the format comes from magic bytes, not the filename);
+    # decoded lazily, only as large as the model needs, and shared by dedup and preprocessing
+    try:
+        upload = track_upload(UploadedImage.from_stream(image_file.stream, image_file.filename))
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
     original_filename = image_file.filename
-    unique_filename = str(uuid.uuid4()) + os.path.splitext(original_filename)[1]
+    version = model_version(model_type)
+
+    # Byte-identical frame already scored by this model version: reuse the stored result
+    cache_key = result_cache.make_key(upload.content_hash, model_type, version)
+    # (skipped when a callback is expected, so the webhook always fires)
+    cached = result_cache.get(cache_key) if Config.RESULT_CACHE_ENABLED and not callback_url else None
+    if cached is not None and async_mode:
+        if ref_exists(cached['image_path']):
+            # Already scored: answer with the documented job response, the result is ready to poll
+            return jsonify({
+                'id': cached['id'],
+                'status': 'done',
+                'model_type': model_type,
+                'status_url': url_for('api.get_result', image_id=cached['id']),
+                'cached': True,
+            }), 202
+        current_app.logger.warning(f"Cached result {cached['id']} has no stored image, recomputing")
+        result_cache.discard(cache_key)
+        cached = None
+    if cached is not None:
+        response_data = {
+            'id': cached['id'],
+            'yolo_detections': cached['yolo_detections'],
+            'cnn_probability': cached['cnn_probability'],
+            'processing_time': time.time() - start_time,
+            'model_type': model_type,
+            'cached': True,
+        }
+        try:
+            return build_result_response(response_data, cached['image_path'], cached.get('processed_image_path'),
+                                         response_mode)
+        except FileNotFoundError:
+            # The stored image is gone (retention, manual cleanup): score the upload again
+            current_app.logger.warning(f"Cached result {cached['id']} has no stored image, recomputing")
+            result_cache.discard(cache_key)
+
+    # Near-identical to the last frame this camera had inferred: reuse that result
+    source = request.form.get('source')
+    frame_hash = None
+    if Config.DEDUP_ENABLED and source and not async_mode:
+        try:
+            frame_hash, previous = frame_deduplicator.lookup(source, model_type, version,
+                                                                   decoded_for(upload, model_type))
+        except Exception as e:
+            current_app.logger.error(f"Error hashing image: {e}")
+            previous = None
+        if previous is not None:
+            response_data = {
+                'id': previous['id'],
+                'yolo_detections': previous['yolo_detections'],
+                'cnn_probability': previous['cnn_probability'],
+                'processing_time': time.time() - start_time,
+                'model_type': model_type,
+                'deduplicated': True,
+            }
+            try:
+                return build_result_response(response_data, previous['image_path'],
+                                             previous.get('processed_image_path'), response_mode)
+            except FileNotFoundError:
+                current_app.logger.warning(f"Deduplicated result {previous['id']} has no stored image, recomputing")
+                frame_deduplicator.forget(source, model_type)
 
     try:
-        image_path = save_image(image_bytes, Config.UPLOAD_FOLDER, unique_filename)
-        current_app.logger.info(f"Image saved to: {image_path}")
+        image_path = store_upload(upload)
+        current_app.logger.info(f"Image stored as: {image_path}")
     except Exception as e:
         current_app.logger.error(f"Error saving image: {e}")
-        print(image_path)
         return jsonify({'error': 'Failed to save image'}), 500
 
-
-    model_type = request.form.get('model_type')
-    if not model_type:
-        return jsonify({'error': 'model_type is required'}), 400
-
-    if model_type == 'cnn':
-        # CNN Prediction
-        input_tensor = preprocess_image_for_cnn(image_bytes) # preprocess here
-        if input_tensor is None:
-            return jsonify({'error': 'Failed to preprocess image for CNN'}), 500
-        try:
-            cnn_probability = predict_with_cnn(input_tensor) # Pass the tensor
-        except Exception as e:
-            current_app.logger.error(f"Error during CNN prediction: {str(e)}")
-            return jsonify({'error': 'Error during CNN prediction'}), 500
-        if cnn_probability == -1.0:
-            return jsonify({'error': 'CNN model not loaded'}), 500
-        yolo_detections = []  # No YOLO detections for CNN
-        processed_image_path = None
-
-    elif model_type == 'yolo':
-        # YOLOv8 Prediction
-        yolo_image = preprocess_image_for_yolo(image_bytes)
-        if yolo_image is None:
-            return jsonify({'error': 'Failed to preprocess image for YOLOv8'}), 500
+    if async_mode:
+        # Queue the job and return immediately; the worker pool fills in the row
         try:
-            yolo_detections = predict_with_yolo(yolo_image)
+            result_id = submit_job(original_filename, image_path, model_type, callback_url, upload.content_hash)
         except Exception as e:
-            current_app.logger.error(f"Error during YOLO prediction: {e}")
-            return jsonify({'error': 'Error during YOLO prediction'}), 500
-        cnn_probability = -1.0
-
-        processed_image_path = None
-        if yolo_detections:
-            # Inline box drawing (previously in draw_boxes_on_image function)
-            try:
-                # Open the image from bytes
-                image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-                draw = ImageDraw.Draw(image)
-
-                # Draw each detection
-                for detection in yolo_detections:
-                    bbox = detection['bbox']
-                    confidence = detection['confidence']
-                    class_name = detection['class']
-
-                    # Draw rectangle (convert coordinates to integers)
-                    draw.rectangle(
-                        [(int(bbox[0]), int(bbox[1])), (int(bbox[2]), int(bbox[3]))],
-                        outline='red',
-                        width=3
-                    )
-
-                    # Draw label with background
-                    label = f"{class_name} {confidence:.2f}"
-                    text_position = (int(bbox[0]), int(bbox[1]) - 15)
-                    text_bbox = draw.textbbox(text_position, label)
-                    draw.rectangle(text_bbox, fill='red')
-                    draw.text(text_position, label, fill='white')
-
-                # Save to bytes buffer
-                output_buffer = io.BytesIO()
-                image.save(output_buffer, format='JPEG')  # Or PNG, depending on your needs
-                processed_image_bytes = output_buffer.getvalue()
-            except Exception as e:
-                current_app.logger.error(f"Error drawing boxes: {e}")
-                # Return original image if drawing fails
-                processed_image_bytes = image_bytes
-
-            processed_filename = "processed_" + unique_filename
-            processed_image_path = save_image(processed_image_bytes, Config.PROCESSED_FOLDER, processed_filename)
-        # Always save as processed image
-        else:
-            processed_filename = "processed_" + unique_filename
-            processed_image_path = save_image(image_bytes, Config.PROCESSED_FOLDER, processed_filename)
-    else:
-        return jsonify({'error': 'Invalid model_type'}), 400
+            current_app.logger.error(f"Error queueing job: {e}")
+            return jsonify({'error': 'Failed to queue job'}), 500
+        return jsonify({
+            'id': result_id,
+            'status': 'pending',
+            'model_type': model_type,
+            'status_url': url_for('api.get_result', image_id=result_id),
+        }), 202
+
+    inference_start = time.time()
+    try:
+        yolo_detections, cnn_probability, processed_image_path = score_upload(upload, model_type)
+    except PredictionError as e:
+        return jsonify({'error': e.message}), e.status
 
+    inference_seconds = time.time() - inference_start
     processing_time = time.time() - start_time
 
-    # Database interaction using psycopg2 connection pool
-    conn = None  # Initialize connection
-    try:
-        conn = get_db_connection()
-        if conn is None:
-            return jsonify({'error': 'Failed to connect to database'}), 500
-        cur = conn.cursor()
+    # Prepare data for insertion
+    row = (original_filename, image_path, processed_image_path,
+           json.dumps(yolo_detections) if yolo_detections else '[]', cnn_probability,
+           processing_time, datetime.utcnow(), model_type, upload.content_hash, version,
+           max_detection_confidence(yolo_detections))
 
-        # Prepare data for insertion
-        yolo_detections_json = json.dumps(yolo_detections) if yolo_detections else '[]'
+    if write_behind.result_writer is not None:
+        # Id reserved from the sequence now; the row is written by the background flusher
+        try:
+            result_id = write_behind.result_writer.submit(row)
+        except Exception as e:
+            current_app.logger.error(f"Error reserving result id: {e}")
+            return jsonify({'error': 'Failed to save results to database'}), 500
+    else:
+        # Database interaction using psycopg2 connection pool
+        conn = None  # Initialize connection
+        try:
+            conn = get_db_connection()
+            if conn is None:
+                return jsonify({'error': 'Failed to connect to database'}), 500
+            cur = conn.cursor()
 
-        cur.execute(
-            "INSERT INTO image_result (original_filename, image_path, processed_image_path, yolo_detections, cnn_probability, processing_time, timestamp, model_type) VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id",
-            (original_filename, image_path, processed_image_path, yolo_detections_json, cnn_probability,
-             processing_time, datetime.utcnow(), model_type)
-        )
+            execute_prepared(cur, 'insert_result', row)
 
-        result_id = cur.fetchone()[0]
-        conn.commit()
-        current_app.logger.info(f"Successfully inserted result with ID: {result_id}")
+            result_id = cur.fetchone()[0]
+            conn.commit()
+            current_app.logger.info(f"Successfully inserted result with ID: {result_id}")
 
-    except Exception as e:
-        current_app.logger.error(f"Error saving to database: {e}")
-        if conn:  # Check if conn is not None before rolling back
-            conn.rollback()
-        return jsonify({'error': 'Failed to save results to database'}), 500,
+        except Exception as e:
+            current_app.logger.error(f"Error saving to database: {e}")
+            if conn:  # Check if conn is not None before rolling back
+                conn.rollback()
+            return jsonify({'error': 'Failed to save results to database'}), 500,
 
-    finally:
-        if conn:  # Ensure connection is closed even if errors occur
-            close_db_connection(conn)  # Use the close_db_connection function
+        finally:
+            if conn:  # Ensure connection is closed even if errors occur
+                close_db_connection(conn)  # Use the close_db_connection function
+
+    cached_value = {
+        'id': result_id,
+        'yolo_detections': yolo_detections,
+        'cnn_probability': cnn_probability,
+        'image_path': image_path,
+        'processed_image_path': processed_image_path,
+    }
+    result_cache.put(cache_key, cached_value)
+    if frame_hash is not None:
+        frame_deduplicator.record(source, model_type, version, frame_hash, cached_value, inference_seconds)
 
     response_data = {
         'id': result_id,
         'yolo_detections': yolo_detections,
         'cnn_probability': cnn_probability,
         'processing_time': processing_time,
+        'model_type': model_type,
     }
 
-    # Always return the processed image (with or without boxes)
-    if processed_image_path:
-        with open(processed_image_path, "rb") as img_file:
-            img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-            response_data['image_with_boxes'] = img_base64
-    else:
-        # This should never happen now, but include as a fallback
-        with open(image_path, 'rb') as img_file:
-            img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-            response_data['image_with_boxes'] = img_base64
+    # Always return the image with its boxes drawn (the original when there are none)
+    return build_result_response(response_data, image_path, processed_image_path, response_mode)
+
+@bp.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Runs many images (multipart 'images' files or a zip/tar archive) through one model in real batches."""
+    start_time = time.time()
+    current_app.logger.info("Received /predict/batch request")
+
+    model_type = request.form.get('model_type') or request.args.get('model_type')
+    if model_type not in ('cnn', 'yolo'):
+        return jsonify({'error': 'model_type must be "cnn" or "yolo"'}), 400
+
+    try:
+        images = collect_batch_images()
+    except (tarfile.TarError, zipfile.BadZipFile) as e:
+        current_app.logger.error(f"Error reading batch archive: {e}")
+        return jsonify({'error': 'Invalid archive'}), 400
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+
+    if not images:
+        return jsonify({'error': 'No images provided'}), 400
+
+    # Save uploads and preprocess; failures are reported per image instead of failing the batch
+    version = model_version(model_type)
+    items = []
+    results = []
+    for upload in images:
+        original_filename = upload.filename
+        entry = {'filename': original_filename}
+        results.append(entry)
+
+        # In-process cache only; a database lookup per image would defeat batching
+        cached = result_cache.get(result_cache.make_key(upload.content_hash, model_type, version), shared=False) \
+            if Config.RESULT_CACHE_ENABLED else None
+        if cached is not None:
+            entry['id'] = cached['id']
+            entry['cached'] = True
+            if model_type == 'cnn':
+                entry['cnn_probability'] = cached['cnn_probability']
+            else:
+                entry['yolo_detections'] = cached['yolo_detections']
+            continue
+
+        try:
+            image_path = store_upload(upload)
+        except Exception as e:
+            current_app.logger.error(f"Error saving image {original_filename}: {e}")
+            entry['error'] = 'Failed to save image'
+            continue
+
+        try:
+            image = upload.image_for(CNN_INPUT_SIZE if model_type == 'cnn' else YOLO_INPUT_SIZE)
+        except Exception as e:
+            current_app.logger.error(f"Error decoding image {original_filename}: {e}")
+            image = None
+
+        if model_type == 'cnn':
+            model_input = image  # Preprocessed per chunk into one contiguous batch tensor
+        else:
+            model_input = preprocess_image_for_yolo(image) if image is not None else None
+        if model_input is None:
+            entry['error'] = 'Failed to preprocess image'
+            continue
+
+        items.append({
+            'entry': entry,
+            'original_filename': original_filename,
+            'upload': upload,
+            'image_path': image_path,
+            'model_input': model_input,
+        })
+
+    # One forward per chunk of INFERENCE_BATCH_SIZE images
+    chunk_size = max(1, Config.INFERENCE_BATCH_SIZE)
+    for offset in range(0, len(items), chunk_size):
+        chunk = items[offset:offset + chunk_size]
+        inputs = [item['model_input'] for item in chunk]
+        if model_type == 'cnn':
+            outputs = predict_cnn_batch(preprocess_batch_for_cnn(inputs))
+        else:
+            # Boxes mapped back to each upload's own pixels, as /predict stores them
+            outputs = [detections.transformed(*yolo_frame_mapping(*item['upload'].dimensions)).to_list()
+                       for item, detections in zip(chunk, detect_yolo_batch(inputs))]
+        for item, output in zip(chunk, outputs):
+            item['output'] = output
+
+    rows = []
+    inserted = []
+    timestamp = datetime.utcnow()
+    per_image_time = (time.time() - start_time) / max(len(items), 1)
+    for item in items:
+        entry = item['entry']
+        if model_type == 'cnn':
+            cnn_probability = item['output']
+            if cnn_probability == -1.0:
+                entry['error'] = 'CNN model not loaded'
+                continue
+            yolo_detections = []
+            processed_image_path = None
+            entry['cnn_probability'] = cnn_probability
+        else:
+            yolo_detections = item['output']
+            cnn_probability = -1.0
+            processed_image_path = None  # Boxes are drawn when the image is requested
+            entry['yolo_detections'] = yolo_detections
+
+        rows.append((item['original_filename'], item['image_path'], processed_image_path,
+                     json.dumps(yolo_detections), cnn_probability, per_image_time, timestamp, model_type,
+                     item['upload'].content_hash, version, max_detection_confidence(yolo_detections)))
+        item['cached_value'] = {
+            'yolo_detections': yolo_detections,
+            'cnn_probability': cnn_probability,
+            'image_path': item['image_path'],
+            'processed_image_path': processed_image_path,
+        }
+        inserted.append(item)
+
+    if rows:
+        try:
+            if write_behind.result_writer is not None:
+                ids = write_behind.result_writer.submit_many(rows)
+            else:
+                ids = insert_results(rows)
+        except Exception as e:
+            current_app.logger.error(f"Error saving batch to database: {e}")
+            return jsonify({'error': 'Failed to save results to database'}), 500
+        for item, result_id in zip(inserted, ids):
+            item['entry']['id'] = result_id
+            result_cache.put(result_cache.make_key(item['upload'].content_hash, model_type, version),
+                             dict(item['cached_value'], id=result_id))
+
+    return jsonify({
+        'model_type': model_type,
+        'count': len(results),
+        'processed': len(inserted),
+        'processing_time': time.time() - start_time,
+        'results': results,
+    }), 200
+
+@bp.route('/predict/video', methods=['POST'])
+def predict_video():
+    """Scores every stride-th frame of an uploaded clip ('video' file) in batches and stores the clip summary."""
+    current_app.logger.info("Received /predict/video request")
+
+    model_type = request.form.get('model_type') or request.args.get('model_type')
+    if model_type not in ('cnn', 'yolo'):
+        return jsonify({'error': 'model_type must be "cnn" or "yolo"'}), 400
+
+    video_file = request.files.get('video')
+    if video_file is None or not video_file.filename:
+        return jsonify({'error': 'No video provided'}), 400
+    extension = video_extension(video_file.filename)
+    if extension is None:
+        return jsonify({'error': 'Invalid video format'}), 400
+
+    try:
+        stride = int(request.form.get('stride') or request.args.get('stride') or Config.VIDEO_FRAME_STRIDE)
+        max_frames = int(request.form.get('max_frames') or request.args.get('max_frames') or Config.VIDEO_MAX_FRAMES)
+    except ValueError:
+        return jsonify({'error': 'stride and max_frames must be integers'}), 400
+    if stride < 1 or max_frames < 1:
+        return jsonify({'error': 'stride and max_frames must be positive'}), 400
+
+    path = None
+    try:
+        path, content_hash = spool_video(video_file.stream, extension)
+        clip = video_ingestor.score(path, model_type, stride, min(max_frames, Config.VIDEO_MAX_FRAMES))
+        video_path = store_video(path, extension, content_hash)
+        clip['id'] = save_clip(clip, video_file.filename, video_path, content_hash)
+    except VideoError as e:
+        return jsonify({'error': e.message}), e.status
+    except Exception as e:
+        current_app.logger.error(f"Error processing video {video_file.filename}: {e}")
+        return jsonify({'error': 'Failed to process video'}), 500
+    finally:
+        if path:
+            os.remove(path)
 
-    return jsonify(response_data), 200
+    del clip['frames']  # Per-frame results are served by /videos/<id>
+    clip['original_filename'] = video_file.filename
+    clip['frames_url'] = url_for('api.get_video', clip_id=clip['id'])
+    return jsonify(clip), 200
 
+@bp.route('/videos/<int:clip_id>')
+def get_video(clip_id):
+    """A stored clip summary with its per-frame results (frames=0 for the summary only)."""
+    try:
+        clip = load_clip(clip_id, with_frames=request.args.get('frames', '1') != '0')
+    except Exception as e:
+        current_app.logger.error(f"Error fetching video clip from database: {e}")
+        return jsonify({'error': 'Failed to fetch results from database'}), 500
+    if clip is None:
+        return jsonify({'error': 'Video clip not found'}), 404
+    return jsonify(clip), 200
 
 @bp.route('/results/<int:image_id>')
 def get_result(image_id):
     """Retrieves results for a specific image ID."""
+    response_mode = get_response_mode()
+    if response_mode is None:
+        return jsonify({'error': 'Invalid response mode'}), 400
+
+    if write_behind.result_writer is not None:
+        write_behind.result_writer.ensure_flushed(image_id)
+
     conn = None  # Initialize connection
     try:
         conn = get_db_connection()
@@ -221,36 +674,33 @@ def get_result(image_id):
         cur = conn.cursor()
 
         # Fetch data from the database
-        cur.execute("SELECT * FROM image_result WHERE id = %s", (image_id,))
+        execute_prepared(cur, 'select_result', (image_id,))
         result = cur.fetchone()
 
         if result is None:
             return jsonify({'error': 'Image result not found'}), 404
 
-        # Assuming your columns are in this order: id, original_filename, ..., yolo_detections, ...
-        # Adjust the indices in the following line if your column order is different
+        # Async jobs that have not finished yet have nothing to return but their state
+        status, error = result[9], result[10]
+        if status in ('pending', 'running'):
+            return jsonify({'id': result[0], 'status': status, 'model_type': result[8]}), 202
+        if status == 'failed':
+            return jsonify({'id': result[0], 'status': status, 'model_type': result[8], 'error': error}), 200
+
         result_data = {
             'id': result[0],
             'original_filename': result[1],
             'image_path': result[2],
             'processed_image_path': result[3],
-            'yolo_detections': json.loads(result[4]) if result[4] else [],  # Load JSON
+            'yolo_detections': result[4] or [],  # JSONB arrives already decoded
             'cnn_probability': result[5],
             'processing_time': result[6],
             'timestamp': result[7].isoformat(),  # Format timestamp
-            'model_type': result[8]
+            'model_type': result[8],
+            'status': status,
         }
-        # Always return the processed image (with or without boxes)
-        if result_data['processed_image_path'] and os.path.exists(result_data['processed_image_path']):
-            with open(result_data['processed_image_path'], "rb") as img_file:
-                img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-                result_data['image_with_boxes'] = img_base64
-        else:
-            # This should never happen now, but include as a fallback
-            with open(result_data['image_path'], 'rb') as img_file:
-                img_base64 = base64.b64encode(img_file.read()).decode('utf-8')
-                result_data['image_with_boxes'] = img_base64
-        return jsonify(result_data), 200
+        return build_result_response(result_data, result_data['image_path'], result_data['processed_image_path'],
+                                     response_mode)
 
     except Exception as e:
         current_app.logger.error(f"Error fetching result from database: {e}")
@@ -262,6 +712,10 @@ def get_result(image_id):
 
 @bp.route('/get_image/<int:image_id>')
 def get_image(image_id):
+    """The result image with its boxes, rendered on demand; honours If-None-Match."""
+    if write_behind.result_writer is not None:
+        write_behind.result_writer.ensure_flushed(image_id)
+
     conn = None
     try:
         conn = get_db_connection()
@@ -269,20 +723,26 @@ def get_image(image_id):
             return jsonify({'error': 'Failed to connect to the database'}), 500
         cur = conn.cursor()
 
-        cur.execute("SELECT processed_image_path, image_path FROM image_result WHERE id = %s", (image_id,))
+        execute_prepared(cur, 'select_image_paths', (image_id,))
         result = cur.fetchone()
 
         if result is None:
             return jsonify({'error': 'Image result not found'}), 404
 
-        processed_image_path, image_path = result
+        processed_image_path, image_path, yolo_detections = result
 
-        if processed_image_path and os.path.exists(processed_image_path):
-            return send_file(processed_image_path, mimetype='image/jpeg')
-        elif os.path.exists(image_path):
-            return send_file(image_path, mimetype='image/jpeg')
-        else:
+        # A result's image never changes, so a matching validator skips reading and rendering entirely
+        etag = result_etag(image_path, processed_image_path, yolo_detections)
+        if request.if_none_match.contains(etag):
+            response = image_response(b'', etag)
+            response.status_code = 304
+            return response
+
+        try:
+            data, etag = result_image(image_path, processed_image_path, yolo_detections)
+        except FileNotFoundError:
             return jsonify({'error':"image not found"}), 404
+        return image_response(data, etag)
 
     except Exception as e:
         current_app.logger.error(f"Error retrieving image: {e}")
@@ -292,7 +752,89 @@ def get_image(image_id):
         if conn:
             close_db_connection(conn)
 
+def parse_result_filters():
+    """Filters shared by /results and /detections, from the query string. Raises ValueError on bad values."""
+    args = request.args
+    model_type = args.get('model_type')
+    if model_type is not None and model_type not in ('cnn', 'yolo'):
+        raise ValueError('Invalid model_type')
+    return {
+        'min_confidence': float(args['min_confidence']) if args.get('min_confidence') else None,
+        'min_probability': float(args['min_probability']) if args.get('min_probability') else None,
+        'since': datetime.fromisoformat(args['since']) if args.get('since') else None,
+        'until': datetime.fromisoformat(args['until']) if args.get('until') else None,
+        'model_type': model_type,
+        'class_name': args.get('class'),
+        'status': args.get('status'),
+    }
+
+@bp.route('/results')
+def list_results_page():
+    """Result metadata, newest first, keyset-paginated: follow 'next_cursor' via ?cursor=...
+
+    Filters: model_type, since, until (ISO 8601, UTC), min_confidence (detections),
+    min_probability (CNN), class, status; page size via limit.
+    """
+    try:
+        filters = parse_result_filters()
+        limit = max(1, min(int(request.args.get('limit', 50)), Config.RESULTS_PAGE_MAX_LIMIT))
+        results, next_cursor = list_results(limit=limit, cursor=request.args.get('cursor'), **filters)
+    except ValueError as e:
+        return jsonify({'error': str(e) or 'Invalid filter value'}), 400
+    except Exception as e:
+        current_app.logger.error(f"Error listing results: {e}")
+        return jsonify({'error': 'Failed to fetch results from database'}), 500
+
+    return jsonify({'count': len(results), 'results': results, 'next_cursor': next_cursor}), 200
+
+@bp.route('/detections')
+def list_detections():
+    """Recent results filtered in SQL: ?min_confidence=0.5&since=2025-01-01T10:00&until=...&model_type=yolo&class=smoke&limit=100"""
+    try:
+        filters = parse_result_filters()
+        limit = max(1, min(int(request.args.get('limit', 100)), Config.DETECTIONS_MAX_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'Invalid filter value'}), 400
+
+    try:
+        results = find_detections(filters['min_confidence'], filters['since'], filters['until'],
+                                  filters['model_type'], filters['class_name'], limit)
+    except Exception as e:
+        current_app.logger.error(f"Error querying detections: {e}")
+        return jsonify({'error': 'Failed to fetch results from database'}), 500
+
+    return jsonify({'count': len(results), 'results': results}), 200
+
 # Health check route
 @bp.route('/health')
 def health_check():
-    return jsonify({"status": "ok"}), 200
\ No newline at end of file
+    return jsonify({"status": "ok"}), 200
+
+# Readiness: models loaded from local files and warmed up
+@bp.route('/ready')
+def ready_check():
+    ready, models = readiness()
+    if ready:
+        status = "ready"
+    elif any(m['error'] for m in models.values()):
+        status = "failed"
+    else:
+        status = "starting"
+    return jsonify({"status": status, "models": models}), 200 if ready else 503
+
+# Runtime counters
+@bp.route('/metrics')
+def metrics():
+    return jsonify({
+        'batching': batching_stats(),
+        'db_pool': pool_stats(),
+        'storage': storage_stats(),
+        'inference_processes': process_pool_stats(),
+        'jobs': job_stats(),
+        'write_behind': write_behind.write_behind_stats(),
+        'maintenance': maintenance_stats(),
+        'result_cache': result_cache.stats(),
+        'frame_dedup': frame_deduplicator.stats(),
+        'rendering': render_cache.stats(),
+        'video': video_ingestor.stats(),
+    }), 200
\ No newline at end of file
@@ -0,0 +1,468 @@
+# app/asgi.py
+"""ASGI variant of the prediction API (Quart + asyncpg + aiofiles).
+
+Serves /predict, /results/<id>, /get_image/<id>, /health, /ready and
+/metrics with the same JSON contract as the Flask blueprint in app/api.py,
+but without tying a thread to each request: uploads are received and
+stored originals read back asynchronously, Postgres is reached through an
+asyncpg pool, and only blocking work (hashing, decoding, inference, blob
+writes, box drawing, base64) is handed to a bounded thread pool. Slow uploads and database round trips then cost a
+coroutine, not a worker thread.
+
+The model, cache, dedup, batching and job-worker code is shared with the
+Flask app; create_app() is still called once to load and warm up the
+models, and its app context is what the shared pipeline logs through.
+/predict/batch and the video endpoints (/predict/video, /videos/<id>) stay
+on the WSGI app.
+
+Run with: hypercorn asgi:app --bind 0.0.0.0:8080 --workers 1
+"""
+import asyncio
+import base64
+import time
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import aiofiles
+import aiofiles.os
+import asyncpg
+from quart import Quart, Blueprint, request, jsonify, url_for, current_app, g
+from quart_cors import cors
+
+from config import Config
+from app import create_app
+from app import jobs
+from app import write_behind
+from app.api import RESPONSE_MODES, INSERT_RESULT_COLUMNS
+from app.cache import result_cache
+from app.dedup import frame_deduplicator
+from app.inference import readiness, model_version, process_pool_stats
+from app.batching import batching_stats
+from app.db import pool_stats
+from app.pipeline import score_upload, decoded_for, PredictionError
+from app.utils import UploadedImage, UploadError, max_detection_confidence
+from app.storage import store_upload, read_ref, ref_exists, local_path, storage_stats
+from app.rendering import image_etag, render_boxes, render_cache
+
+bp = Blueprint('api', __name__)
+
+flask_app = None  # Provides the app context for the shared (sync) pipeline code
+db_pool = None
+_executor = ThreadPoolExecutor(max_workers=Config.ASGI_EXECUTOR_THREADS, thread_name_prefix='asgi-sync')
+
+
+async def run_sync(fn, *args):
+    """Runs blocking work on the executor inside the Flask app context."""
+    def call():
+        with flask_app.app_context():
+            return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(_executor, call)
+
+
+async def read_image(ref):
+    """Image bytes for a blob key or legacy path; local files are read asynchronously."""
+    path = local_path(ref)
+    if path is None:
+        return await run_sync(read_ref, ref)
+    async with aiofiles.open(path, 'rb') as f:
+        return await f.read()
+
+
+async def image_exists(ref):
+    if not ref:
+        return False
+    path = local_path(ref)
+    return await aiofiles.os.path.exists(path) if path else await run_sync(ref_exists, ref)
+
+
+async def image_source(image_path, processed_image_path, detections):
+    """Async counterpart of app.rendering.image_source."""
+    if await image_exists(processed_image_path):
+        return processed_image_path, []  # Annotated copy stored by an older version
+    return image_path, detections or []
+
+
+async def result_image(image_path, processed_image_path, detections):
+    """(JPEG bytes, ETag) as app.rendering.result_image, with the read async and the drawing on the executor."""
+    source, detections = await image_source(image_path, processed_image_path, detections)
+    etag = image_etag(source, detections)
+    if not detections:
+        return await read_image(source), etag
+
+    rendered = render_cache.get(etag)
+    if rendered is None:
+        rendered = await run_sync(render_boxes, await read_image(source), detections, etag)
+    return rendered, etag
+
+
+def image_response(data, etag):
+    response = current_app.response_class(data, mimetype='image/jpeg')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = Config.IMAGE_CACHE_MAX_AGE
+    return response
+
+
+async def lookup_cached_result(cache_key):
+    """In-process LRU first, then the most recent image_result row with the same content, model and version."""
+    cached = result_cache.get(cache_key, shared=False)
+    if cached is not None or not Config.RESULT_CACHE_DB_LOOKUP:
+        return cached
+
+    content_hash, model_type, version = cache_key
+    try:
+        row = await db_pool.fetchrow(
+            "SELECT id, yolo_detections, cnn_probability, processed_image_path, image_path FROM image_result "
+            "WHERE content_hash = $1 AND model_type = $2 AND model_version = $3 ORDER BY id DESC LIMIT 1",
+            content_hash, model_type, version
+        )
+    except Exception as e:
+        current_app.logger.error(f"Error looking up cached result: {e}")
+        return None
+    if row is None:
+        return None
+
+    cached = {
+        'id': row['id'],
+        'yolo_detections': json.loads(row['yolo_detections']) if row['yolo_detections'] else [],  # asyncpg returns JSONB as text
+        'cnn_probability': row['cnn_probability'],
+        'image_path': row['image_path'],
+        'processed_image_path': row['processed_image_path'],
+    }
+    result_cache.put(cache_key, cached)
+    return cached
+
+
+def get_response_mode(form):
+    mode = (form.get('response') or request.args.get('response') or Config.DEFAULT_RESPONSE_MODE).lower()
+    return mode if mode in RESPONSE_MODES else None
+
+
+async def build_result_response(result_data, image_path, processed_image_path, mode):
+    """Same shapes as app.api.build_result_response, with the image read asynchronously."""
+    if mode == 'url':
+        result_data['image_url'] = url_for('api.get_image', image_id=result_data['id'])
+        return jsonify(result_data), 200
+
+    data, etag = await result_image(image_path, processed_image_path, result_data['yolo_detections'])
+    if mode == 'binary':
+        response = image_response(data, etag)
+        response.headers['X-Result-Id'] = str(result_data['id'])
+        response.headers['X-Model-Type'] = str(result_data.get('model_type', ''))
+        response.headers['X-Cnn-Probability'] = str(result_data['cnn_probability'])
+        response.headers['X-Detection-Count'] = str(len(result_data['yolo_detections'] or []))
+        response.headers['Link'] = f"<{url_for('api.get_result', image_id=result_data['id'], response='url')}>; rel=\"describedby\""
+        return response, 200
+
+    encoded = await run_sync(base64.b64encode, data)
+    result_data['image_with_boxes'] = encoded.decode('utf-8')
+    return jsonify(result_data), 200
+
+# --- Routes ---
+
+@bp.teardown_request
+async def close_uploads(exc):
+    """Releases the spooled files of every upload the request created."""
+    for upload in g.pop('uploads', ()):
+        upload.close()
+
+@bp.route('/predict', methods=['POST'])
+async def predict():
+    start_time = time.time()
+    current_app.logger.info("Received /predict request")
+
+    form = await request.form
+    files = await request.files
+
+    if 'image' not in files:
+        return jsonify({'error': 'No image provided'}), 400
+
+    image_file = files['image']
+    if image_file.filename == '':
+        return jsonify({'error': 'No image provided'}), 400
+
+    response_mode = get_response_mode(form)
+    if response_mode is None:
+        return jsonify({'error': 'Invalid response mode'}), 400
+
+    model_type = form.get('model_type')
+    if not model_type:
+        return jsonify({'error': 'model_type is required'}), 400
+    if model_type not in ('cnn', 'yolo'):
+        return jsonify({'error': 'Invalid model_type'}), 400
+
+    async_mode = form.get('mode') == 'async'
+    callback_url = form.get('callback_url')
+    # (resolves the host, so it runs on the executor)
+    if callback_url and not await run_sync(jobs.callback_allowed, callback_url):
+        return jsonify({'error': 'callback_url not allowed'}), 400
+
+    # Spooled, hashed and sniffed in one pass on the executor (see UploadedImage.from_stream)
+    try:
+        upload = await run_sync(UploadedImage.from_stream, image_file.stream, image_file.filename)
+        g.setdefault('uploads', []).append(upload)  # Closed in close_uploads
+    except UploadError as e:
+        return jsonify({'error': e.message}), e.status
+    original_filename = image_file.filename
+    version = model_version(model_type)
+
+    content_hash = upload.content_hash
+    cache_key = result_cache.make_key(content_hash, model_type, version)
+    cached = await lookup_cached_result(cache_key) if Config.RESULT_CACHE_ENABLED and not callback_url else None
+    if cached is not None and async_mode:
+        if await image_exists(cached['image_path']):
+            return jsonify({
+                'id': cached['id'],
+                'status': 'done',
+                'model_type': model_type,
+                'status_url': url_for('api.get_result', image_id=cached['id']),
+                'cached': True,
+            }), 202
+        current_app.logger.warning(f"Cached result {cached['id']} has no stored image, recomputing")
+        result_cache.discard(cache_key)
+        cached = None
+    if cached is not None:
+        response_data = {
+            'id': cached['id'],
+            'yolo_detections': cached['yolo_detections'],
+            'cnn_probability': cached['cnn_probability'],
+            'processing_time': time.time() - start_time,
+            'model_type': model_type,
+            'cached': True,
+        }
+        try:
+            return await build_result_response(response_data, cached['image_path'], cached.get('processed_image_path'),
+                                               response_mode)
+        except FileNotFoundError:
+            # The stored image is gone (retention, manual cleanup): score the upload again
+            current_app.logger.warning(f"Cached result {cached['id']} has no stored image, recomputing")
+            result_cache.discard(cache_key)
+
+    source = form.get('source')
+    frame_hash = None
+    if Config.DEDUP_ENABLED and source and not async_mode:
+        try:
+            frame_hash, previous = await run_sync(
+                lambda: frame_deduplicator.lookup(source, model_type, version, decoded_for(upload, model_type))
+            )
+        except Exception as e:
+            current_app.logger.error(f"Error hashing image: {e}")
+            previous = None
+        if previous is not None:
+            response_data = {
+                'id': previous['id'],
+                'yolo_detections': previous['yolo_detections'],
+                'cnn_probability': previous['cnn_probability'],
+                'processing_time': time.time() - start_time,
+                'model_type': model_type,
+                'deduplicated': True,
+            }
+            try:
+                return await build_result_response(response_data, previous['image_path'],
+                                                   previous.get('processed_image_path'), response_mode)
+            except FileNotFoundError:
+                current_app.logger.warning(f"Deduplicated result {previous['id']} has no stored image, recomputing")
+                frame_deduplicator.forget(source, model_type)
+
+    try:
+        image_path = await run_sync(store_upload, upload)
+    except Exception as e:
+        current_app.logger.error(f"Error saving image: {e}")
+        return jsonify({'error': 'Failed to save image'}), 500
+
+    if async_mode:
+        try:
+            result_id = await db_pool.fetchval(
+                "INSERT INTO image_result (original_filename, image_path, model_type, timestamp, status, callback_url, content_hash) "
+                "VALUES ($1, $2, $3, (NOW() AT TIME ZONE 'utc'), 'pending', $4, $5) RETURNING id",
+                original_filename, image_path, model_type, callback_url, content_hash
+            )
+        except Exception as e:
+            current_app.logger.error(f"Error queueing job: {e}")
+            return jsonify({'error': 'Failed to queue job'}), 500
+        if jobs.job_pool is not None:
+            jobs.job_pool.notify()
+        return jsonify({
+            'id': result_id,
+            'status': 'pending',
+            'model_type': model_type,
+            'status_url': url_for('api.get_result', image_id=result_id),
+        }), 202
+
+    inference_start = time.time()
+    try:
+        yolo_detections, cnn_probability, processed_image_path = await run_sync(
+            score_upload, upload, model_type
+        )
+    except PredictionError as e:
+        return jsonify({'error': e.message}), e.status
+
+    inference_seconds = time.time() - inference_start
+    processing_time = time.time() - start_time
+
+    row = (original_filename, image_path, processed_image_path, json.dumps(yolo_detections or []),
+           cnn_probability, processing_time, datetime.utcnow(), model_type, content_hash, version,
+           max_detection_confidence(yolo_detections))
+    try:
+        if write_behind.result_writer is not None:
+            result_id = await run_sync(write_behind.result_writer.submit, row)
+        else:
+            result_id = await db_pool.fetchval(
+                f"INSERT INTO image_result ({INSERT_RESULT_COLUMNS}) "
+                "VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11) RETURNING id",
+                *row
+            )
+    except Exception as e:
+        current_app.logger.error(f"Error saving to database: {e}")
+        return jsonify({'error': 'Failed to save results to database'}), 500
+
+    cached_value = {
+        'id': result_id,
+        'yolo_detections': yolo_detections,
+        'cnn_probability': cnn_probability,
+        'image_path': image_path,
+        'processed_image_path': processed_image_path,
+    }
+    result_cache.put(cache_key, cached_value)
+    if frame_hash is not None:
+        frame_deduplicator.record(source, model_type, version, frame_hash, cached_value, inference_seconds)
+
+    response_data = {
+        'id': result_id,
+        'yolo_detections': yolo_detections,
+        'cnn_probability': cnn_probability,
+        'processing_time': processing_time,
+        'model_type': model_type,
+    }
+    return await build_result_response(response_data, image_path, processed_image_path, response_mode)
+
+@bp.route('/results/<int:image_id>')
+async def get_result(image_id):
+    response_mode = get_response_mode({})
+    if response_mode is None:
+        return jsonify({'error': 'Invalid response mode'}), 400
+
+    if write_behind.result_writer is not None:
+        await run_sync(write_behind.result_writer.ensure_flushed, image_id)
+
+    try:
+        result = await db_pool.fetchrow(
+            "SELECT id, original_filename, image_path, processed_image_path, yolo_detections, cnn_probability, "
+            "processing_time, timestamp, model_type, status, error FROM image_result WHERE id = $1",
+            image_id
+        )
+    except Exception as e:
+        current_app.logger.error(f"Error fetching result from database: {e}")
+        return jsonify({'error': 'Failed to fetch results from database'}), 500
+
+    if result is None:
+        return jsonify({'error': 'Image result not found'}), 404
+
+    status = result['status']
+    if status in ('pending', 'running'):
+        return jsonify({'id': result['id'], 'status': status, 'model_type': result['model_type']}), 202
+    if status == 'failed':
+        return jsonify({'id': result['id'], 'status': status, 'model_type': result['model_type'],
+                        'error': result['error']}), 200
+
+    result_data = {
+        'id': result['id'],
+        'original_filename': result['original_filename'],
+        'image_path': result['image_path'],
+        'processed_image_path': result['processed_image_path'],
+        'yolo_detections': json.loads(result['yolo_detections']) if result['yolo_detections'] else [],
+        'cnn_probability': result['cnn_probability'],
+        'processing_time': result['processing_time'],
+        'timestamp': result['timestamp'].isoformat(),
+        'model_type': result['model_type'],
+        'status': status,
+    }
+    return await build_result_response(result_data, result_data['image_path'], result_data['processed_image_path'],
+                                       response_mode)
+
+@bp.route('/get_image/<int:image_id>')
+async def get_image(image_id):
+    """The result image with its boxes, rendered on demand; honours If-None-Match."""
+    if write_behind.result_writer is not None:
+        await run_sync(write_behind.result_writer.ensure_flushed, image_id)
+
+    try:
+        result = await db_pool.fetchrow(
+            "SELECT processed_image_path, image_path, yolo_detections FROM image_result WHERE id = $1", image_id
+        )
+    except Exception as e:
+        current_app.logger.error(f"Error retrieving image: {e}")
+        return jsonify({'error': 'Failed to retrieve image'}), 500
+
+    if result is None:
+        return jsonify({'error': 'Image result not found'}), 404
+
+    detections = json.loads(result['yolo_detections']) if result['yolo_detections'] else []
+    source, detections = await image_source(result['image_path'], result['processed_image_path'], detections)
+    etag = image_etag(source, detections)
+    if request.if_none_match.contains(etag):
+        response = image_response(b'', etag)
+        response.status_code = 304
+        return response
+
+    try:
+        data, etag = await result_image(source, None, detections)
+    except FileNotFoundError:
+        return jsonify({'error': "image not found"}), 404
+    return image_response(data, etag)
+
+@bp.route('/health')
+async def health_check():
+    return jsonify({"status": "ok"}), 200
+
+@bp.route('/ready')
+async def ready_check():
+    ready, models = readiness()
+    if ready:
+        status = "ready"
+    elif any(m['error'] for m in models.values()):
+        status = "failed"
+    else:
+        status = "starting"
+    return jsonify({"status": status, "models": models}), 200 if ready else 503
+
+@bp.route('/metrics')
+async def metrics():
+    return jsonify({
+        'batching': batching_stats(),
+        'db_pool': pool_stats(),
+        'storage': storage_stats(),
+        'inference_processes': process_pool_stats(),
+        'jobs': jobs.job_stats(),
+        'write_behind': write_behind.write_behind_stats(),
+        'result_cache': result_cache.stats(),
+        'frame_dedup': frame_deduplicator.stats(),
+        'rendering': render_cache.stats(),
+    }), 200
+
+
+def create_asgi_app(config_class=Config):
+    """Builds the Quart app; models are loaded (via create_app) before the first request is served."""
+    global flask_app
+    if flask_app is None:
+        flask_app = create_app(config_class)
+
+    app = Quart(__name__)
+    app.config.from_object(config_class)
+    app = cors(app)
+    app.register_blueprint(bp)
+
+    @app.before_serving
+    async def open_db_pool():
+        global db_pool
+        db_pool = await asyncpg.create_pool(
+            Config.DATABASE_URL, min_size=Config.ASGI_DB_POOL_MIN, max_size=Config.ASGI_DB_POOL_MAX
+        )
+
+    @app.after_serving
+    async def close_db_pool():
+        if db_pool is not None:
+            await db_pool.close()
+
+    return app
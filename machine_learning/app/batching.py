@@ -0,0 +1,160 @@
+# app/batching.py
+"""Dynamic micro-batching for model inference.
+
+Concurrent /predict requests submit their preprocessed input to a
+MicroBatcher; a single background thread per model drains the queue,
+groups up to ``max_batch_size`` inputs (waiting at most ``max_wait_ms``
+for stragglers), runs one forward pass and hands each caller its result.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+from config import Config
+from app.inference import detect_yolo_batch, predict_cnn_batch
+
+
+class QueueFullError(Exception):
+    """Raised when the inference queue has reached its configured depth."""
+
+
+class MicroBatcher:
+    """Groups single-item inference calls into batched forward passes."""
+
+    def __init__(self, name, predict_batch, collate=list,
+                 max_batch_size=8, max_wait_ms=10, max_queue=64, concurrency=1):
+        self.name = name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._predict_batch = predict_batch
+        self._collate = collate
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self.concurrency = max(1, int(concurrency))  # Batches in flight at once (one collector thread each)
+        self._threads = []
+
+        # Counters (guarded by self._lock)
+        self._batches = 0
+        self._items = 0
+        self._full_batches = 0
+        self._rejected = 0
+        self._batch_sizes = {}
+
+    def start(self):
+        with self._lock:
+            while len(self._threads) < self.concurrency:
+                thread = threading.Thread(
+                    target=self._run, name=f"batcher-{self.name}-{len(self._threads)}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, item, timeout=None):
+        """Queues one input and blocks until its result is available."""
+        self.start()
+        future = Future()
+        try:
+            self._queue.put_nowait((item, future))
+        except queue.Full:
+            with self._lock:
+                self._rejected += 1
+            raise QueueFullError(f"{self.name} inference queue is full")
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        """Blocks for the first item, then gathers more until full or the wait budget runs out."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            inputs = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+
+            try:
+                outputs = self._predict_batch(self._collate(inputs))
+            except Exception as e:
+                print(f"Error during batched {self.name} inference: {e}")
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, output in zip(futures, outputs):
+                    future.set_result(output)
+
+            size = len(batch)
+            with self._lock:
+                self._batches += 1
+                self._items += size
+                if size == self.max_batch_size:
+                    self._full_batches += 1
+                self._batch_sizes[size] = self._batch_sizes.get(size, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'concurrency': self.concurrency,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._queue.maxsize,
+                'batches': self._batches,
+                'items': self._items,
+                'full_batches': self._full_batches,
+                'rejected': self._rejected,
+                'mean_batch_size': (self._items / self._batches) if self._batches else 0.0,
+                'mean_fill_ratio': (self._items / (self._batches * self.max_batch_size)) if self._batches else 0.0,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+            }
+
+
+def _collate_cnn(tensors):
+    """Concatenates (1, C, H, W) tensors from individual requests into one (N, C, H, W) batch."""
+    return torch.cat(tensors, dim=0)
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(model_type):
+    """Returns the process-wide batcher for 'yolo' or 'cnn', creating it on first use."""
+    with _batchers_lock:
+        batcher = _batchers.get(model_type)
+        if batcher is None:
+            if model_type == 'yolo':
+                predict_batch, collate = detect_yolo_batch, list
+            elif model_type == 'cnn':
+                predict_batch, collate = predict_cnn_batch, _collate_cnn
+            else:
+                raise ValueError(f"Unknown model_type: {model_type}")
+            batcher = MicroBatcher(
+                model_type,
+                predict_batch,
+                collate=collate,
+                max_batch_size=Config.INFERENCE_BATCH_SIZE,
+                max_wait_ms=Config.INFERENCE_BATCH_MAX_WAIT_MS,
+                max_queue=Config.INFERENCE_QUEUE_DEPTH,
+                concurrency=Config.INFERENCE_BATCH_CONCURRENCY,
+            )
+            _batchers[model_type] = batcher
+        return batcher
+
+
+def batching_stats():
+    """Counters for every batcher created so far, keyed by model type."""
+    with _batchers_lock:
+        batchers = dict(_batchers)
+    return {name: batcher.stats() for name, batcher in batchers.items()}
@@ -0,0 +1,129 @@
+# app/cache.py
+"""Content-hash result cache.
+
+Results are keyed by (sha256 of the upload bytes, model type, model
+version). Lookups go to a bounded in-process LRU first and, when enabled,
+fall back to the image_result table (indexed on content_hash, model_type,
+model_version) so duplicates seen by other workers or before a restart are
+resolved without re-running inference.
+"""
+import threading
+from collections import OrderedDict
+
+from config import Config
+from app.db import get_db_connection, close_db_connection, register_statement, execute_prepared
+
+register_statement(
+    'select_cached_result',
+    "SELECT id, yolo_detections, cnn_probability, processed_image_path, image_path FROM image_result "
+    "WHERE content_hash = $1 AND model_type = $2 AND model_version = $3 ORDER BY id DESC LIMIT 1"
+)
+
+
+class ResultCache:
+    """Thread-safe LRU of prior results with an optional database tier."""
+
+    def __init__(self, max_entries=1024, use_database=True):
+        self.max_entries = max(0, int(max_entries))
+        self.use_database = use_database
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters (guarded by self._lock)
+        self._hits = 0
+        self._shared_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(content_hash, model_type, model_version):
+        return (content_hash, model_type, model_version)
+
+    def get(self, key, shared=True):
+        """Returns the cached result dict for key, or None.
+
+        With shared=False only the in-process LRU is consulted.
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return dict(value)
+
+        if shared and self.use_database:
+            value = self._lookup_database(*key)
+            if value is not None:
+                self.put(key, value)
+                with self._lock:
+                    self._shared_hits += 1
+                return dict(value)
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, key, value):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = dict(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def discard(self, key):
+        """Drops an in-process entry (e.g. one whose stored image no longer exists)."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_content(self, content_hash):
+        """Drops every in-process entry for the content, for all models (its stored image was deleted)."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == content_hash]:
+                del self._entries[key]
+
+    def _lookup_database(self, content_hash, model_type, model_version):
+        """Most recent image_result row for the same content, model and version."""
+        conn = get_db_connection()
+        if conn is None:
+            return None
+        try:
+            cur = conn.cursor()
+            execute_prepared(cur, 'select_cached_result', (content_hash, model_type, model_version))
+            row = cur.fetchone()
+            conn.commit()
+        except Exception as e:
+            print(f"Error looking up cached result: {e}")
+            conn.rollback()
+            return None
+        finally:
+            close_db_connection(conn)
+
+        if row is None:
+            return None
+        result_id, yolo_detections, cnn_probability, processed_image_path, image_path = row
+        return {
+            'id': result_id,
+            'yolo_detections': yolo_detections or [],  # JSONB arrives already decoded
+            'cnn_probability': cnn_probability,
+            'image_path': image_path,
+            'processed_image_path': processed_image_path,
+        }
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._shared_hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'shared_hits': self._shared_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_ratio': ((self._hits + self._shared_hits) / lookups) if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache(Config.RESULT_CACHE_SIZE, use_database=Config.RESULT_CACHE_DB_LOOKUP)
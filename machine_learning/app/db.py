@@ -1,23 +1,197 @@
+import re
+import threading
+import time
+
 import psycopg2
-from psycopg2 import pool
+from psycopg2.pool import ThreadedConnectionPool
 import os
 from flask import current_app
 
+from config import Config
+
+
+class _RetainingConnectionPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool that keeps up to maxconn idle connections.
+
+    psycopg2 closes every connection handed back once minconn are idle, so
+    under concurrency most checkouts would open a new connection and
+    PREPARE the hot statements again. minconn still sets how many are
+    opened up front; only _putconn reads it afterwards.
+    """
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.minconn = self.maxconn
+
+
+class DatabasePool:
+    """Thread-safe, bounded psycopg2 pool with checkout timeouts, validation and metrics.
+
+    psycopg2's ThreadedConnectionPool raises as soon as it is exhausted; a
+    semaphore in front of it makes callers wait up to ``timeout`` seconds
+    for a connection instead, and records how long they waited. Connections
+    that have been idle longer than ``validate_after`` seconds are checked
+    with ``SELECT 1`` before being handed out and replaced if broken.
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=20, timeout=10.0, validate_after=30.0):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self._pool = _RetainingConnectionPool(minconn, maxconn, dsn)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._returned_at = {}  # conn -> monotonic time it was last returned
+
+        # Counters (guarded by self._lock)
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._timeouts = 0
+        self._replaced = 0
+
+    def getconn(self):
+        """Returns a validated connection, or raises PoolTimeout if none frees up within the timeout."""
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s")
+
+        try:
+            conn = self._checkout_valid()
+        except Exception:
+            self._slots.release()
+            raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._checkouts += 1
+            self._wait_seconds += waited
+            self._max_wait_seconds = max(self._max_wait_seconds, waited)
+        return conn
+
+    def _checkout_valid(self):
+        # Every idle connection may be stale after a server restart, so each replacement is checked too;
+        # maxconn + 1 tries always reach a freshly opened connection
+        for _ in range(self.maxconn + 1):
+            conn = self._pool.getconn()
+            with self._lock:
+                returned_at = self._returned_at.pop(conn, None)
+            idle = time.monotonic() - returned_at if returned_at is not None else None
+            if not conn.closed and (idle is None or idle <= self.validate_after or self._ping(conn)):
+                return conn
+            # Broken (server restart, idle timeout): drop it and try the next one
+            self._discard(conn)
+            with self._lock:
+                self._replaced += 1
+        raise psycopg2.OperationalError(f"No working database connection after {self.maxconn + 1} attempts")
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.fetchone()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._forget(conn)
+        self._pool.putconn(conn, close=True)
+
+    def _forget(self, conn):
+        with self._lock:
+            self._returned_at.pop(conn, None)
+        forget_prepared(conn)
+
+    def putconn(self, conn):
+        try:
+            if conn.closed:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._returned_at[conn] = time.monotonic()
+                self._pool.putconn(conn)
+                if conn.closed:
+                    self._forget(conn)  # Closed by psycopg2 (lost server connection): nothing to track
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+        forget_prepared()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_connections': self.maxconn,
+                'in_use': self._in_use,
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'mean_wait_ms': (self._wait_seconds / self._checkouts * 1000) if self._checkouts else 0.0,
+                'max_wait_ms': self._max_wait_seconds * 1000,
+                'timeouts': self._timeouts,
+                'replaced_connections': self._replaced,
+            }
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within DB_POOL_TIMEOUT."""
+
+
 # Global variable to hold the connection pool
 db_pool = None
+_pool_lock = threading.Lock()
+
+
+def _database_url():
+    # Use os.environ.get() for DATABASE_URL, with a fallback for local development
+    db_url = os.environ.get('DATABASE_URL')
+    if db_url is None:
+        current_app.logger.warning("DATABASE_URL not set, using default SQLite for local development.")
+        db_url = "sqlite:///app.db" # Fallback for local testing
+    return db_url
+
+
+def _create_pool():
+    global db_pool
+    with _pool_lock:
+        if db_pool is None:
+            db_pool = DatabasePool(
+                _database_url(),
+                minconn=Config.DB_POOL_MIN,
+                maxconn=Config.DB_POOL_MAX,
+                timeout=Config.DB_POOL_TIMEOUT,
+                validate_after=Config.DB_POOL_VALIDATE_AFTER,
+            )
+    return db_pool
+
+
+def init_db_pool(app):
+    """Creates the pool at startup; if the database is not reachable yet it is retried on first use."""
+    with app.app_context():
+        try:
+            _create_pool()
+        except psycopg2.Error as e:
+            app.logger.warning(f"Database not reachable at startup, will retry on first request: {e}")
+
 
 def get_db_connection():
     """Gets a connection from the connection pool."""
-    global db_pool
     try:
-        if db_pool is None:
-            # Use os.environ.get() for DATABASE_URL, with a fallback for local development
-            db_url = os.environ.get('DATABASE_URL')
-            if db_url is None:
-                current_app.logger.warning("DATABASE_URL not set, using default SQLite for local development.")
-                db_url = "sqlite:///app.db" # Fallback for local testing
-            db_pool = psycopg2.pool.SimpleConnectionPool(1, 20, db_url)  # Adjust min/max connections
-        return db_pool.getconn()
+        return (db_pool or _create_pool()).getconn()
+    except PoolTimeout as e:
+        current_app.logger.error(f"Database pool exhausted: {e}")
+        return None
     except psycopg2.DatabaseError as e:
         current_app.logger.error(f"Database connection error: {e}")
         return None
@@ -28,12 +202,56 @@ def get_db_connection():
 
 def close_db_connection(conn):
     """Returns a connection to the connection pool."""
-    global db_pool
     if db_pool and conn:
         db_pool.putconn(conn)
 
 def close_all_connections():
     """Closes all connections in the pool (useful for testing/cleanup)."""
-    global db_pool
     if db_pool:
-        db_pool.closeall()
\ No newline at end of file
+        db_pool.closeall()
+
+def pool_stats():
+    return db_pool.stats() if db_pool is not None else {'max_connections': 0}
+
+
+# --- Prepared statements for the hot queries ---
+# Registered once by name with $n placeholders, PREPAREd lazily on each
+# connection the first time it runs them, then run with EXECUTE so Postgres
+# skips parsing and planning on every request.
+
+_statements = {}
+_prepared = {}  # conn -> set of statement names prepared on it
+_prepared_lock = threading.Lock()
+
+
+def register_statement(name, sql):
+    """Registers a statement (with $1..$n placeholders) under name for execute_prepared."""
+    _statements[name] = (sql, len(set(re.findall(r'\$\d+', sql))))
+
+
+def forget_prepared(conn=None):
+    with _prepared_lock:
+        if conn is None:
+            _prepared.clear()
+        else:
+            _prepared.pop(conn, None)
+
+
+def execute_prepared(cur, name, params):
+    """Runs a registered statement on cur, preparing it on the connection first if needed."""
+    sql, param_count = _statements[name]
+    if not Config.DB_PREPARED_STATEMENTS:
+        cur.execute(re.sub(r'\$\d+', '%s', sql), params)
+        return
+
+    conn = cur.connection
+    with _prepared_lock:
+        prepared = name in _prepared.get(conn, ())
+    if not prepared:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        with _prepared_lock:
+            _prepared.setdefault(conn, set()).add(name)
+    if param_count:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * param_count)})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
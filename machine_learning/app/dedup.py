@@ -0,0 +1,111 @@
+# app/dedup.py
+"""Perceptual-hash suppression of near-duplicate frames from the same camera.
+
+For every (source, model type) the dHash of the last frame that actually
+went through the model is kept together with its result. A new frame whose
+hash is within ``max_distance`` bits of it reuses that result instead of
+running inference. Frames are compared with the last *inferred* frame, not
+the previous upload, so slow drift (e.g. a growing plume) still
+accumulates until it crosses the threshold; ``max_age_seconds`` forces a
+fresh inference periodically regardless.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from config import Config
+
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash of a PIL image: compares horizontally adjacent pixels of a tiny grayscale copy."""
+    small = image.resize((hash_size + 1, hash_size), Image.BOX, reducing_gap=2.0).convert("L")
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+class FrameDeduplicator:
+    """Remembers the last inferred frame per source and model and decides whether a new frame can reuse it."""
+
+    def __init__(self, max_distance=4, max_age_seconds=300, max_sources=1024):
+        self.max_distance = max_distance
+        self.max_age_seconds = max_age_seconds
+        self.max_sources = max_sources
+        self._last = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters (guarded by self._lock)
+        self._checked = 0
+        self._skipped = 0
+        self._saved_seconds = 0.0
+        self._hash_seconds = 0.0
+
+    def lookup(self, source, model_type, model_version, image):
+        """Returns (frame_hash, previous result or None) for a new frame."""
+        start = time.perf_counter()
+        frame_hash = dhash(image)
+        elapsed = time.perf_counter() - start
+
+        key = (source, model_type)
+        with self._lock:
+            self._checked += 1
+            self._hash_seconds += elapsed
+            last = self._last.get(key)
+            if (last is None
+                    or last['model_version'] != model_version
+                    or time.monotonic() - last['inferred_at'] > self.max_age_seconds
+                    or hamming_distance(last['hash'], frame_hash) > self.max_distance):
+                return frame_hash, None
+
+            self._last.move_to_end(key)
+            self._skipped += 1
+            self._saved_seconds += last['inference_seconds']
+            return frame_hash, dict(last['result'])
+
+    def record(self, source, model_type, model_version, frame_hash, result, inference_seconds):
+        """Stores the result of a frame that went through the model."""
+        key = (source, model_type)
+        with self._lock:
+            self._last[key] = {
+                'hash': frame_hash,
+                'model_version': model_version,
+                'result': dict(result),
+                'inference_seconds': inference_seconds,
+                'inferred_at': time.monotonic(),
+            }
+            self._last.move_to_end(key)
+            while len(self._last) > self.max_sources:
+                self._last.popitem(last=False)
+
+    def forget(self, source, model_type):
+        """Drops the remembered frame of a source, so its next frame goes through the model."""
+        with self._lock:
+            self._last.pop((source, model_type), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sources': len(self._last),
+                'max_distance': self.max_distance,
+                'checked': self._checked,
+                'skipped_inferences': self._skipped,
+                'inference_seconds_saved': self._saved_seconds,
+                'hashing_seconds': self._hash_seconds,
+            }
+
+
+frame_deduplicator = FrameDeduplicator(
+    max_distance=Config.DEDUP_MAX_DISTANCE,
+    max_age_seconds=Config.DEDUP_MAX_AGE_SECONDS,
+    max_sources=Config.DEDUP_MAX_SOURCES,
+)
@@ -0,0 +1,208 @@
+# app/inference.py
+"""Backend selection for model inference.
+
+Routes and the micro-batcher call these functions instead of the model
+modules directly, so Config.INFERENCE_BACKEND decides whether a batch is
+served by eager PyTorch ('torch') or ONNX Runtime ('onnx').
+"""
+import os
+import threading
+import time
+
+import numpy as np
+import torch
+
+from config import Config
+from models import yolo as torch_yolo
+from models import cnn as torch_cnn
+from models import onnx_backend
+from models.detections import merge_views
+from preprocessing import YOLO_INPUT_SIZE, CNN_INPUT_SIZE, tile_image_for_yolo
+
+MODEL_NAMES = ('yolo', 'cnn')
+
+# Per-model startup state reported by /ready
+_state_lock = threading.Lock()
+model_state = {
+    name: {'loaded': False, 'warmed_up': False, 'load_seconds': None, 'warmup_seconds': None, 'error': None}
+    for name in MODEL_NAMES
+}
+
+
+def using_onnx():
+    return Config.INFERENCE_BACKEND == 'onnx'
+
+
+def _served_model_path(name):
+    if name == 'yolo':
+        return onnx_backend.YOLO_ONNX_PATH if using_onnx() else torch_yolo.YOLO_MODEL_PATH
+    if using_onnx():
+        return onnx_backend.CNN_ONNX_PATH
+    return torch_cnn.CNN_QUANTIZED_MODEL_PATH if Config.CNN_QUANTIZED else torch_cnn.CNN_MODEL_PATH
+
+
+_model_versions = {}
+
+
+def model_version(name):
+    """Identifies the weights serving 'yolo' or 'cnn' (backend, file name, size, mtime), for result caching."""
+    version = _model_versions.get(name)
+    if version is None:
+        path = str(_served_model_path(name))
+        try:
+            stat = os.stat(path)
+            version = f"{Config.INFERENCE_BACKEND}:{os.path.basename(path)}:{stat.st_size}:{int(stat.st_mtime)}"
+        except OSError:
+            version = f"{Config.INFERENCE_BACKEND}:{os.path.basename(path)}:missing"
+        _model_versions[name] = version
+    return version
+
+
+def _load_yolo():
+    if using_onnx():
+        onnx_backend.load_sessions(Config.ONNX_INTRA_OP_THREADS, Config.ONNX_INTER_OP_THREADS)
+        return onnx_backend.yolo_session is not None
+    return torch_yolo.ensure_model_loaded()
+
+
+def _load_cnn():
+    if using_onnx():
+        onnx_backend.load_sessions(Config.ONNX_INTRA_OP_THREADS, Config.ONNX_INTER_OP_THREADS)
+        return onnx_backend.cnn_session is not None
+    if Config.CNN_QUANTIZED:
+        return torch_cnn.load_quantized_cnn_model() is not None
+    return torch_cnn.load_cnn_model() is not None
+
+
+def _update_state(name, **values):
+    with _state_lock:
+        model_state[name].update(values)
+
+
+def load_models():
+    """Loads the models for the configured backend from local files, recording per-model timings."""
+    for name, loader in (('yolo', _load_yolo), ('cnn', _load_cnn)):
+        start = time.perf_counter()
+        try:
+            loaded = loader()
+            error = None if loaded else 'model failed to load'
+        except Exception as e:
+            loaded, error = False, str(e)
+        _update_state(name, loaded=loaded, load_seconds=time.perf_counter() - start, error=error)
+
+
+def warm_up_models(runs=None):
+    """Runs forwards on dummy inputs (batch of 1 and a full batch) so allocation and kernel selection happen before traffic."""
+    runs = Config.MODEL_WARMUP_RUNS if runs is None else runs
+    batch_sizes = sorted({1, max(1, Config.INFERENCE_BATCH_SIZE)})
+    dummy_yolo = np.zeros((YOLO_INPUT_SIZE[1], YOLO_INPUT_SIZE[0], 3), dtype=np.uint8)
+
+    for name in MODEL_NAMES:
+        if not model_state[name]['loaded']:
+            continue
+        start = time.perf_counter()
+        try:
+            with torch.no_grad():
+                for _ in range(runs):
+                    for batch_size in batch_sizes:
+                        if name == 'yolo':
+                            predict_yolo_batch([dummy_yolo] * batch_size)
+                        elif min(predict_cnn_batch(torch.zeros(batch_size, 3, *CNN_INPUT_SIZE).to(torch_cnn.device))) == -1.0:
+                            raise RuntimeError('CNN warm-up forward failed')
+            _update_state(name, warmed_up=True, warmup_seconds=time.perf_counter() - start)
+        except Exception as e:
+            _update_state(name, warmed_up=False, warmup_seconds=time.perf_counter() - start, error=str(e))
+
+
+def readiness():
+    """(ready, per-model state): ready once every model is loaded and, if enabled, warmed up."""
+    with _state_lock:
+        state = {name: dict(values) for name, values in model_state.items()}
+    ready = all(s['loaded'] and (s['warmed_up'] or not Config.MODEL_WARMUP_ENABLED) for s in state.values())
+    return ready, state
+
+
+_process_pool = None
+
+
+def detach_process_pool():
+    """Called in forked inference workers so they run models locally instead of re-submitting to the pool."""
+    global _process_pool
+    _process_pool = None
+
+
+def process_pool_stats():
+    return _process_pool.stats() if _process_pool is not None else {'workers': 0}
+
+
+def _start_process_pool():
+    """Forks INFERENCE_PROCESSES workers sharing the parent's weights; they warm themselves up."""
+    global _process_pool
+    from app.process_pool import InferenceProcessPool
+
+    start = time.perf_counter()
+    pool = InferenceProcessPool(Config.INFERENCE_PROCESSES, Config.INFERENCE_THREADS_PER_PROCESS or None)
+    ready = pool.start()
+    _process_pool = pool
+    for name in MODEL_NAMES:
+        if model_state[name]['loaded']:
+            _update_state(name, warmed_up=ready, warmup_seconds=time.perf_counter() - start,
+                          error=None if ready else 'inference workers did not become ready')
+
+
+def startup():
+    """Startup phase: load every model, then warm it up (in the worker processes when the pool is enabled)."""
+    load_models()
+    if Config.INFERENCE_PROCESSES > 0 and not using_onnx():
+        _start_process_pool()
+    elif Config.MODEL_WARMUP_ENABLED:
+        warm_up_models()
+    ready, state = readiness()
+    for name, values in state.items():
+        print(f"Model {name}: loaded={values['loaded']} warmed_up={values['warmed_up']} "
+              f"load={values['load_seconds']}s warmup={values['warmup_seconds']}s error={values['error']}")
+    return ready
+
+
+def detect_yolo_batch(image_arrays):
+    """One models.detections.Detections per image array, thresholded inside the model's NMS."""
+    if _process_pool is not None:
+        return _process_pool.detect_yolo_batch(image_arrays, timeout=Config.INFERENCE_TIMEOUT)
+    backend = onnx_backend if using_onnx() else torch_yolo
+    return backend.detect_batch(image_arrays, conf=Config.YOLO_CONFIDENCE_THRESHOLD, max_det=Config.YOLO_MAX_DET)
+
+
+def detect_yolo_tiled(image):
+    """Sliced inference over a decoded frame: the whole frame plus overlapping YOLO_TILE_SIZE tiles
+    in one batched forward, merged into one Detections in full-frame pixel coordinates.
+    """
+    arrays, mappings = tile_image_for_yolo(image, Config.YOLO_TILE_SIZE, Config.YOLO_TILE_OVERLAP,
+                                           Config.YOLO_TILE_MAX)
+    return merge_views(detect_yolo_batch(arrays), mappings, Config.YOLO_TILE_MERGE, Config.YOLO_TILE_IOU,
+                       Config.YOLO_MAX_DET)
+
+
+def predict_yolo_batch(image_arrays):
+    """One detection list per image array (the API's JSON shape)."""
+    return [detections.to_list() for detections in detect_yolo_batch(image_arrays)]
+
+
+def predict_cnn_batch(input_tensor):
+    """One fire probability per row of an (N, C, H, W) tensor (-1.0 on failure)."""
+    if _process_pool is not None:
+        return _process_pool.predict_cnn_batch(input_tensor, timeout=Config.INFERENCE_TIMEOUT)
+    if using_onnx():
+        return onnx_backend.predict_with_cnn_batch(input_tensor)
+    return torch_cnn.predict_with_cnn_batch(input_tensor)
+
+
+def detect_yolo(image_array):
+    return detect_yolo_batch([image_array])[0]
+
+
+def predict_yolo(image_array):
+    return predict_yolo_batch([image_array])[0]
+
+
+def predict_cnn(input_tensor):
+    return predict_cnn_batch(input_tensor)[0]
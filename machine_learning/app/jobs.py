@@ -0,0 +1,240 @@
+# app/jobs.py
+"""Asynchronous /predict jobs backed by the image_result table.
+
+POST /predict with mode=async saves the upload, inserts an image_result
+row with status 'pending' and returns its id straight away. A pool of
+worker threads claims pending rows with ``FOR UPDATE SKIP LOCKED`` (safe
+across gunicorn workers and containers), scores them through the same
+pipeline as synchronous requests, fills in the row and optionally POSTs
+the result to the job's callback URL. Clients poll /results/<id>.
+
+Rows stuck in 'running' longer than ASYNC_CLAIM_TIMEOUT (e.g. after a
+crash) are claimed again, up to ASYNC_MAX_ATTEMPTS times.
+"""
+import ipaddress
+import json
+import socket
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from flask import current_app
+
+from config import Config
+from app.db import get_db_connection, close_db_connection
+from app.cache import result_cache
+from app.inference import model_version
+from app.pipeline import score_upload, PredictionError
+from app.utils import UploadedImage, max_detection_confidence
+from app.storage import read_ref
+
+CLAIM_JOB_SQL = """
+    UPDATE image_result
+    SET status = 'running', claimed_at = (NOW() AT TIME ZONE 'utc'), attempts = attempts + 1
+    WHERE id = (
+        SELECT id FROM image_result
+        WHERE status = 'pending'
+           OR (status = 'running' AND claimed_at < (NOW() AT TIME ZONE 'utc') - make_interval(secs => %s))
+        ORDER BY id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, original_filename, image_path, model_type, callback_url, attempts
+"""
+
+
+def callback_allowed(callback_url):
+    """Only http(s) URLs whose host is in ASYNC_CALLBACK_ALLOWED_HOSTS or resolves to public addresses only.
+
+    Loopback, private, link-local (e.g. the 169.254.169.254 metadata
+    service) and other non-global addresses are refused unless the host is
+    listed explicitly, so callbacks cannot be aimed at internal services.
+    """
+    parsed = urlparse(callback_url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+    if parsed.hostname in Config.ASYNC_CALLBACK_ALLOWED_HOSTS:
+        return True
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError):
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(address.split('%')[0]).is_global for address in addresses)
+
+
+def _execute(sql, params, fetch=False):
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError('Failed to connect to database')
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        row = cur.fetchone() if fetch else None
+        conn.commit()
+        return row
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db_connection(conn)
+
+
+class JobWorkerPool:
+    """Worker threads that drain pending image_result rows."""
+
+    def __init__(self, app, workers=2, poll_interval=1.0):
+        self._app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+        # Counters (guarded by self._lock)
+        self._completed = 0
+        self._failed = 0
+        self._callbacks_sent = 0
+        self._callbacks_failed = 0
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def notify(self):
+        """Wakes idle workers immediately instead of waiting for the next poll."""
+        self._wakeup.set()
+
+    def _run(self):
+        with self._app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    job = _execute(CLAIM_JOB_SQL, (Config.ASYNC_CLAIM_TIMEOUT,), fetch=True)
+                except Exception as e:
+                    current_app.logger.error(f"Error claiming job: {e}")
+                    job = None
+                if job is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                self._process(*job)
+
+    def _process(self, result_id, original_filename, image_path, model_type, callback_url, attempts):
+        start_time = time.time()
+        try:
+            if attempts > Config.ASYNC_MAX_ATTEMPTS:
+                raise PredictionError(f'Gave up after {attempts - 1} attempts')
+
+            upload = UploadedImage(read_ref(image_path), original_filename)
+            version = model_version(model_type)
+            yolo_detections, cnn_probability, processed_image_path = score_upload(upload, model_type)
+            processing_time = time.time() - start_time
+
+            _execute(
+                "UPDATE image_result SET yolo_detections = %s, cnn_probability = %s, processed_image_path = %s, "
+                "processing_time = %s, content_hash = %s, model_version = %s, max_confidence = %s, "
+                "status = 'done', error = NULL WHERE id = %s",
+                (json.dumps(yolo_detections), cnn_probability, processed_image_path, processing_time,
+                 upload.content_hash, version, max_detection_confidence(yolo_detections), result_id)
+            )
+            result_cache.put(result_cache.make_key(upload.content_hash, model_type, version), {
+                'id': result_id,
+                'yolo_detections': yolo_detections,
+                'cnn_probability': cnn_probability,
+                'image_path': image_path,
+                'processed_image_path': processed_image_path,
+            })
+            payload = {
+                'id': result_id,
+                'status': 'done',
+                'model_type': model_type,
+                'yolo_detections': yolo_detections,
+                'cnn_probability': cnn_probability,
+                'processing_time': processing_time,
+                'image_url': f"/get_image/{result_id}",
+            }
+            with self._lock:
+                self._completed += 1
+
+        except Exception as e:
+            message = e.message if isinstance(e, PredictionError) else str(e)
+            current_app.logger.error(f"Async job {result_id} failed: {message}")
+            if isinstance(e, PredictionError) and e.status == 503 and attempts <= Config.ASYNC_MAX_ATTEMPTS:
+                # Queue full: hand the job back instead of failing it
+                _execute("UPDATE image_result SET status = 'pending' WHERE id = %s", (result_id,))
+                return
+            try:
+                _execute("UPDATE image_result SET status = 'failed', error = %s WHERE id = %s", (message, result_id))
+            except Exception as db_error:
+                current_app.logger.error(f"Error marking job {result_id} failed: {db_error}")
+            payload = {'id': result_id, 'status': 'failed', 'model_type': model_type, 'error': message}
+            with self._lock:
+                self._failed += 1
+
+        if callback_url:
+            self._send_callback(callback_url, payload)
+
+    def _send_callback(self, callback_url, payload):
+        try:
+            # Checked again at send time (DNS may have changed since submission); redirects are not followed
+            if not callback_allowed(callback_url):
+                raise ValueError('callback_url no longer allowed')
+            response = requests.post(callback_url, json=payload, timeout=Config.ASYNC_CALLBACK_TIMEOUT,
+                                     allow_redirects=False)
+            response.raise_for_status()
+            with self._lock:
+                self._callbacks_sent += 1
+        except Exception as e:
+            current_app.logger.error(f"Callback to {callback_url} for job {payload['id']} failed: {e}")
+            with self._lock:
+                self._callbacks_failed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'completed': self._completed,
+                'failed': self._failed,
+                'callbacks_sent': self._callbacks_sent,
+                'callbacks_failed': self._callbacks_failed,
+            }
+
+
+job_pool = None
+
+
+def start_job_workers(app):
+    """Starts the process-wide worker pool (no-op when ASYNC_WORKERS is 0)."""
+    global job_pool
+    if job_pool is None and Config.ASYNC_WORKERS > 0:
+        job_pool = JobWorkerPool(app, Config.ASYNC_WORKERS, Config.ASYNC_POLL_INTERVAL)
+        job_pool.start()
+    return job_pool
+
+
+def submit_job(original_filename, image_path, model_type, callback_url=None, content_hash=None):
+    """Inserts a pending image_result row for the saved upload and returns its id.
+
+    content_hash is stored up front so retention sees the upload blob as referenced while the job waits.
+    """
+    row = _execute(
+        "INSERT INTO image_result (original_filename, image_path, model_type, timestamp, status, callback_url, content_hash) "
+        "VALUES (%s, %s, %s, (NOW() AT TIME ZONE 'utc'), 'pending', %s, %s) RETURNING id",
+        (original_filename, image_path, model_type, callback_url, content_hash),
+        fetch=True,
+    )
+    if job_pool is not None:
+        job_pool.notify()
+    return row[0]
+
+
+def job_stats():
+    return job_pool.stats() if job_pool is not None else {'workers': 0}
@@ -0,0 +1,331 @@
+# app/maintenance.py
+"""Partition upkeep, hourly rollups and retention for image_result (and video_clip).
+
+image_result is range-partitioned by day (image_result_pYYYYMMDD, see
+database/init.sql). One maintenance pass:
+
+1. creates the partitions for the next PARTITION_DAYS_AHEAD days, so
+   inserts never fall into the default partition;
+2. recomputes image_result_hourly for the last ROLLUP_LOOKBACK_HOURS;
+3. with RETENTION_DAYS > 0, finalises the rollups of every partition that
+   is entirely older than the cutoff, then detaches and drops it (a
+   metadata operation, no row-by-row DELETE) and finally removes the
+   stored images its rows pointed at, unless a newer row shares them or
+   they were uploaded again since the cutoff (re-checked per blob);
+4. with RETENTION_DAYS > 0, deletes video clips older than the cutoff
+   (their frames cascade) and their stored videos, unless a newer clip
+   has the same content.
+
+Runs hourly in a background thread (MAINTENANCE_INTERVAL_SECONDS, 0
+disables it) behind a Postgres advisory lock, so only one process across
+all workers does the work. One-off: python -m app.maintenance [--dry-run]
+"""
+import argparse
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from config import Config
+from app.db import get_db_connection, close_db_connection
+from app.cache import result_cache
+from app.storage import is_blob_key, digest_from_key, delete_ref, blob_modified_at
+
+ADVISORY_LOCK_ID = 0x696D6772  # Arbitrary, constant across processes
+
+PARTITION_NAME = re.compile(r'^image_result_p(\d{8})$')
+
+REFRESH_ROLLUPS_SQL = """
+    INSERT INTO image_result_hourly
+        (hour, model_type, frames, failed, frames_with_detections, mean_cnn_probability, max_confidence)
+    SELECT date_trunc('hour', timestamp), model_type,
+           COUNT(*) FILTER (WHERE status = 'done'),
+           COUNT(*) FILTER (WHERE status = 'failed'),
+           COUNT(*) FILTER (WHERE max_confidence IS NOT NULL),
+           AVG(cnn_probability) FILTER (WHERE model_type = 'cnn' AND cnn_probability >= 0),
+           MAX(max_confidence)
+    FROM image_result
+    WHERE timestamp >= %s AND timestamp < %s AND model_type IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (hour, model_type) DO UPDATE SET
+        frames = EXCLUDED.frames,
+        failed = EXCLUDED.failed,
+        frames_with_detections = EXCLUDED.frames_with_detections,
+        mean_cnn_probability = EXCLUDED.mean_cnn_probability,
+        max_confidence = EXCLUDED.max_confidence
+"""
+
+
+def _utcnow():
+    return datetime.utcnow()
+
+
+def ensure_partitions(cur, days_ahead):
+    today = _utcnow().date()
+    cur.execute("SELECT image_result_ensure_partitions(%s, %s)", (today, today + timedelta(days=days_ahead)))
+    return cur.fetchone()[0]
+
+
+def refresh_rollups(cur, since, until):
+    """Recomputes the hourly rollups for [since, until), rounded out to whole hours."""
+    since = since.replace(minute=0, second=0, microsecond=0)
+    cur.execute(REFRESH_ROLLUPS_SQL, (since, until))
+    return cur.rowcount
+
+
+def expired_partitions(cur, cutoff):
+    """(name, first day) of the daily partitions whose whole range lies before cutoff, oldest first."""
+    cur.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'image_result'::regclass"
+    )
+    expired = []
+    for (name,) in cur.fetchall():
+        match = PARTITION_NAME.match(name)
+        if match:
+            day = datetime.strptime(match.group(1), '%Y%m%d')
+            if day + timedelta(days=1) <= cutoff:
+                expired.append((name, day))
+    return sorted(expired, key=lambda p: p[1])
+
+
+def _managed_file(path):
+    """Only files inside the upload/processed folders are ever deleted."""
+    if not path:
+        return False
+    real = os.path.realpath(path)
+    return any(real.startswith(os.path.realpath(folder) + os.sep)
+               for folder in (Config.UPLOAD_FOLDER, Config.PROCESSED_FOLDER))
+
+
+def _owner_hash(image_path, content_hash):
+    """Content hash that ties a row to its blobs (the upload key is derived from it)."""
+    return content_hash or (digest_from_key(image_path) if is_blob_key(image_path) else None)
+
+
+def _in_use(conn, table, content_hash):
+    cur = conn.cursor()
+    cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE content_hash = %s)", (content_hash,))
+    used = cur.fetchone()[0]
+    conn.commit()
+    return used
+
+
+def _deletable_blob(conn, table, ref, content_hash, cutoff):
+    """Re-checked right before deleting, still under the maintenance advisory lock.
+
+    A blob touched since the cutoff was just uploaded again (store_upload
+    deduplicated against it) and its new row may not be inserted yet; one
+    that a row references again must stay too.
+    """
+    modified = blob_modified_at(ref)
+    if modified is not None and modified >= cutoff:
+        return False
+    return not (content_hash and _in_use(conn, table, content_hash))
+
+
+def _remove_files(conn, rows, cutoff):
+    """Deletes the images of dropped (image_path, processed_image_path, content_hash) rows.
+
+    Blobs are shared by every row with the same content, so those still
+    referenced by a surviving row, or re-uploaded since the cutoff, are
+    kept. Cached results pointing at deleted blobs are evicted.
+    """
+    hashes = {h for h in (_owner_hash(row[0], row[2]) for row in rows) if h}
+    still_used = set()
+    if hashes:
+        cur = conn.cursor()
+        cur.execute("SELECT DISTINCT content_hash FROM image_result WHERE content_hash = ANY(%s)", (list(hashes),))
+        still_used = {row[0] for row in cur.fetchall()}
+        conn.commit()
+
+    refs = {}
+    for image_path, processed_image_path, content_hash in rows:
+        owner = _owner_hash(image_path, content_hash)
+        if owner not in still_used:
+            refs.update((ref, owner) for ref in (image_path, processed_image_path) if ref)
+
+    removed = 0
+    for ref, owner in refs.items():
+        try:
+            if is_blob_key(ref):
+                if not _deletable_blob(conn, 'image_result', ref, owner, cutoff):
+                    continue
+            elif not _managed_file(ref):
+                continue
+            removed += bool(delete_ref(ref))
+            if owner:
+                result_cache.discard_content(owner)
+        except Exception as e:
+            current_app.logger.error(f"Error removing {ref}: {e}")
+    return removed
+
+
+def drop_partition(conn, name, day, cutoff, dry_run=False):
+    """Finalises rollups for the partition's day, drops it, then deletes its files. Returns (rows, files)."""
+    cur = conn.cursor()
+    refresh_rollups(cur, day, day + timedelta(days=1))
+    cur.execute(f'SELECT image_path, processed_image_path, content_hash FROM "{name}"')
+    rows = cur.fetchall()
+    if dry_run:
+        conn.rollback()
+        return len(rows), 0
+
+    cur.execute(f'ALTER TABLE image_result DETACH PARTITION "{name}"')
+    cur.execute(f'DROP TABLE "{name}"')
+    conn.commit()
+    # Files go after the commit: a crash here leaves orphaned files, never rows pointing at missing ones
+    return len(rows), _remove_files(conn, rows, cutoff)
+
+
+def purge_default_partition(conn, cutoff, dry_run=False):
+    """Rows that landed in the default partition are aged out with a DELETE instead."""
+    cur = conn.cursor()
+    cur.execute(
+        "DELETE FROM image_result_default WHERE timestamp < %s "
+        "RETURNING image_path, processed_image_path, content_hash",
+        (cutoff,)
+    )
+    returned = cur.fetchall()
+    if dry_run:
+        conn.rollback()
+        return len(returned), 0
+    conn.commit()
+    return len(returned), _remove_files(conn, returned, cutoff)
+
+
+def purge_video_clips(conn, cutoff, dry_run=False):
+    """Deletes video_clip rows (and their video_frame rows) older than cutoff, then their videos. Returns (clips, files)."""
+    cur = conn.cursor()
+    cur.execute("DELETE FROM video_clip WHERE timestamp < %s RETURNING video_path, content_hash", (cutoff,))
+    returned = cur.fetchall()
+    if dry_run:
+        conn.rollback()
+        return len(returned), 0
+    conn.commit()
+
+    hashes = list({content_hash for _, content_hash in returned if content_hash})
+    cur.execute("SELECT DISTINCT content_hash FROM video_clip WHERE content_hash = ANY(%s)", (hashes,))
+    still_used = {row[0] for row in cur.fetchall()}
+    conn.commit()
+
+    removed = 0
+    for ref, content_hash in {(path, content_hash) for path, content_hash in returned
+                              if is_blob_key(path) and content_hash not in still_used}:
+        try:
+            if _deletable_blob(conn, 'video_clip', ref, content_hash, cutoff):
+                removed += bool(delete_ref(ref))
+        except Exception as e:
+            current_app.logger.error(f"Error removing {ref}: {e}")
+    return len(returned), removed
+
+
+def run_maintenance(retention_days=None, dry_run=False):
+    """One maintenance pass. Returns a summary dict, or None if another process holds the lock."""
+    retention_days = Config.RETENTION_DAYS if retention_days is None else retention_days
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError('Failed to connect to database')
+
+    summary = {'partitions_created': 0, 'rollup_rows': 0, 'partitions_dropped': [], 'rows_dropped': 0,
+               'clips_dropped': 0, 'files_removed': 0}
+    locked = False
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (ADVISORY_LOCK_ID,))
+        locked = cur.fetchone()[0]
+        conn.commit()
+        if not locked:
+            return None
+
+        now = _utcnow()
+        summary['partitions_created'] = ensure_partitions(cur, Config.PARTITION_DAYS_AHEAD)
+        summary['rollup_rows'] = refresh_rollups(cur, now - timedelta(hours=Config.ROLLUP_LOOKBACK_HOURS), now)
+        if dry_run:
+            conn.rollback()
+        else:
+            conn.commit()
+
+        if retention_days > 0:
+            cutoff = datetime.combine((now - timedelta(days=retention_days)).date(), datetime.min.time())
+            for name, day in expired_partitions(cur, cutoff):
+                rows, files = drop_partition(conn, name, day, cutoff, dry_run)
+                summary['partitions_dropped'].append(name)
+                summary['rows_dropped'] += rows
+                summary['files_removed'] += files
+            rows, files = purge_default_partition(conn, cutoff, dry_run)
+            summary['rows_dropped'] += rows
+            summary['files_removed'] += files
+            summary['clips_dropped'], files = purge_video_clips(conn, cutoff, dry_run)
+            summary['files_removed'] += files
+        return summary
+
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if locked:
+            conn.cursor().execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_ID,))
+            conn.commit()
+        close_db_connection(conn)
+
+
+class MaintenanceWorker:
+    """Background thread that runs a maintenance pass every interval seconds."""
+
+    def __init__(self, app, interval):
+        self._app = app
+        self.interval = interval
+        self._stopping = threading.Event()
+        self.last_summary = None
+        self.last_run = None
+
+    def start(self):
+        threading.Thread(target=self._run, name="db-maintenance", daemon=True).start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self):
+        with self._app.app_context():
+            while not self._stopping.is_set():
+                try:
+                    summary = run_maintenance()
+                    if summary is not None:
+                        self.last_summary, self.last_run = summary, _utcnow().isoformat()
+                        current_app.logger.info(f"Database maintenance: {summary}")
+                except Exception as e:
+                    current_app.logger.error(f"Database maintenance failed: {e}")
+                self._stopping.wait(self.interval)
+
+
+maintenance_worker = None
+
+
+def start_maintenance(app):
+    """Starts the process-wide maintenance thread (no-op when MAINTENANCE_INTERVAL_SECONDS is 0)."""
+    global maintenance_worker
+    if maintenance_worker is None and Config.MAINTENANCE_INTERVAL_SECONDS > 0:
+        maintenance_worker = MaintenanceWorker(app, Config.MAINTENANCE_INTERVAL_SECONDS)
+        maintenance_worker.start()
+    return maintenance_worker
+
+
+def maintenance_stats():
+    if maintenance_worker is None:
+        return {'enabled': False}
+    return {'enabled': True, 'last_run': maintenance_worker.last_run, 'last_summary': maintenance_worker.last_summary}
+
+
+if __name__ == '__main__':
+    from flask import Flask
+
+    parser = argparse.ArgumentParser(description="Create partitions, refresh rollups and apply retention once.")
+    parser.add_argument('--retention-days', type=int, default=None, help="Override RETENTION_DAYS (0 keeps everything)")
+    parser.add_argument('--dry-run', action='store_true', help="Report what would be dropped without changing anything")
+    args = parser.parse_args()
+
+    with Flask(__name__).app_context():
+        print(run_maintenance(args.retention_days, args.dry_run) or "Another process is running maintenance")
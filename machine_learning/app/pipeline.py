@@ -0,0 +1,94 @@
+# app/pipeline.py
+"""The per-image scoring step shared by /predict and the async job workers.
+
+Takes a saved upload through preprocessing and inference (via the
+micro-batcher when enabled) and returns what goes into the image_result
+row. Annotated images are not stored; app/rendering.py draws the boxes
+when the image is requested.
+"""
+from flask import current_app
+
+from config import Config
+from app.batching import get_batcher, QueueFullError
+from app.inference import detect_yolo, predict_cnn, detect_yolo_tiled
+from preprocessing import (preprocess_image_for_yolo, preprocess_image_for_cnn, yolo_frame_mapping, CNN_INPUT_SIZE,
+                           YOLO_INPUT_SIZE)
+
+
+class PredictionError(Exception):
+    """A scoring failure with the message and HTTP status the API reports for it."""
+
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def run_inference(model_type, model_input, predict_fn):
+    """Runs one input through the shared micro-batcher, or directly when batching is disabled."""
+    if Config.INFERENCE_BATCHING_ENABLED:
+        return get_batcher(model_type).submit(model_input, timeout=Config.INFERENCE_TIMEOUT)
+    return predict_fn(model_input)
+
+
+def decoded_for(upload, model_type):
+    """The upload decoded only as large as the model input needs (full size when YOLO tiling is on)."""
+    if model_type == 'yolo' and Config.YOLO_TILING_ENABLED:
+        return upload.image  # Tiles are cut from the full-resolution frame
+    return upload.image_for(CNN_INPUT_SIZE if model_type == 'cnn' else YOLO_INPUT_SIZE)
+
+
+def score_upload(upload, model_type):
+    """Runs one UploadedImage through the model.
+
+    Returns (yolo_detections, cnn_probability, processed_image_path) and
+    raises PredictionError on failure. Boxes are always in the pixels of
+    the full-size upload, tiled or not. processed_image_path is always None
+    now that annotated copies are rendered on demand.
+    """
+    tiling = model_type == 'yolo' and Config.YOLO_TILING_ENABLED
+    try:
+        image = decoded_for(upload, model_type)
+    except Exception as e:
+        current_app.logger.error(f"Error decoding image: {e}")
+        image = None
+
+    if model_type == 'cnn':
+        # CNN Prediction
+        input_tensor = preprocess_image_for_cnn(image) if image is not None else None # preprocess here
+        if input_tensor is None:
+            raise PredictionError('Failed to preprocess image for CNN')
+        try:
+            cnn_probability = run_inference('cnn', input_tensor, predict_cnn) # Pass the tensor
+        except QueueFullError:
+            raise PredictionError('Inference queue is full, retry later', 503)
+        except Exception as e:
+            current_app.logger.error(f"Error during CNN prediction: {str(e)}")
+            raise PredictionError('Error during CNN prediction')
+        if cnn_probability == -1.0:
+            raise PredictionError('CNN model not loaded')
+        return [], cnn_probability, None  # No YOLO detections for CNN
+
+    if tiling and image is not None and max(image.size) > Config.YOLO_TILE_SIZE:
+        # Sliced inference: the tiles already form one batch, so the micro-batcher is bypassed
+        try:
+            return detect_yolo_tiled(image).to_list(), -1.0, None
+        except Exception as e:
+            current_app.logger.error(f"Error during tiled YOLO prediction: {e}")
+            raise PredictionError('Error during YOLO prediction')
+
+    if model_type == 'yolo':
+        # YOLOv8 Prediction
+        yolo_image = preprocess_image_for_yolo(image) if image is not None else None
+        if yolo_image is None:
+            raise PredictionError('Failed to preprocess image for YOLOv8')
+        try:
+            detections = run_inference('yolo', yolo_image, detect_yolo)
+        except QueueFullError:
+            raise PredictionError('Inference queue is full, retry later', 503)
+        except Exception as e:
+            current_app.logger.error(f"Error during YOLO prediction: {e}")
+            raise PredictionError('Error during YOLO prediction')
+        return detections.transformed(*yolo_frame_mapping(*upload.dimensions)).to_list(), -1.0, None
+
+    raise PredictionError('Invalid model_type', 400)
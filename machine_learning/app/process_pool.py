@@ -0,0 +1,252 @@
+# app/process_pool.py
+"""Multi-process inference with model weights loaded once and shared.
+
+The parent loads the models, moves their parameters into shared memory
+(``share_memory()``) and forks INFERENCE_PROCESSES workers, so every worker
+maps the same physical weight pages instead of holding its own copy of
+ConvNeXt-Large and YOLOv8. Each worker is pinned to its own slice of the
+available cores and limits torch's intra-op threads to that slice, so
+workers never oversubscribe the CPU.
+
+Workers are forked before the parent runs any forward pass (OpenMP is not
+fork-safe) and each warms itself up before reporting ready (or failed, which
+keeps the pool not ready). Dead workers are forked again. CPU-only: CUDA
+cannot be used across fork. Run with a single gunicorn worker; this pool
+replaces gunicorn-level process scaling for inference.
+"""
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import numpy as np
+import torch
+
+from models import yolo as torch_yolo
+from models import cnn as torch_cnn
+
+
+def _share_weights():
+    """Moves loaded PyTorch weights into shared memory before forking."""
+    if torch_cnn.cnn_model is not None:
+        torch_cnn.cnn_model.share_memory()
+    if torch_yolo.yolo_model is not None:
+        torch_yolo.yolo_model.model.share_memory()
+
+
+def _core_slices(workers, threads_per_worker):
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    slices = []
+    for i in range(workers):
+        start = (i * threads_per_worker) % len(cores)
+        slices.append([cores[(start + j) % len(cores)] for j in range(threads_per_worker)])
+    return slices
+
+
+def _worker_main(index, cores, threads, tasks, results):
+    """Worker process loop: pin, limit threads, warm up, then serve batches until a None task arrives."""
+    from app import inference
+    inference.detach_process_pool()  # Forked copy of the parent's pool handle: always run locally here
+
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, set(cores))
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Already initialised
+
+    # warm_up_models records failures in the model state rather than raising
+    inference.warm_up_models(runs=1)
+    _, state = inference.readiness()
+    errors = {name: values['error'] for name, values in state.items() if values['loaded'] and not values['warmed_up']}
+    if errors:
+        results.put(('failed', index, f"warm-up failed: {errors}"))
+        return  # Exit code 0: not respawned, the pool stays not ready
+    results.put(('ready', index, os.getpid()))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, model_type, payload = task
+        try:
+            if model_type == 'yolo':
+                output = inference.detect_yolo_batch(payload)  # Arrays, not dicts, cross the queue
+            else:
+                output = inference.predict_cnn_batch(torch.from_numpy(payload))
+            results.put((task_id, True, output))
+        except Exception as e:
+            results.put((task_id, False, str(e)))
+
+
+class InferenceProcessPool:
+    """Forked inference workers, each with its own task queue so a dead worker's batches are known.
+
+    Batches go to the live worker with the fewest in flight. A worker that
+    dies is forked again and the batches it held fail straight away instead
+    of waiting out their timeout.
+    """
+
+    def __init__(self, workers, threads_per_worker=None):
+        cpu_count = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+        self.workers = max(1, int(workers))
+        self.threads_per_worker = threads_per_worker or max(1, cpu_count // self.workers)
+        self._context = multiprocessing.get_context('fork')
+        self._results = self._context.Queue()
+        self._cores = _core_slices(self.workers, self.threads_per_worker)
+        self._processes = {}  # worker index -> (process, task queue)
+        self._pending = {}  # task id -> (future, worker index)
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._reported = threading.Event()  # Every worker has reported ready or failed
+        self._stopping = threading.Event()
+        self._ready_workers = {}
+        self._failed_workers = {}
+        self._respawned = 0
+        self._timed_out = 0
+
+    def start(self, ready_timeout=300):
+        """Forks the workers and waits (up to ready_timeout seconds) for all of them to warm up."""
+        _share_weights()
+        for index in range(self.workers):
+            self._spawn(index)
+
+        threading.Thread(target=self._dispatch, name="inference-pool-results", daemon=True).start()
+        threading.Thread(target=self._monitor, name="inference-pool-monitor", daemon=True).start()
+        self._reported.wait(ready_timeout)
+        return self.ready()
+
+    def ready(self):
+        with self._lock:
+            return len(self._ready_workers) == self.workers
+
+    def pids(self):
+        """Process ids of the current workers (respawned ones included)."""
+        with self._lock:
+            return [process.pid for process, _ in self._processes.values()]
+
+    def _spawn(self, index):
+        tasks = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self._cores[index], self.threads_per_worker, tasks, self._results),
+            name=f"inference-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        with self._lock:
+            self._processes[index] = (process, tasks)
+
+    def _dispatch(self):
+        """Routes results from the workers back to the waiting futures."""
+        while True:
+            task_id, ok, output = self._results.get()
+            if task_id in ('ready', 'failed'):
+                with self._lock:
+                    if task_id == 'ready':
+                        self._ready_workers[ok] = output
+                        self._failed_workers.pop(ok, None)
+                    else:
+                        self._failed_workers[ok] = output
+                    if len(self._ready_workers) + len(self._failed_workers) >= self.workers:
+                        self._reported.set()
+                continue
+            with self._lock:
+                future, _ = self._pending.pop(task_id, (None, None))
+            if future is None:
+                continue  # Timed out or its worker died; the caller has already been answered
+            if ok:
+                future.set_result(output)
+            else:
+                future.set_exception(RuntimeError(output))
+
+    def _monitor(self):
+        """Waits on the worker processes and replaces any that exit unexpectedly."""
+        while not self._stopping.is_set():
+            with self._lock:
+                sentinels = {process.sentinel: index for index, (process, _) in self._processes.items()}
+            if not sentinels:
+                return
+            for sentinel in multiprocessing.connection.wait(list(sentinels), timeout=1.0):
+                if not self._stopping.is_set():
+                    self._replace(sentinels[sentinel])
+
+    def _replace(self, index):
+        with self._lock:
+            process, tasks = self._processes.pop(index)
+            process.join()
+            lost = [task_id for task_id, (_, owner) in self._pending.items() if owner == index]
+            futures = [self._pending.pop(task_id)[0] for task_id in lost]
+            self._ready_workers.pop(index, None)
+            respawn = process.exitcode != 0  # 0: warm-up failed (reported), nothing to retry
+            if respawn:
+                self._respawned += 1
+        tasks.cancel_join_thread()
+        tasks.close()
+        for future in futures:
+            future.set_exception(RuntimeError(f"inference worker {index} died (exit code {process.exitcode})"))
+        if respawn:
+            self._spawn(index)
+
+    def submit(self, model_type, payload):
+        return self._submit(model_type, payload)[1]
+
+    def _submit(self, model_type, payload):
+        task_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            live = [index for index, (process, _) in self._processes.items()
+                    if index not in self._failed_workers and process.is_alive()]
+            if not live:
+                future.set_exception(RuntimeError('no inference workers available'))
+                return task_id, future
+            load = {index: 0 for index in live}
+            for _, owner in self._pending.values():
+                if owner in load:
+                    load[owner] += 1
+            index = min(live, key=load.get)
+            self._pending[task_id] = (future, index)
+            tasks = self._processes[index][1]
+        tasks.put((task_id, model_type, payload))
+        return task_id, future
+
+    def _result(self, model_type, payload, timeout):
+        task_id, future = self._submit(model_type, payload)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._pending.pop(task_id, None)  # A late result is dropped by _dispatch
+                self._timed_out += 1
+            raise
+
+    def detect_yolo_batch(self, image_arrays, timeout=None):
+        return self._result('yolo', [np.asarray(a) for a in image_arrays], timeout)
+
+    def predict_cnn_batch(self, input_tensor, timeout=None):
+        return self._result('cnn', input_tensor.detach().cpu().numpy(), timeout)
+
+    def stop(self):
+        self._stopping.set()
+        with self._lock:
+            processes = list(self._processes.values())
+        for _, tasks in processes:
+            tasks.put(None)
+        for process, _ in processes:
+            process.join(timeout=5)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'threads_per_worker': self.threads_per_worker,
+                'alive': sum(process.is_alive() for process, _ in self._processes.values()),
+                'ready': dict(self._ready_workers),
+                'failed': dict(self._failed_workers),
+                'in_flight': len(self._pending),
+                'respawned': self._respawned,
+                'timed_out': self._timed_out,
+            }
@@ -0,0 +1,137 @@
+# app/queries.py
+"""Read-side queries over image_result that filter in SQL.
+
+Detections are stored as JSONB with the highest confidence per frame
+denormalised into max_confidence, so "all frames with smoke confidence
+above X in the last hour" is an index range scan instead of loading and
+parsing every row in Python (see the indexes in database/init.sql).
+
+Listings are ordered newest first on (timestamp, id) and paginated with a
+keyset cursor: the next page starts strictly after the last row returned,
+so each page costs O(page size) however deep into the table it is, unlike
+OFFSET.
+"""
+import base64
+import json
+from datetime import datetime
+
+from app.db import get_db_connection, close_db_connection
+
+DETECTION_COLUMNS = "id, original_filename, model_type, timestamp, cnn_probability, max_confidence, yolo_detections"
+LISTING_COLUMNS = "id, original_filename, model_type, timestamp, status, cnn_probability, max_confidence, processing_time, jsonb_array_length(COALESCE(yolo_detections, '[]'::jsonb))"
+
+
+def encode_cursor(timestamp, result_id):
+    """Opaque page token for the row (timestamp, id)."""
+    raw = json.dumps([timestamp.isoformat(), result_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed tokens."""
+    try:
+        timestamp, result_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(timestamp), int(result_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def _where(min_confidence=None, min_probability=None, since=None, until=None, model_type=None,
+           class_name=None, status=None, after=None):
+    """WHERE clause and parameters for the given filters (None = not filtered)."""
+    clauses, params = [], []
+    if min_confidence is not None:
+        clauses.append("max_confidence >= %s")
+        params.append(min_confidence)
+    if min_probability is not None:
+        clauses.append("cnn_probability >= %s")
+        params.append(min_probability)
+    if since is not None:
+        clauses.append("timestamp >= %s")
+        params.append(since)
+    if until is not None:
+        clauses.append("timestamp < %s")
+        params.append(until)
+    if model_type is not None:
+        clauses.append("model_type = %s")
+        params.append(model_type)
+    if class_name is not None:
+        clauses.append("yolo_detections @> %s::jsonb")
+        params.append(json.dumps([{'class': class_name}]))
+    if status is not None:
+        clauses.append("status = %s")
+        params.append(status)
+    if after is not None:
+        # Row comparison matches the (timestamp, id) index order, so this is a range scan
+        clauses.append("(timestamp, id) < (%s, %s)")
+        params.extend(after)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def _fetch_all(sql, params):
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError('Failed to connect to database')
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = cur.fetchall()
+        conn.commit()
+        return rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db_connection(conn)
+
+
+def find_detections(min_confidence=None, since=None, until=None, model_type=None, class_name=None, limit=100):
+    """Most recent finished results matching every given filter, newest first.
+
+    min_confidence: max_confidence >= this (frames without detections never match)
+    since / until:  timestamp window (naive UTC datetimes)
+    class_name:     at least one detection of this class (GIN containment)
+    """
+    where, params = _where(min_confidence=min_confidence, since=since, until=until, model_type=model_type,
+                           class_name=class_name, status='done')
+    rows = _fetch_all(
+        f"SELECT {DETECTION_COLUMNS} FROM image_result{where} ORDER BY timestamp DESC, id DESC LIMIT %s",
+        params + [limit]
+    )
+    return [{
+        'id': row[0],
+        'original_filename': row[1],
+        'model_type': row[2],
+        'timestamp': row[3].isoformat(),
+        'cnn_probability': row[4],
+        'max_confidence': row[5],
+        'yolo_detections': row[6] or [],  # JSONB arrives already decoded
+    } for row in rows]
+
+
+def list_results(limit=50, cursor=None, **filters):
+    """One page of result metadata (no detections, no pixels), newest first.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    where, params = _where(after=after, **filters)
+    rows = _fetch_all(
+        f"SELECT {LISTING_COLUMNS} FROM image_result{where} ORDER BY timestamp DESC, id DESC LIMIT %s",
+        params + [limit + 1]  # One extra row tells whether there is a next page
+    )
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1][3], rows[-1][0]) if has_more else None
+    return [{
+        'id': row[0],
+        'original_filename': row[1],
+        'model_type': row[2],
+        'timestamp': row[3].isoformat(),
+        'status': row[4],
+        'cnn_probability': row[5],
+        'max_confidence': row[6],
+        'processing_time': row[7],
+        'detection_count': row[8],
+    } for row in rows], next_cursor
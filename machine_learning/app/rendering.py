@@ -0,0 +1,118 @@
+# app/rendering.py
+"""On-demand rendering of YOLO boxes onto stored originals.
+
+Annotated copies are no longer written at prediction time: the image
+returned for a result is drawn from the stored original plus its
+yolo_detections when it is requested, and kept in a byte-bounded LRU so
+repeated views (dashboards polling /get_image) are served from memory.
+
+Rows written before this change may still carry a processed_image_path;
+when that image exists it is served as is.
+
+Every rendering gets a strong ETag derived from the image references and
+the detections, so clients and proxies can revalidate with
+If-None-Match and skip both the transfer and the rendering.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+from app.storage import ref_exists, read_ref
+from app.utils import UploadedImage, draw_boxes_on_image
+
+
+def image_source(image_path, processed_image_path, detections):
+    """(ref to read, detections still to draw on it) for a result's image."""
+    if processed_image_path and ref_exists(processed_image_path):
+        return processed_image_path, []  # Annotated copy stored by an older version
+    return image_path, detections or []
+
+
+def image_etag(source, detections):
+    """Strong validator for the served image; content-addressed refs make it stable across workers."""
+    annotations = json.dumps(detections, sort_keys=True) if detections else ''
+    return hashlib.sha256(f"{source}|{annotations}".encode('utf-8')).hexdigest()[:32]
+
+
+def result_etag(image_path, processed_image_path, detections):
+    """ETag of the image served for a result, without reading or rendering it."""
+    return image_etag(*image_source(image_path, processed_image_path, detections))
+
+
+class RenderCache:
+    """Thread-safe LRU of rendered JPEG bytes, bounded by total size."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        # Counters (guarded by self._lock)
+        self._hits = 0
+        self._misses = 0
+        self._render_seconds = 0.0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+            else:
+                self._misses += 1
+            return data
+
+    def put(self, key, data, render_seconds=0.0):
+        with self._lock:
+            self._render_seconds += render_seconds
+            if len(data) > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous)
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': (self._hits / lookups) if lookups else 0.0,
+                'render_seconds': self._render_seconds,
+            }
+
+
+render_cache = RenderCache(Config.RENDER_CACHE_MAX_BYTES)
+
+
+def render_boxes(data, detections, etag):
+    """Draws the boxes on the image bytes and keeps the JPEG in the LRU under etag."""
+    start = time.perf_counter()
+    rendered = draw_boxes_on_image(UploadedImage(data).image, detections)
+    render_cache.put(etag, rendered, time.perf_counter() - start)
+    return rendered
+
+
+def result_image(image_path, processed_image_path, detections):
+    """(JPEG bytes, ETag) of the image to show for a result, rendering the boxes if needed."""
+    source, detections = image_source(image_path, processed_image_path, detections)
+    etag = image_etag(source, detections)
+    if not detections:
+        return read_ref(source), etag
+
+    rendered = render_cache.get(etag)
+    if rendered is None:
+        rendered = render_boxes(read_ref(source), detections, etag)
+    return rendered, etag
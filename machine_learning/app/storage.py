@@ -0,0 +1,308 @@
+# app/storage.py
+"""Content-addressed image storage.
+
+Every blob (an uploaded original, or an annotated copy on older rows) is
+stored once under its SHA-256, sharded into two levels of subdirectories
+so no directory grows past a few thousand entries:
+
+    ab/cd/abcd1234...ef.jpg
+
+The key is what image_result.image_path / processed_image_path hold.
+Identical uploads map to the same key and are written once. Rows from
+before this change still hold plain file paths (uploads/<uuid>.jpg); the
+module-level helpers accept both.
+
+Backends implement put/open/read/exists/delete/local_path, plus
+touch/modified_at for retention: with RETENTION_DAYS > 0 a deduplicated
+put refreshes the blob's modification time, so maintenance can tell a
+blob that was just uploaded again from one only old rows point at.
+
+- LocalBlobStore: a directory tree (BLOB_STORE_ROOT). Writes go to a temp
+  file created with mode 0644 and are renamed into place, so readers
+  never see partial blobs and no separate chmod is needed.
+- S3BlobStore: any S3-compatible store (BLOB_STORE_BACKEND=s3). Needs
+  boto3; S3_ENDPOINT_URL points it at MinIO or another local stand-in.
+"""
+import hashlib
+import io
+import os
+import re
+import shutil
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from config import Config
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+BLOB_KEY = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+_MAGIC_EXTENSIONS = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF87a', '.gif'),
+    (b'GIF89a', '.gif'),
+)
+
+
+def guess_extension(data):
+    """File extension from the leading magic bytes ('' if unknown)."""
+    for magic, extension in _MAGIC_EXTENSIONS:
+        if data[:len(magic)] == magic:
+            return extension
+    return ''
+
+
+def blob_key(digest, extension=''):
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+def is_blob_key(ref):
+    return bool(ref) and BLOB_KEY.match(ref) is not None
+
+
+def digest_from_key(key):
+    """The SHA-256 a blob key was derived from."""
+    return key.rsplit('/', 1)[-1].split('.', 1)[0]
+
+
+class _Counters:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._deduplicated = 0
+        self._bytes_written = 0
+
+    def _count_put(self, size, existed):
+        with self._lock:
+            if existed:
+                self._deduplicated += 1
+            else:
+                self._writes += 1
+                self._bytes_written += size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'writes': self._writes,
+                'deduplicated': self._deduplicated,
+                'bytes_written': self._bytes_written,
+            }
+
+
+class LocalBlobStore(_Counters):
+    backend = 'local'
+
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def put(self, data, extension='', digest=None):
+        """Stores data under its content hash and returns the key; a no-op if it is already stored."""
+        return self.put_file(io.BytesIO(data), extension, digest or hashlib.sha256(data).hexdigest())
+
+    def put_file(self, fileobj, extension, digest):
+        """Like put(), copying from a binary file object in chunks; digest must be its SHA-256."""
+        key = blob_key(digest, extension)
+        path = self._path(key)
+        # (a blob removed by retention since the check is simply written again)
+        if os.path.exists(path) and (Config.RETENTION_DAYS <= 0 or self.touch(key)):
+            self._count_put(0, existed=True)
+            return key
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                shutil.copyfileobj(fileobj, f, COPY_CHUNK_SIZE)
+                size = f.tell()
+            os.replace(tmp_path, path)  # Atomic; a concurrent writer of the same blob wrote the same bytes
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._count_put(size, existed=False)
+        return key
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def read(self, key):
+        with self.open(key) as f:
+            return f.read()
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def touch(self, key):
+        """Marks the blob as just stored; False if it no longer exists."""
+        try:
+            os.utime(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def modified_at(self, key):
+        """Last write or touch as a naive UTC datetime, or None if the blob does not exist."""
+        try:
+            mtime = os.path.getmtime(self._path(key))
+        except FileNotFoundError:
+            return None
+        return datetime.fromtimestamp(mtime, timezone.utc).replace(tzinfo=None)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def local_path(self, key):
+        return self._path(key)
+
+
+class S3BlobStore(_Counters):
+    backend = 's3'
+
+    def __init__(self, bucket, prefix='', endpoint_url=None):
+        super().__init__()
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("BLOB_STORE_BACKEND=s3 requires boto3 (pip install boto3)")
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self._client = boto3.client('s3', endpoint_url=endpoint_url or None)
+
+    def _object(self, key):
+        return self.prefix + key
+
+    def put(self, data, extension='', digest=None):
+        return self.put_file(io.BytesIO(data), extension, digest or hashlib.sha256(data).hexdigest())
+
+    def put_file(self, fileobj, extension, digest):
+        key = blob_key(digest, extension)
+        existed = self.exists(key)
+        size = 0
+        if existed and Config.RETENTION_DAYS > 0:
+            existed = self.touch(key)
+        if not existed:
+            self._client.upload_fileobj(fileobj, self.bucket, self._object(key))  # Multipart for large files
+            size = fileobj.tell()
+        self._count_put(size, existed)
+        return key
+
+    def open(self, key):
+        return io.BytesIO(self.read(key))
+
+    def read(self, key):
+        try:
+            return self._client.get_object(Bucket=self.bucket, Key=self._object(key))['Body'].read()
+        except self._client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key)  # Same contract as the local backend
+
+    def _head(self, key):
+        """head_object response, or None if the object does not exist."""
+        from botocore.exceptions import ClientError
+        try:
+            return self._client.head_object(Bucket=self.bucket, Key=self._object(key))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def touch(self, key):
+        # A server-side copy onto itself is the only way to bump LastModified; no bytes pass through here
+        from botocore.exceptions import ClientError
+        source = {'Bucket': self.bucket, 'Key': self._object(key)}
+        try:
+            self._client.copy_object(Bucket=self.bucket, Key=self._object(key), CopySource=source,
+                                     MetadataDirective='REPLACE')
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def modified_at(self, key):
+        head = self._head(key)
+        return head['LastModified'].astimezone(timezone.utc).replace(tzinfo=None) if head is not None else None
+
+    def delete(self, key):
+        self._client.delete_object(Bucket=self.bucket, Key=self._object(key))
+        return True
+
+    def local_path(self, key):
+        return None  # Served from memory
+
+
+def create_blob_store():
+    if Config.BLOB_STORE_BACKEND == 's3':
+        return S3BlobStore(Config.S3_BUCKET, Config.S3_PREFIX, Config.S3_ENDPOINT_URL)
+    return LocalBlobStore(Config.BLOB_STORE_ROOT)
+
+
+blob_store = create_blob_store()
+
+
+# --- Helpers taking either a blob key or a legacy file path ---
+
+def store_image(data, extension=None, digest=None):
+    """Stores image bytes and returns the reference to put in image_result."""
+    return blob_store.put(data, guess_extension(data) if extension is None else extension, digest)
+
+
+def store_upload(upload):
+    """Stores an UploadedImage from its (possibly spooled) file, under its sniffed extension and hash."""
+    return blob_store.put_file(upload.open(), upload.extension, upload.content_hash)
+
+
+def ref_exists(ref):
+    if not ref:
+        return False
+    return blob_store.exists(ref) if is_blob_key(ref) else os.path.exists(ref)
+
+
+def read_ref(ref):
+    if is_blob_key(ref):
+        return blob_store.read(ref)
+    with open(ref, 'rb') as f:
+        return f.read()
+
+
+def open_ref(ref):
+    """A binary file object for the reference (for send_file when there is no local path)."""
+    return blob_store.open(ref) if is_blob_key(ref) else open(ref, 'rb')
+
+
+def local_path(ref):
+    """Filesystem path for the reference, or None if it only exists remotely."""
+    return blob_store.local_path(ref) if is_blob_key(ref) else ref
+
+
+def blob_modified_at(ref):
+    """When a blob was last written or re-uploaded (None for legacy paths and missing blobs)."""
+    return blob_store.modified_at(ref) if is_blob_key(ref) else None
+
+
+def delete_ref(ref):
+    if is_blob_key(ref):
+        return blob_store.delete(ref)
+    try:
+        os.remove(ref)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def storage_stats():
+    return blob_store.stats()
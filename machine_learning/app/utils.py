@@ -1,28 +1,217 @@
-import os
 import io
+import hashlib
+import tempfile
 from PIL import Image, ImageDraw
-import uuid
-
-def save_image(image_bytes, folder, filename):
-    """Saves an image to the specified folder."""
-    image = Image.open(io.BytesIO(image_bytes))
-    image_path = os.path.join(folder, filename)
-    image.save(image_path)
-    return image_path
-
-def draw_boxes_on_image(image_bytes, detections):
-    """Draws bounding boxes on the image and saves it."""
-    image = Image.open(io.BytesIO(image_bytes))
-    image = image.convert("RGB")
+
+from config import Config
+from app.storage import guess_extension
+from preprocessing import decode_image
+
+SNIFF_BYTES = 16  # Enough for every signature storage.guess_extension knows
+
+
+class UploadError(Exception):
+    """An upload rejected before decoding, with the message and HTTP status the API reports."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class UploadedImage:
+    """An upload's raw bytes plus a lazily decoded RGB image.
+
+    One instance is created per uploaded file and handed to every stage of
+    the request (saving, dedup, preprocessing), so the bytes are decoded at
+    most once per size needed and written to disk exactly as received.
+
+    Uploads (request files and archive members alike) are built with
+    from_stream(), which spools them to a temporary file (in memory up to
+    UPLOAD_SPOOL_MAX_MEMORY) instead of holding them as one bytes object;
+    close() (or a with block) releases it. Images already in memory
+    (stored originals) are passed as bytes.
+
+    The pixel limit is checked from the header before anything is decoded,
+    against max_pixels (MAX_IMAGE_PIXELS by default).
+    """
+
+    def __init__(self, data, filename=None, file=None, content_hash=None, extension=None, max_pixels=None):
+        self._data = data
+        self._file = file
+        self.filename = filename
+        self._image = None
+        self._reduced = {}
+        self._content_hash = content_hash
+        self._extension = extension
+        self._dimensions = None
+        self._checked = False
+        self.max_pixels = Config.MAX_IMAGE_PIXELS if max_pixels is None else max_pixels
+
+    @classmethod
+    def from_stream(cls, stream, filename=None, max_bytes=None, chunk_size=None, max_pixels=None):
+        """Copies a stream into a spooled temp file in chunks, hashing it on the way.
+
+        Raises UploadError when it exceeds max_bytes (MAX_UPLOAD_BYTES), is not
+        a recognised image format (by magic bytes, whatever the filename says)
+        or declares more than max_pixels (MAX_IMAGE_PIXELS) in its header.
+        """
+        max_bytes = Config.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+        chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+        spool = tempfile.SpooledTemporaryFile(max_size=Config.UPLOAD_SPOOL_MAX_MEMORY)
+        digest = hashlib.sha256()
+        head, size = b'', 0
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f'Image too large (max {max_bytes} bytes)', 413)
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                digest.update(chunk)
+                spool.write(chunk)
+            if not size:
+                raise UploadError('No image provided')
+
+            upload = cls(None, filename, file=spool, content_hash=digest.hexdigest(), extension=guess_extension(head),
+                         max_pixels=max_pixels)
+            upload.check()
+            return upload
+        except Exception:
+            spool.close()
+            raise
+
+    def close(self):
+        """Releases the spooled temporary file; decoded images already obtained stay usable."""
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def open(self):
+        """A binary file object over the raw upload, positioned at the start."""
+        if self._file is None:
+            return io.BytesIO(self._data)
+        self._file.seek(0)
+        return self._file
+
+    @property
+    def data(self):
+        """The raw upload as bytes (reads a spooled upload into memory; prefer open())."""
+        if self._data is None:
+            self._data = self.open().read()
+        return self._data
+
+    @property
+    def size(self):
+        """Upload size in bytes."""
+        if self._data is not None:
+            return len(self._data)
+        self._file.seek(0, io.SEEK_END)
+        return self._file.tell()
+
+    @property
+    def extension(self):
+        """File extension sniffed from the leading magic bytes ('' if not a supported image)."""
+        if self._extension is None:
+            self._extension = guess_extension(self.open().read(SNIFF_BYTES))
+        return self._extension
+
+    @property
+    def content_hash(self):
+        """Hex SHA-256 of the raw upload bytes."""
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.data).hexdigest()
+        return self._content_hash
+
+    def check(self):
+        """Rejects unsupported formats and oversized dimensions using only the header (no pixel decode)."""
+        if self._checked:
+            return
+        if not self.extension:
+            raise UploadError('Invalid image format')
+        try:
+            with Image.open(self.open()) as header:
+                width, height = header.size
+        except Exception:
+            raise UploadError('Invalid image format')
+        if width * height > self.max_pixels:
+            raise UploadError(f'Image too large ({width}x{height}, max {self.max_pixels} pixels)', 413)
+        self._dimensions = (width, height)
+        self._checked = True
+
+    @property
+    def dimensions(self):
+        """(width, height) of the full-size image, from its header (model boxes are stored in these pixels)."""
+        self.check()
+        return self._dimensions
+
+    @property
+    def image(self):
+        """The decoded RGB PIL image (decoded on first access, then reused)."""
+        if self._image is None:
+            self.check()
+            image = Image.open(self.open())
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            else:
+                image.load()
+            self._image = image
+        return self._image
+
+    def image_for(self, min_size):
+        """An RGB image at least min_size (w, h), for model inputs.
+
+        Large JPEGs are decoded at reduced resolution (see
+        preprocessing.decode_image) instead of in full; the full decode is
+        reused when something else already needed it.
+        """
+        if self._image is not None:
+            return self._image
+        image = self._reduced.get(min_size)
+        if image is None:
+            self.check()
+            image = self._reduced[min_size] = decode_image(self.open(), min_size)
+        return image
+
+
+def draw_boxes_on_image(image, detections):
+    """Draws YOLO boxes and labels onto a copy of the decoded image and returns JPEG bytes."""
+    image = image.copy()  # Leave the shared decoded image untouched
     draw = ImageDraw.Draw(image)
 
+    # Draw each detection
     for detection in detections:
         bbox = detection['bbox']
-        conf = detection['confidence']
-        draw.rectangle(bbox, outline="red", width=3)
-        label = f"Smoke: {conf:.2f}"
-        draw.text((bbox[0], bbox[1] - 10), label, fill="red")
+        confidence = detection['confidence']
+        class_name = detection['class']
+
+        # Draw rectangle (convert coordinates to integers)
+        draw.rectangle(
+            [(int(bbox[0]), int(bbox[1])), (int(bbox[2]), int(bbox[3]))],
+            outline='red',
+            width=3
+        )
+
+        # Draw label with background
+        label = f"{class_name} {confidence:.2f}"
+        text_position = (int(bbox[0]), int(bbox[1]) - 15)
+        text_bbox = draw.textbbox(text_position, label)
+        draw.rectangle(text_bbox, fill='red')
+        draw.text(text_position, label, fill='white')
 
     img_byte_arr = io.BytesIO()
     image.save(img_byte_arr, format='JPEG')  # Use JPEG format
-    return img_byte_arr.getvalue()
\ No newline at end of file
+    return img_byte_arr.getvalue()
+
+
+def max_detection_confidence(detections):
+    """Highest confidence among the detections (stored in image_result.max_confidence), or None if there are none."""
+    return max((float(d['confidence']) for d in detections), default=None) if detections else None
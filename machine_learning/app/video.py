@@ -0,0 +1,416 @@
+# app/video.py
+"""Video clip ingestion: sampled frames scored in batches, one summary row per clip.
+
+A clip (a /predict/video upload, or a local file passed to
+``python -m app.video``) is decoded with OpenCV on a producer thread that
+keeps every VIDEO_FRAME_STRIDE-th frame, turns it into a model input
+(colour conversion, reduce, resize, normalisation) and pushes it onto a
+bounded queue. Frames in between are only grab()bed: the decoder advances
+past them without converting or copying them. The calling thread drains
+the queue in batches of VIDEO_BATCH_SIZE through app.inference, so the
+next frames are decoded and preprocessed while a forward runs, and the
+queue bound (VIDEO_QUEUE_DEPTH) keeps memory flat when decoding is the
+faster side. stats() reports how long each side waited on the other.
+
+Frames go through the same backend, process pool and preprocessing as
+/predict, so a frame scores as it would as a still. Results are stored in
+video_clip (the clip summary) and video_frame (per-frame detections or
+probability), see database/migrations/006_video_clips.sql.
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+import cv2
+import torch
+from PIL import Image
+from psycopg2.extras import execute_values
+
+from config import Config
+from app.db import get_db_connection, close_db_connection
+from app.inference import model_version, detect_yolo_batch, detect_yolo_tiled, predict_cnn_batch
+from app.storage import blob_store, COPY_CHUNK_SIZE
+from preprocessing import (preprocess_image_for_yolo, preprocess_image_for_cnn, reduce_image, yolo_frame_mapping,
+                           CNN_INPUT_SIZE, YOLO_INPUT_SIZE)
+
+VIDEO_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
+
+CLIP_COLUMNS = ("original_filename, video_path, content_hash, model_type, model_version, frame_stride, fps, width, "
+                "height, duration_seconds, frames_decoded, frames_scored, positive_frames, first_positive_seconds, "
+                "max_confidence, max_cnn_probability, mean_cnn_probability, processing_time")
+SUMMARY_FIELDS = [c.strip() for c in CLIP_COLUMNS.split(',')][3:]
+
+_END = object()  # Queued by the decoder after the last frame
+
+
+class VideoError(Exception):
+    """A clip that cannot be ingested, with the message and HTTP status the API reports."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def video_extension(filename):
+    """Lower-case extension of an accepted video filename, or None."""
+    extension = os.path.splitext(filename or '')[1][1:].lower()
+    return extension if extension in VIDEO_EXTENSIONS else None
+
+
+def spool_video(stream, extension, max_bytes=None, chunk_size=None):
+    """Copies an upload stream to a named temp file in chunks (OpenCV decodes from a path), hashing it on the way.
+
+    Returns (path, hex SHA-256); the caller removes the file. Raises
+    VideoError past max_bytes (VIDEO_MAX_UPLOAD_BYTES) or when empty.
+    """
+    max_bytes = Config.VIDEO_MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+    digest = hashlib.sha256()
+    size = 0
+    spool = tempfile.NamedTemporaryFile(suffix='.' + extension, delete=False)
+    try:
+        with spool:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise VideoError(f'Video too large (max {max_bytes} bytes)', 413)
+                digest.update(chunk)
+                spool.write(chunk)
+        if not size:
+            raise VideoError('No video provided')
+        return spool.name, digest.hexdigest()
+    except Exception:
+        os.remove(spool.name)
+        raise
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_video(path, extension, digest):
+    """Stores the clip in the blob store and returns its key (for video_clip.video_path)."""
+    with open(path, 'rb') as f:
+        return blob_store.put_file(f, '.' + extension, digest)
+
+
+def frame_input(frame, model_type):
+    """A decoded BGR frame as the input the batch forward takes (None if preprocessing fails)."""
+    image = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    if model_type == 'cnn':
+        return preprocess_image_for_cnn(reduce_image(image, CNN_INPUT_SIZE))
+    if Config.YOLO_TILING_ENABLED and max(image.size) > Config.YOLO_TILE_SIZE:
+        return image  # Sliced per frame by detect_yolo_tiled
+    return preprocess_image_for_yolo(reduce_image(image, YOLO_INPUT_SIZE))
+
+
+def _put(frames, item, stop):
+    """Blocking put that gives up once the consumer has stopped. Returns the seconds spent blocked."""
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            frames.put(item, timeout=0.1)
+            break
+        except queue.Full:
+            continue
+    return time.perf_counter() - start
+
+
+def summarize(frames, model_type):
+    """Clip-level fields of video_clip from the scored frames (in frame order)."""
+    if model_type == 'cnn':
+        positive = [f for f in frames if f['cnn_probability'] >= Config.CNN_CONFIDENCE_THRESHOLD]
+        probabilities = [f['cnn_probability'] for f in frames]
+    else:
+        positive = [f for f in frames if f['max_confidence'] is not None]
+        probabilities = []
+    confidences = [f['max_confidence'] for f in frames if f.get('max_confidence') is not None]
+    return {
+        'frames_scored': len(frames),
+        'positive_frames': len(positive),
+        'first_positive_seconds': positive[0]['time_seconds'] if positive else None,
+        'max_confidence': max(confidences, default=None),
+        'max_cnn_probability': max(probabilities, default=None),
+        'mean_cnn_probability': sum(probabilities) / len(probabilities) if probabilities else None,
+    }
+
+
+class VideoIngestor:
+    """Decoder thread + batched inference over one clip at a time per caller, with process-wide counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clips = 0
+        self.failed = 0
+        self.frames_decoded = 0
+        self.frames_scored = 0
+        self.frames_failed = 0
+        self.batches = 0
+        self.decode_seconds = 0.0  # Decoder thread: reading, converting and preprocessing frames
+        self.inference_seconds = 0.0
+        self.waiting_on_decoder_seconds = 0.0  # Inference side idle, queue empty
+        self.waiting_on_inference_seconds = 0.0  # Decoder blocked, queue full
+
+    def _decode(self, capture, model_type, stride, max_frames, frames, stop, counts):
+        """Producer: queues (frame_index, model input, (width, height)) for every stride-th frame, then _END
+        (or the exception).
+        """
+        index = 0
+        try:
+            while counts['queued'] < max_frames and not stop.is_set():
+                start = time.perf_counter()
+                if index % stride:
+                    if not capture.grab():
+                        break
+                    counts['decode_seconds'] += time.perf_counter() - start
+                else:
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    model_input = frame_input(frame, model_type)
+                    counts['decode_seconds'] += time.perf_counter() - start
+                    if model_input is None:
+                        counts['failed'] += 1
+                    else:
+                        counts['queued'] += 1
+                        frame_size = (frame.shape[1], frame.shape[0])
+                        counts['blocked_seconds'] += _put(frames, (index, model_input, frame_size), stop)
+                index += 1
+            counts['decoded'] = index
+            _put(frames, _END, stop)
+        except Exception as e:
+            counts['decoded'] = index
+            _put(frames, e, stop)
+
+    def _infer(self, batch, model_type, fps):
+        """One forward over a batch of (frame_index, model input, frame size); returns the per-frame result dicts.
+
+        Boxes are in frame pixels, tiled or not.
+        """
+        indices = [index for index, _, _ in batch]
+        inputs = [model_input for _, model_input, _ in batch]
+        times = [round(index / fps, 3) if fps else None for index in indices]
+        if model_type == 'cnn':
+            probabilities = predict_cnn_batch(torch.cat(inputs))
+            if min(probabilities) == -1.0:
+                raise VideoError('CNN model not loaded', 500)
+            return [{'frame_index': index, 'time_seconds': t, 'cnn_probability': float(p)}
+                    for index, t, p in zip(indices, times, probabilities)]
+
+        if isinstance(inputs[0], Image.Image):
+            detections = [detect_yolo_tiled(image) for image in inputs]
+        else:
+            detections = [d.transformed(*yolo_frame_mapping(*frame_size))
+                          for d, (_, _, frame_size) in zip(detect_yolo_batch(inputs), batch)]
+        return [{'frame_index': index, 'time_seconds': t, 'yolo_detections': d.to_list(),
+                 'max_confidence': d.max_confidence()}
+                for index, t, d in zip(indices, times, detections)]
+
+    def score(self, path, model_type, stride=None, max_frames=None, batch_size=None):
+        """Scores every stride-th frame of a local video file, up to max_frames of them.
+
+        Returns the video_clip fields (without filename/path/hash) plus
+        'frames', the per-frame results. Raises VideoError if the file
+        cannot be opened or decoding fails part-way.
+        """
+        stride = max(1, stride or Config.VIDEO_FRAME_STRIDE)
+        max_frames = max(1, max_frames or Config.VIDEO_MAX_FRAMES)
+        batch_size = max(1, batch_size or Config.VIDEO_BATCH_SIZE)
+        start_time = time.time()
+
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            capture.release()
+            self._count_failure()
+            raise VideoError('Invalid video')
+        fps = capture.get(cv2.CAP_PROP_FPS) or None
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)) or None
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) or None
+
+        frames = queue.Queue(maxsize=max(1, Config.VIDEO_QUEUE_DEPTH))
+        stop = threading.Event()
+        counts = {'queued': 0, 'decoded': 0, 'failed': 0, 'decode_seconds': 0.0, 'blocked_seconds': 0.0}
+        decoder = threading.Thread(target=self._decode, name="video-decoder", daemon=True,
+                                   args=(capture, model_type, stride, max_frames, frames, stop, counts))
+        results, batch = [], []
+        batches, idle_seconds, inference_seconds = 0, 0.0, 0.0
+        decoder.start()
+        try:
+            done = False
+            while not done:
+                waited = time.perf_counter()
+                item = frames.get()
+                idle_seconds += time.perf_counter() - waited
+                if item is _END:
+                    done = True
+                elif isinstance(item, Exception):
+                    raise VideoError(f'Failed to decode video: {item}')
+                else:
+                    batch.append(item)
+                if batch and (done or len(batch) >= batch_size):
+                    forward = time.perf_counter()
+                    results.extend(self._infer(batch, model_type, fps))
+                    inference_seconds += time.perf_counter() - forward
+                    batches += 1
+                    batch = []
+        except Exception:
+            self._count_failure()
+            raise
+        finally:
+            stop.set()
+            decoder.join()
+            capture.release()
+
+        if not counts['decoded']:
+            self._count_failure()
+            raise VideoError('Invalid video')
+
+        with self._lock:
+            self.clips += 1
+            self.frames_decoded += counts['decoded']
+            self.frames_scored += len(results)
+            self.frames_failed += counts['failed']
+            self.batches += batches
+            self.decode_seconds += counts['decode_seconds']
+            self.inference_seconds += inference_seconds
+            self.waiting_on_decoder_seconds += idle_seconds
+            self.waiting_on_inference_seconds += counts['blocked_seconds']
+
+        if fps:
+            duration = (frame_count if frame_count > 0 else counts['decoded']) / fps
+        else:
+            duration = None
+        clip = {
+            'model_type': model_type,
+            'model_version': model_version(model_type),
+            'frame_stride': stride,
+            'fps': fps,
+            'width': width,
+            'height': height,
+            'duration_seconds': duration,
+            'frames_decoded': counts['decoded'],
+            'processing_time': time.time() - start_time,
+            'frames': results,
+        }
+        clip.update(summarize(results, model_type))
+        return clip
+
+    def _count_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clips': self.clips,
+                'failed': self.failed,
+                'frames_decoded': self.frames_decoded,
+                'frames_scored': self.frames_scored,
+                'frames_failed': self.frames_failed,
+                'batches': self.batches,
+                'decode_seconds': round(self.decode_seconds, 3),
+                'inference_seconds': round(self.inference_seconds, 3),
+                'waiting_on_decoder_seconds': round(self.waiting_on_decoder_seconds, 3),
+                'waiting_on_inference_seconds': round(self.waiting_on_inference_seconds, 3),
+            }
+
+
+video_ingestor = VideoIngestor()
+
+
+def save_clip(clip, original_filename, video_path, content_hash):
+    """Inserts the video_clip row and its video_frame rows in one transaction. Returns the clip id."""
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError('Failed to connect to database')
+    try:
+        cur = conn.cursor()
+        values = [original_filename, video_path, content_hash, clip['model_type']] + [clip[f] for f in SUMMARY_FIELDS]
+        cur.execute(f"INSERT INTO video_clip ({CLIP_COLUMNS}) VALUES ({', '.join(['%s'] * len(values))}) RETURNING id",
+                    values)
+        clip_id = cur.fetchone()[0]
+        rows = [(clip_id, f['frame_index'], f['time_seconds'],
+                 json.dumps(f['yolo_detections']) if 'yolo_detections' in f else None,
+                 f.get('cnn_probability'), f.get('max_confidence'))
+                for f in clip['frames']]
+        if rows:
+            execute_values(
+                cur,
+                "INSERT INTO video_frame (clip_id, frame_index, time_seconds, yolo_detections, cnn_probability, "
+                "max_confidence) VALUES %s",
+                rows,
+                page_size=1000,
+            )
+        conn.commit()
+        return clip_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        close_db_connection(conn)
+
+
+def load_clip(clip_id, with_frames=True):
+    """The stored clip summary (and its frames, in order), or None if there is no such clip."""
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError('Failed to connect to database')
+    try:
+        cur = conn.cursor()
+        cur.execute(f"SELECT id, {CLIP_COLUMNS}, timestamp FROM video_clip WHERE id = %s", (clip_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None
+        clip = dict(zip([d[0] for d in cur.description], row))
+        clip['timestamp'] = clip['timestamp'].isoformat()
+        if with_frames:
+            cur.execute(
+                "SELECT frame_index, time_seconds, yolo_detections, cnn_probability, max_confidence "
+                "FROM video_frame WHERE clip_id = %s ORDER BY frame_index",
+                (clip_id,)
+            )
+            names = [d[0] for d in cur.description]
+            clip['frames'] = [dict(zip(names, r)) for r in cur.fetchall()]
+        conn.commit()
+        return clip
+    finally:
+        close_db_connection(conn)
+
+
+if __name__ == '__main__':
+    from flask import Flask
+    from app.inference import load_models
+
+    parser = argparse.ArgumentParser(description="Score a local video clip and store the results.")
+    parser.add_argument('path', help="Video file to ingest")
+    parser.add_argument('--model-type', choices=['yolo', 'cnn'], default='yolo')
+    parser.add_argument('--stride', type=int, default=None, help="Score every Nth frame (default VIDEO_FRAME_STRIDE)")
+    parser.add_argument('--max-frames', type=int, default=None, help="Frames to score (default VIDEO_MAX_FRAMES)")
+    parser.add_argument('--batch-size', type=int, default=None, help="Frames per forward (default VIDEO_BATCH_SIZE)")
+    parser.add_argument('--no-save', action='store_true', help="Print the summary without storing anything")
+    args = parser.parse_args()
+
+    load_models()
+    clip = video_ingestor.score(args.path, args.model_type, args.stride, args.max_frames, args.batch_size)
+    if not args.no_save:
+        with Flask(__name__).app_context():
+            extension = os.path.splitext(args.path)[1][1:].lower()
+            digest = file_digest(args.path)
+            clip['id'] = save_clip(clip, os.path.basename(args.path), store_video(args.path, extension, digest),
+                                   digest)
+    clip.pop('frames')
+    print(json.dumps({'clip': clip, 'pipeline': video_ingestor.stats()}, indent=2))
@@ -0,0 +1,283 @@
+# app/write_behind.py
+"""Write-behind persistence of image_result rows.
+
+With WRITE_BEHIND_ENABLED, /predict no longer waits for its own INSERT and
+COMMIT. Ids are handed out from a block prefetched from the image_result
+id sequence, so the response still carries the final id; the row goes
+into an in-memory buffer that a background thread writes with one
+multi-row INSERT whenever WRITE_BEHIND_MAX_ROWS rows are waiting or the
+oldest has waited WRITE_BEHIND_MAX_DELAY_MS.
+
+Reads of an id that is still buffered (/results, /get_image) flush first,
+so clients never see a 404 for an id they were just given. The buffer is
+drained at interpreter exit; rows that still cannot be written are
+appended to WRITE_BEHIND_SPILL_PATH and replayed on the next start. Rows
+the database itself rejects are found by retrying a failed batch row by
+row and go straight to the spill file, so they cannot block later writes.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+import psycopg2
+from flask import current_app
+from psycopg2.extras import execute_values
+
+from config import Config
+from app.db import get_db_connection, close_db_connection
+
+RESERVE_IDS_SQL = "SELECT nextval(pg_get_serial_sequence('image_result', 'id')) FROM generate_series(1, %s)"
+
+
+class ResultWriter:
+    """Buffers image_result rows with pre-assigned ids and writes them in batches."""
+
+    def __init__(self, app, columns, max_rows=200, max_delay_ms=200, id_block=100, spill_path=None):
+        self._app = app
+        self.columns = columns
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max_delay_ms / 1000.0
+        self.id_block = max(1, id_block)
+        self.spill_path = spill_path
+
+        self._ids = []
+        self._ids_lock = threading.Lock()
+        self._buffer = []  # (id, *row)
+        self._pending_ids = set()  # buffered or being flushed
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        # Counters (guarded by self._lock)
+        self._submitted = 0
+        self._flushes = 0
+        self._flushed_rows = 0
+        self._failed_flushes = 0
+        self._rejected_rows = 0
+        self._spilled_rows = 0
+        self._last_flush_seconds = 0.0
+
+    def start(self):
+        self._replay_spill()
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Stops the flusher and writes out everything still buffered (spilling it if that fails)."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        with self._app.app_context():
+            if not self.flush():
+                self._spill()
+
+    def _reserve_id(self):
+        with self._ids_lock:
+            if not self._ids:
+                conn = get_db_connection()
+                if conn is None:
+                    raise RuntimeError('Failed to connect to database')
+                try:
+                    cur = conn.cursor()
+                    cur.execute(RESERVE_IDS_SQL, (self.id_block,))
+                    self._ids = [row[0] for row in cur.fetchall()][::-1]
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    close_db_connection(conn)
+            return self._ids.pop()
+
+    def submit(self, row):
+        """Buffers one row (matching self.columns) and returns the id it will be stored under."""
+        return self.submit_many([row])[0]
+
+    def submit_many(self, rows):
+        ids = [self._reserve_id() for _ in rows]
+        with self._lock:
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.extend((result_id,) + tuple(row) for result_id, row in zip(ids, rows))
+            self._pending_ids.update(ids)
+            self._submitted += len(ids)
+            full = len(self._buffer) >= self.max_rows
+        if full:
+            self._wakeup.set()
+        return ids
+
+    def ensure_flushed(self, result_id):
+        """Writes the buffer now if result_id is still waiting in it."""
+        with self._lock:
+            pending = result_id in self._pending_ids
+        if pending:
+            self.flush()
+
+    def _run(self):
+        with self._app.app_context():
+            while not self._stopping.is_set():
+                with self._lock:
+                    due = self._oldest + self.max_delay if self._buffer else None
+                timeout = self.max_delay if due is None else max(0.0, due - time.monotonic())
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+                with self._lock:
+                    ready = self._buffer and (len(self._buffer) >= self.max_rows
+                                              or time.monotonic() >= self._oldest + self.max_delay)
+                if ready and not self.flush():
+                    time.sleep(min(self.max_delay * 5, 1.0))  # Back off while the database is unavailable
+
+    def flush(self):
+        """Writes all buffered rows in one INSERT; on failure they are put back. Returns True on success.
+
+        If the database rejects the batch itself (a bad value, a constraint),
+        the rows are retried one at a time so the good ones are written and
+        the rejected ones are spilled instead of blocking every later flush.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer, self._oldest = self._buffer, [], None
+            if not batch:
+                return True
+
+            start = time.perf_counter()
+            rejected = []
+            conn = get_db_connection()
+            try:
+                if conn is None:
+                    raise RuntimeError('Failed to connect to database')
+                cur = conn.cursor()
+                try:
+                    self._insert(cur, batch)
+                except psycopg2.DatabaseError as e:
+                    if isinstance(e, psycopg2.OperationalError) or conn.closed:
+                        raise  # The database, not the data: retry the whole batch later
+                    current_app.logger.warning(f"Batch of {len(batch)} buffered results rejected ({e}), "
+                                               f"retrying row by row")
+                    conn.rollback()
+                    rejected = self._insert_row_by_row(cur, batch)
+                conn.commit()
+            except Exception as e:
+                current_app.logger.error(f"Error flushing {len(batch)} buffered results: {e}")
+                if conn is not None and not conn.closed:
+                    conn.rollback()
+                with self._lock:
+                    self._buffer[:0] = batch
+                    self._oldest = time.monotonic() if self._oldest is None else self._oldest
+                    self._failed_flushes += 1
+                return False
+            finally:
+                if conn is not None:
+                    close_db_connection(conn)
+
+            if rejected:
+                self._append_spill(rejected)
+            with self._lock:
+                self._pending_ids.difference_update(row[0] for row in batch)
+                self._flushes += 1
+                self._flushed_rows += len(batch) - len(rejected)
+                self._rejected_rows += len(rejected)
+                self._last_flush_seconds = time.perf_counter() - start
+            return True
+
+    def _insert(self, cur, rows):
+        execute_values(
+            cur,
+            f"INSERT INTO image_result (id, {self.columns}) VALUES %s ON CONFLICT (id, timestamp) DO NOTHING",
+            rows,
+            page_size=len(rows),
+        )
+
+    def _insert_row_by_row(self, cur, batch):
+        """Inserts each row under its own savepoint; returns the rows the database rejected."""
+        rejected = []
+        for row in batch:
+            cur.execute("SAVEPOINT write_behind_row")
+            try:
+                self._insert(cur, [row])
+            except psycopg2.DatabaseError as e:
+                if isinstance(e, psycopg2.OperationalError):
+                    raise
+                cur.execute("ROLLBACK TO SAVEPOINT write_behind_row")
+                current_app.logger.error(f"Buffered result {row[0]} rejected by the database: {e}")
+                rejected.append(row)
+            else:
+                cur.execute("RELEASE SAVEPOINT write_behind_row")
+        return rejected
+
+    def _spill(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._append_spill(batch)
+
+    def _append_spill(self, rows):
+        if not self.spill_path:
+            print(f"Dropped {len(rows)} unwritten results (no WRITE_BEHIND_SPILL_PATH)")
+            return
+        os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+        with open(self.spill_path, 'a') as f:
+            for row in rows:
+                f.write(json.dumps(row, default=str) + '\n')
+        with self._lock:
+            self._spilled_rows += len(rows)
+        print(f"Spilled {len(rows)} unwritten results to {self.spill_path}")
+
+    def _replay_spill(self):
+        """Re-buffers rows spilled by a previous process so the next flush writes them."""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return
+        replay_path = self.spill_path + '.replay'
+        os.replace(self.spill_path, replay_path)
+        with open(replay_path) as f:
+            rows = [tuple(json.loads(line)) for line in f if line.strip()]
+        with self._lock:
+            self._buffer.extend(rows)
+            self._pending_ids.update(row[0] for row in rows)
+            self._oldest = time.monotonic()
+        os.remove(replay_path)
+        print(f"Replaying {len(rows)} spilled results from {self.spill_path}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                'buffered': len(self._buffer),
+                'submitted': self._submitted,
+                'flushes': self._flushes,
+                'flushed_rows': self._flushed_rows,
+                'mean_rows_per_flush': (self._flushed_rows / self._flushes) if self._flushes else 0.0,
+                'failed_flushes': self._failed_flushes,
+                'rejected_rows': self._rejected_rows,
+                'spilled_rows': self._spilled_rows,
+                'last_flush_ms': self._last_flush_seconds * 1000,
+            }
+
+
+result_writer = None
+
+
+def start_result_writer(app, columns):
+    """Starts the process-wide writer (no-op unless WRITE_BEHIND_ENABLED)."""
+    global result_writer
+    if result_writer is None and Config.WRITE_BEHIND_ENABLED:
+        result_writer = ResultWriter(
+            app,
+            columns,
+            max_rows=Config.WRITE_BEHIND_MAX_ROWS,
+            max_delay_ms=Config.WRITE_BEHIND_MAX_DELAY_MS,
+            id_block=Config.WRITE_BEHIND_ID_BLOCK,
+            spill_path=Config.WRITE_BEHIND_SPILL_PATH,
+        )
+        result_writer.start()
+    return result_writer
+
+
+def write_behind_stats():
+    return result_writer.stats() if result_writer is not None else {'enabled': False}
@@ -0,0 +1,5 @@
+# asgi.py
+# ASGI entrypoint: hypercorn asgi:app --bind 0.0.0.0:8080 --workers 1
+from app.asgi import create_asgi_app
+
+app = create_asgi_app()
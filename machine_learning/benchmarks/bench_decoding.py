@@ -0,0 +1,85 @@
+# benchmarks/bench_decoding.py
+"""Full-resolution vs reduced-resolution (JPEG draft) decoding of model inputs.
+
+Run from machine_learning/:
+
+    python benchmarks/bench_decoding.py --repeat 20
+
+Every image in test_images/ is also re-encoded at 1920x1080 and 3840x2160
+(camera resolutions) and as PNG, which has no reduced decode. For each
+input and model size it reports decode + resize time for the full decode
+(the old path) and preprocessing.decode_image, and the size of the decoded
+pixel buffer, which is what dominates peak memory per request.
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import CNN_INPUT_SIZE, YOLO_INPUT_SIZE, decode_image  # noqa: E402
+
+TEST_IMAGES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'test_images')
+RESOLUTIONS = [None, (1920, 1080), (3840, 2160)]
+
+
+def encode(image, size, image_format):
+    if size is not None:
+        image = image.resize(size, Image.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **({'quality': 90} if image_format == 'JPEG' else {}))
+    return buffer.getvalue(), image.size
+
+
+def full_decode(data, size):
+    return Image.open(io.BytesIO(data)).convert('RGB').resize(size, Image.BILINEAR)
+
+
+def reduced_decode(data, size):
+    return decode_image(data, size).resize(size, Image.BILINEAR)
+
+
+def decoded_megabytes(data, size=None):
+    """Bytes of the RGB buffer the decoder produces (draft only sets the scale, nothing is decoded)."""
+    image = Image.open(io.BytesIO(data))
+    if size is not None and image.format == 'JPEG':
+        image.draft('RGB', size)
+    return image.width * image.height * 3 / 2 ** 20
+
+
+def time_ms(fn, data, size, repeat):
+    fn(data, size)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(data, size)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default=TEST_IMAGES)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'image':<26}{'format':>7}{'source':>11}{'model':>6}{'full ms':>9}{'draft ms':>10}{'speedup':>9}"
+          f"{'full MB':>9}{'draft MB':>10}")
+    for path in sorted(glob.glob(os.path.join(args.images, '*.jpg'))):
+        original = Image.open(path).convert('RGB')
+        for image_format in ('JPEG', 'PNG'):
+            for resolution in RESOLUTIONS:
+                data, (width, height) = encode(original, resolution, image_format)
+                for model, size in (('yolo', YOLO_INPUT_SIZE), ('cnn', CNN_INPUT_SIZE)):
+                    full = time_ms(full_decode, data, size, args.repeat)
+                    reduced = time_ms(reduced_decode, data, size, args.repeat)
+                    print(f"{os.path.basename(path):<26}{image_format:>7}{f'{width}x{height}':>11}{model:>6}"
+                          f"{full:>9.2f}{reduced:>10.2f}{full / reduced:>8.1f}x"
+                          f"{decoded_megabytes(data):>9.1f}{decoded_megabytes(data, size):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
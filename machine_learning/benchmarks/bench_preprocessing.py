@@ -0,0 +1,92 @@
+# benchmarks/bench_preprocessing.py
+"""Per-image CNN preprocessing time: legacy vs prebuilt pipeline vs vectorized paths.
+
+Run from machine_learning/:
+
+    python benchmarks/bench_preprocessing.py --repeat 200 --batch 8
+
+'legacy' rebuilds transforms.Compose on every call (the old behaviour),
+'prebuilt' reuses CNN_TRANSFORM, 'vectorized' is preprocess_image_for_cnn
+and 'batch' is preprocess_batch_for_cnn over --batch images at a time.
+Images are decoded once up front so only preprocessing is timed.
+"""
+import argparse
+import os
+import sys
+import time
+
+import torch
+import torchvision.transforms as transforms
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from preprocessing import (  # noqa: E402
+    CNN_INPUT_SIZE,
+    CNN_TRANSFORM,
+    to_rgb_image,
+    preprocess_image_for_cnn,
+    preprocess_batch_for_cnn,
+)
+
+
+def legacy(image):
+    transform = transforms.Compose([
+        transforms.Resize(CNN_INPUT_SIZE, antialias=True),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    ])
+    return transform(image).unsqueeze(0)
+
+
+def prebuilt(image):
+    return CNN_TRANSFORM(image).unsqueeze(0)
+
+
+def time_per_image(fn, images, repeat):
+    fn(images[0])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for image in images:
+            fn(image)
+    return (time.perf_counter() - start) / (repeat * len(images))
+
+
+def time_batched(images, repeat, batch_size):
+    batch = (images * batch_size)[:batch_size]
+    preprocess_batch_for_cnn(batch)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        preprocess_batch_for_cnn(batch)
+    return (time.perf_counter() - start) / (repeat * batch_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default='test_images')
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--batch', type=int, default=8)
+    args = parser.parse_args()
+
+    images = []
+    for name in sorted(os.listdir(args.images)):
+        with open(os.path.join(args.images, name), 'rb') as f:
+            images.append(to_rgb_image(f.read()))
+
+    reference = prebuilt(images[0])
+    max_diff = float((reference - preprocess_image_for_cnn(images[0]).cpu()).abs().max())
+    print(f"{len(images)} images, torch threads: {torch.get_num_threads()}, "
+          f"max |vectorized - torchvision| = {max_diff:.2e}")
+
+    results = {
+        'legacy': time_per_image(legacy, images, args.repeat),
+        'prebuilt': time_per_image(prebuilt, images, args.repeat),
+        'vectorized': time_per_image(preprocess_image_for_cnn, images, args.repeat),
+        f'batch x{args.batch}': time_batched(images, args.repeat, args.batch),
+    }
+    baseline = results['legacy']
+    for name, seconds in results.items():
+        print(f"{name:<12}{seconds * 1e3:>9.3f} ms/image {baseline / seconds:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
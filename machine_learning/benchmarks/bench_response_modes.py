@@ -0,0 +1,85 @@
+# benchmarks/bench_response_modes.py
+"""Compares response size and latency of the /predict and /results response modes.
+
+Run against a live backend (e.g. the docker-compose stack):
+
+    python benchmarks/bench_response_modes.py --url http://127.0.0.1:8080 \
+        --image test_images/test_yolo_smoke_1.jpg --model yolo --requests 50
+
+For every mode ('base64', 'url', 'binary') it reports mean response bytes and
+p50/p95 latency for POST /predict and GET /results/<id>.
+"""
+import argparse
+import os
+import statistics
+import time
+
+import requests
+
+MODES = ['base64', 'url', 'binary']
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_request(method, url, **kwargs):
+    start = time.perf_counter()
+    response = requests.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return response, elapsed
+
+
+def bench_mode(base_url, image_bytes, filename, model_type, mode, n_requests):
+    predict_sizes, predict_times = [], []
+    result_sizes, result_times = [], []
+
+    for _ in range(n_requests):
+        response, elapsed = time_request(
+            'POST', f"{base_url}/predict",
+            files={'image': (filename, image_bytes, 'image/jpeg')},
+            data={'model_type': model_type, 'response': mode},
+        )
+        predict_sizes.append(len(response.content))
+        predict_times.append(elapsed)
+
+        if mode == 'binary':
+            result_id = response.headers['X-Result-Id']
+        else:
+            result_id = response.json()['id']
+
+        response, elapsed = time_request('GET', f"{base_url}/results/{result_id}", params={'response': mode})
+        result_sizes.append(len(response.content))
+        result_times.append(elapsed)
+
+    return {
+        'predict': (statistics.mean(predict_sizes), percentile(predict_times, 50), percentile(predict_times, 95)),
+        'results': (statistics.mean(result_sizes), percentile(result_times, 50), percentile(result_times, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--image', default=os.path.join('test_images', 'test_yolo_smoke_1.jpg'))
+    parser.add_argument('--model', default='yolo', choices=['yolo', 'cnn'])
+    parser.add_argument('--requests', type=int, default=30)
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        image_bytes = f.read()
+    filename = os.path.basename(args.image)
+
+    print(f"Image: {filename} ({len(image_bytes)} bytes), model: {args.model}, {args.requests} requests per mode")
+    print(f"{'endpoint':<10}{'mode':<8}{'mean bytes':>12}{'p50 ms':>10}{'p95 ms':>10}")
+    for mode in MODES:
+        stats = bench_mode(args.url, image_bytes, filename, args.model, mode, args.requests)
+        for endpoint, (size, p50, p95) in stats.items():
+            print(f"{endpoint:<10}{mode:<8}{size:>12.0f}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
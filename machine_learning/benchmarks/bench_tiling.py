@@ -0,0 +1,88 @@
+# benchmarks/bench_tiling.py
+"""Latency of sliced YOLO inference against the number of tiles per frame.
+
+Run from machine_learning/:
+
+    python benchmarks/bench_tiling.py --width 1920 --height 1080 --repeat 10
+
+The frame (a test image, resized to --width x --height) is run once as a
+single whole-frame pass and then with tile sizes chosen to give roughly
+2x1, 3x2, 4x3 ... tiles. For each it reports the inputs per forward
+(tiles plus the whole-frame view) and the mean time spent tiling, in the
+batched forward and merging the boxes. --random-weights builds YOLOv8n
+without the checkpoint, for machines that only have the Git LFS pointer
+files.
+"""
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import yolo as torch_yolo  # noqa: E402
+from models.detections import merge_views  # noqa: E402
+from preprocessing import tile_image_for_yolo, tile_grid  # noqa: E402
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'test_images', 'test_yolo_smoke_1.jpg')
+
+
+def time_tiling(frame, tile_size, overlap, max_tiles, merge, repeat):
+    stages = {'tile': 0.0, 'forward': 0.0, 'merge': 0.0}
+    inputs = 0
+    for i in range(repeat + 1):  # The first run is a warm-up
+        start = time.perf_counter()
+        arrays, mappings = tile_image_for_yolo(frame, tile_size, overlap, max_tiles)
+        tiled = time.perf_counter()
+        parts = torch_yolo.detect_batch(arrays)
+        forwarded = time.perf_counter()
+        merge_views(parts, mappings, merge)
+        merged = time.perf_counter()
+        if i:
+            stages['tile'] += tiled - start
+            stages['forward'] += forwarded - tiled
+            stages['merge'] += merged - forwarded
+        inputs = len(arrays)
+    return inputs, {name: seconds / repeat * 1000 for name, seconds in stages.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image', default=DEFAULT_IMAGE)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--overlap', type=float, default=0.2)
+    parser.add_argument('--merge', choices=['nms', 'wbf'], default='nms')
+    parser.add_argument('--max-columns', type=int, default=6)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--random-weights', action='store_true')
+    args = parser.parse_args()
+
+    if args.random_weights:
+        from ultralytics import YOLO
+        torch_yolo.yolo_model = YOLO('yolov8n.yaml')
+    elif not torch_yolo.ensure_model_loaded():
+        sys.exit("YOLO model not available (use --random-weights)")
+
+    frame = Image.open(args.image).convert('RGB').resize((args.width, args.height), Image.BILINEAR)
+    print(f"Frame {args.width}x{args.height}, overlap {args.overlap}, merge {args.merge}")
+    print(f"{'tile px':>8}{'tiles':>7}{'inputs':>8}{'tile ms':>9}{'forward ms':>12}{'merge ms':>10}{'total ms':>10}")
+
+    # Whole frame only (tile as large as the frame), then progressively finer grids
+    tile_sizes = [max(args.width, args.height)]
+    for columns in range(2, args.max_columns + 1):
+        tile_sizes.append(int(args.width / (columns - (columns - 1) * args.overlap)) + 1)
+
+    for tile_size in tile_sizes:
+        corners, _ = tile_grid(args.width, args.height, tile_size, args.overlap, max_tiles=1000)
+        tiles = len(corners) if len(corners) > 1 else 0  # 0: whole-frame pass only
+        inputs, ms = time_tiling(frame, tile_size, args.overlap, 1000, args.merge, args.repeat)
+        print(f"{tile_size:>8}{tiles:>7}{inputs:>8}{ms['tile']:>9.1f}{ms['forward']:>12.1f}{ms['merge']:>10.2f}"
+              f"{sum(ms.values()):>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
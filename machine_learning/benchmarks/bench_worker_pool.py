@@ -0,0 +1,92 @@
+# benchmarks/bench_worker_pool.py
+"""Throughput and memory of the forked inference pool as workers scale 1 -> core count.
+
+Run from machine_learning/:
+
+    python benchmarks/bench_worker_pool.py --model cnn --batches 40 --batch-size 4
+
+For each worker count it reports images/s plus RSS and PSS per worker.
+RSS counts shared weight pages in every process; PSS splits them between
+the processes sharing them, so it shows the real per-worker cost.
+--random-weights builds the ConvNeXt without a checkpoint, for machines
+that only have the Git LFS pointer files.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import psutil
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import inference  # noqa: E402
+from app.process_pool import InferenceProcessPool  # noqa: E402
+from models import cnn as torch_cnn  # noqa: E402
+from preprocessing import CNN_INPUT_SIZE, YOLO_INPUT_SIZE  # noqa: E402
+
+
+def worker_counts(max_workers):
+    counts, n = [], 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+
+def memory_mb(pids):
+    rss, pss = [], []
+    for pid in pids:
+        info = psutil.Process(pid).memory_full_info()
+        rss.append(info.rss / 2 ** 20)
+        pss.append(getattr(info, 'pss', info.uss) / 2 ** 20)
+    return float(np.mean(rss)), float(np.mean(pss))
+
+
+def run(pool, model, batches, batch_size, clients):
+    if model == 'cnn':
+        payload = torch.zeros(batch_size, 3, *CNN_INPUT_SIZE)
+        call = lambda _: pool.predict_cnn_batch(payload)  # noqa: E731
+    else:
+        payload = [np.zeros((YOLO_INPUT_SIZE[1], YOLO_INPUT_SIZE[0], 3), dtype=np.uint8)] * batch_size
+        call = lambda _: pool.detect_yolo_batch(payload)  # noqa: E731
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(call, range(batches)))
+    return batches * batch_size / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', choices=['cnn', 'yolo'], default='cnn')
+    parser.add_argument('--batches', type=int, default=40)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--max-workers', type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument('--random-weights', action='store_true')
+    args = parser.parse_args()
+
+    if args.random_weights:
+        torch_cnn.cnn_model = torch_cnn.initialize_cnn_model().eval()
+    else:
+        inference.load_models()
+
+    parent_rss = psutil.Process().memory_info().rss / 2 ** 20
+    print(f"Parent RSS with models loaded: {parent_rss:.0f} MB")
+    print(f"{'workers':>8}{'threads':>9}{'images/s':>10}{'RSS MB/worker':>15}{'PSS MB/worker':>15}")
+
+    for workers in worker_counts(args.max_workers):
+        pool = InferenceProcessPool(workers)
+        pool.start()
+        run(pool, args.model, workers, args.batch_size, workers)  # warm-up
+        throughput = run(pool, args.model, args.batches, args.batch_size, clients=workers * 2)
+        rss, pss = memory_mb(pool.pids())
+        print(f"{workers:>8}{pool.threads_per_worker:>9}{throughput:>10.1f}{rss:>15.0f}{pss:>15.0f}")
+        pool.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -16,11 +16,119 @@ class Config:
         # Do not attempt to write to a file
     DATABASE_URL = os.environ['DATABASE_URL']  # MUST be set in the environment
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # psycopg2 connection pool (see app/db.py)
+    DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+    DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 20))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # Seconds to wait for a free connection
+    DB_POOL_VALIDATE_AFTER = float(os.environ.get('DB_POOL_VALIDATE_AFTER', 30))  # Ping connections idle longer than this
+    DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', '1') == '1'  # Turn off behind pgbouncer transaction pooling
+
+    # Upload ingestion (see app.utils.UploadedImage.from_stream); both limits are checked before decoding
+    MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 25 * 1024 * 1024))  # Per image
+    MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 50_000_000))  # Width x height from the header, checked per upload
+    UPLOAD_SPOOL_MAX_MEMORY = int(os.environ.get('UPLOAD_SPOOL_MAX_MEMORY', 1024 * 1024))  # Larger uploads spill to disk
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 64 * 1024))
+
     UPLOAD_FOLDER = 'uploads'
     PROCESSED_FOLDER = 'processed_images'
-    YOLO_CONFIDENCE_THRESHOLD = 0.01
+
+    # Content-addressed image store (see app/storage.py); image_path columns hold its keys
+    BLOB_STORE_BACKEND = os.environ.get('BLOB_STORE_BACKEND', 'local')  # 'local' or 's3'
+    BLOB_STORE_ROOT = os.environ.get('BLOB_STORE_ROOT', 'blobs')  # Local backend root directory
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    S3_PREFIX = os.environ.get('S3_PREFIX', '')
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')  # e.g. a local MinIO for development
+
+    # Boxes are drawn on request (see app/rendering.py); rendered JPEGs are kept in a byte-bounded LRU
+    RENDER_CACHE_MAX_BYTES = int(os.environ.get('RENDER_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    IMAGE_CACHE_MAX_AGE = int(os.environ.get('IMAGE_CACHE_MAX_AGE', 86400))  # Cache-Control max-age of result images
+
+    # Applied inside the YOLO NMS; 0.25 is the ultralytics default the served results were produced with
+    YOLO_CONFIDENCE_THRESHOLD = float(os.environ.get('YOLO_CONFIDENCE_THRESHOLD', 0.25))
+    YOLO_MAX_DET = int(os.environ.get('YOLO_MAX_DET', 300))  # Boxes kept per image after NMS
+    # Sliced YOLO inference for large frames (see app.inference.detect_yolo_tiled); boxes are in frame pixels either way
+    YOLO_TILING_ENABLED = os.environ.get('YOLO_TILING_ENABLED', '0') == '1'
+    YOLO_TILE_SIZE = int(os.environ.get('YOLO_TILE_SIZE', 640))  # Tile side in frame pixels
+    YOLO_TILE_OVERLAP = float(os.environ.get('YOLO_TILE_OVERLAP', 0.2))  # Fraction of the side shared by neighbours
+    YOLO_TILE_MAX = int(os.environ.get('YOLO_TILE_MAX', 16))  # Tiles per frame; larger tiles are used beyond this
+    YOLO_TILE_MERGE = os.environ.get('YOLO_TILE_MERGE', 'nms')  # 'nms' or 'wbf' (weighted box fusion)
+    YOLO_TILE_IOU = float(os.environ.get('YOLO_TILE_IOU', 0.5))
     CNN_CONFIDENCE_THRESHOLD = 0.5
 
+    # Inference backend: 'torch' (eager PyTorch) or 'onnx' (ONNX Runtime, see models/onnx_backend.py)
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'torch')
+    ONNX_INTRA_OP_THREADS = int(os.environ.get('ONNX_INTRA_OP_THREADS', os.cpu_count() or 1))
+    ONNX_INTER_OP_THREADS = int(os.environ.get('ONNX_INTER_OP_THREADS', 1))
+    # Serve the INT8 ConvNeXt checkpoint (models/cnn/best_model_int8.pt, built by models/quantize.py)
+    CNN_QUANTIZED = os.environ.get('CNN_QUANTIZED', '0') == '1'
+
+    # Startup warm-up forwards on dummy inputs before /ready reports ready
+    MODEL_WARMUP_ENABLED = os.environ.get('MODEL_WARMUP_ENABLED', '1') == '1'
+    MODEL_WARMUP_RUNS = int(os.environ.get('MODEL_WARMUP_RUNS', 2))
+
+    # Dynamic micro-batching of concurrent /predict calls (see app/batching.py)
+    INFERENCE_BATCHING_ENABLED = os.environ.get('INFERENCE_BATCHING_ENABLED', '1') == '1'
+    INFERENCE_BATCH_SIZE = int(os.environ.get('INFERENCE_BATCH_SIZE', 8))
+    INFERENCE_BATCH_MAX_WAIT_MS = float(os.environ.get('INFERENCE_BATCH_MAX_WAIT_MS', 10))
+    INFERENCE_QUEUE_DEPTH = int(os.environ.get('INFERENCE_QUEUE_DEPTH', 64))
+    INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 60))
+
+    # Forked inference worker processes sharing one copy of the weights (see app/process_pool.py); 0 = in-process
+    INFERENCE_PROCESSES = int(os.environ.get('INFERENCE_PROCESSES', 0))
+    INFERENCE_THREADS_PER_PROCESS = int(os.environ.get('INFERENCE_THREADS_PER_PROCESS', 0))  # 0 = cores / processes
+    INFERENCE_BATCH_CONCURRENCY = int(os.environ.get('INFERENCE_BATCH_CONCURRENCY', max(1, INFERENCE_PROCESSES)))
+    # ASGI variant of the API (app/asgi.py, served by asgi.py under hypercorn)
+    ASGI_EXECUTOR_THREADS = int(os.environ.get('ASGI_EXECUTOR_THREADS', 4))  # Threads for hashing, decoding and inference
+    ASGI_DB_POOL_MIN = int(os.environ.get('ASGI_DB_POOL_MIN', 1))
+    ASGI_DB_POOL_MAX = int(os.environ.get('ASGI_DB_POOL_MAX', 20))
+    # 'base64' inlines the image in JSON (front end default), 'url' links to /get_image/<id>, 'binary' streams the JPEG
+    DEFAULT_RESPONSE_MODE = os.environ.get('DEFAULT_RESPONSE_MODE', 'base64')
+    BATCH_MAX_IMAGES = int(os.environ.get('BATCH_MAX_IMAGES', 256))  # /predict/batch limit per request
+    BATCH_MAX_BYTES = int(os.environ.get('BATCH_MAX_BYTES', 512 * 1024 * 1024))  # Uncompressed image bytes per /predict/batch request
+    RESULTS_PAGE_MAX_LIMIT = int(os.environ.get('RESULTS_PAGE_MAX_LIMIT', 500))  # Rows per /results page
+    DETECTIONS_MAX_LIMIT = int(os.environ.get('DETECTIONS_MAX_LIMIT', 1000))  # Rows per /detections response
+
+    # Video clip ingestion (/predict/video and python -m app.video, see app/video.py)
+    VIDEO_MAX_UPLOAD_BYTES = int(os.environ.get('VIDEO_MAX_UPLOAD_BYTES', 500 * 1024 * 1024))
+    VIDEO_FRAME_STRIDE = int(os.environ.get('VIDEO_FRAME_STRIDE', 10))  # Score every Nth decoded frame
+    VIDEO_MAX_FRAMES = int(os.environ.get('VIDEO_MAX_FRAMES', 600))  # Scored frames per clip; the rest is not read
+    VIDEO_BATCH_SIZE = int(os.environ.get('VIDEO_BATCH_SIZE', 8))  # Frames per forward
+    VIDEO_QUEUE_DEPTH = int(os.environ.get('VIDEO_QUEUE_DEPTH', 32))  # Preprocessed frames buffered ahead of inference
+
+    # Content-hash result cache (see app/cache.py)
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', '1') == '1'
+    RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))  # In-process LRU entries
+    RESULT_CACHE_DB_LOOKUP = os.environ.get('RESULT_CACHE_DB_LOOKUP', '1') == '1'  # Shared tier: image_result.content_hash
+
+    # Perceptual-hash dedup of near-identical frames per 'source' camera (see app/dedup.py)
+    DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', '0') == '1'
+    DEDUP_MAX_DISTANCE = int(os.environ.get('DEDUP_MAX_DISTANCE', 4))  # Hamming distance in bits (of 64)
+    DEDUP_MAX_AGE_SECONDS = float(os.environ.get('DEDUP_MAX_AGE_SECONDS', 300))  # Force re-inference after this long
+    DEDUP_MAX_SOURCES = int(os.environ.get('DEDUP_MAX_SOURCES', 1024))
+
+    # Write-behind batching of image_result inserts (see app/write_behind.py)
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', '0') == '1'
+    WRITE_BEHIND_MAX_ROWS = int(os.environ.get('WRITE_BEHIND_MAX_ROWS', 200))  # Flush when this many rows are buffered
+    WRITE_BEHIND_MAX_DELAY_MS = float(os.environ.get('WRITE_BEHIND_MAX_DELAY_MS', 200))  # ...or the oldest is this old
+    WRITE_BEHIND_ID_BLOCK = int(os.environ.get('WRITE_BEHIND_ID_BLOCK', 100))  # Ids prefetched from the sequence at once
+    WRITE_BEHIND_SPILL_PATH = os.environ.get('WRITE_BEHIND_SPILL_PATH', 'instance/unflushed_results.jsonl')
+
+    # Partition upkeep, hourly rollups and retention of image_result (see app/maintenance.py)
+    MAINTENANCE_INTERVAL_SECONDS = float(os.environ.get('MAINTENANCE_INTERVAL_SECONDS', 3600))  # 0 disables the thread
+    RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 0))  # Drop results (and their files) older than this; 0 (default) keeps all
+    PARTITION_DAYS_AHEAD = int(os.environ.get('PARTITION_DAYS_AHEAD', 7))
+    ROLLUP_LOOKBACK_HOURS = int(os.environ.get('ROLLUP_LOOKBACK_HOURS', 2))  # Hours of rollups recomputed per pass
+
+    # Asynchronous /predict jobs (mode=async, see app/jobs.py)
+    ASYNC_WORKERS = int(os.environ.get('ASYNC_WORKERS', 2))  # Worker threads per process; 0 disables
+    ASYNC_POLL_INTERVAL = float(os.environ.get('ASYNC_POLL_INTERVAL', 1.0))
+    ASYNC_CLAIM_TIMEOUT = float(os.environ.get('ASYNC_CLAIM_TIMEOUT', 300))  # Reclaim 'running' jobs older than this
+    ASYNC_MAX_ATTEMPTS = int(os.environ.get('ASYNC_MAX_ATTEMPTS', 3))
+    ASYNC_CALLBACK_TIMEOUT = float(os.environ.get('ASYNC_CALLBACK_TIMEOUT', 5))
+    # Hosts allowed as callback targets even on private addresses; any other host must resolve to public IPs only
+    ASYNC_CALLBACK_ALLOWED_HOSTS = [h for h in os.environ.get('ASYNC_CALLBACK_ALLOWED_HOSTS', '').split(',') if h]
+
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -1,46 +1,30 @@
 import torch
 import torch.nn as nn
 import torchvision.models as models
-import torchvision.transforms as transforms
 from pathlib import Path
-from PIL import Image
-import numpy as np
-import io
+from preprocessing import preprocess_image_for_cnn, CNN_INPUT_SIZE
 
 # Constants
 # __file__ is in machine_learning/models, so BASE_DIR is that folder.
 BASE_DIR = Path(__file__).resolve().parent
 # Our model is stored in machine_learning/models/cnn/best_model.pth
 CNN_MODEL_PATH = BASE_DIR / "cnn" / "best_model.pth"
-CNN_INPUT_SIZE = (224, 224)
+# INT8 TorchScript checkpoint built by models/quantize.py
+CNN_QUANTIZED_MODEL_PATH = BASE_DIR / "cnn" / "best_model_int8.pt"
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 # Global model variable
 cnn_model = None
+cnn_input_device = device  # Where inputs must be for the loaded model (the INT8 model only runs on CPU)
 
-def preprocess_image_for_cnn(image_bytes):
-    """Preprocesses an image for the CNN (using torchvision.transforms)."""
-    try:
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-
-        transform = transforms.Compose([
-            transforms.Resize(CNN_INPUT_SIZE, antialias=True),
-            transforms.ToTensor(),  # Converts to tensor AND changes order to (C, H, W)
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
-
-        input_tensor = transform(image)  # Apply transformations
-        input_tensor = input_tensor.unsqueeze(0).to(device)  # Add batch dimension and move to device
-
-        return input_tensor
-
-    except Exception as e:
-        print(f"Error in preprocess_image_for_cnn: {e}")
-        return None
+def initialize_cnn_model(pretrained=False):
+    """Initializes a ConvNeXt model with the correct classifier.
 
-def initialize_cnn_model():
-    """Initializes a ConvNeXt model with the correct classifier."""
-    model = models.convnext_large(pretrained=True)
+    By default the backbone is built without weights (they all come from
+    CNN_MODEL_PATH), so nothing is downloaded at startup.
+    """
+    weights = models.ConvNeXt_Large_Weights.DEFAULT if pretrained else None
+    model = models.convnext_large(weights=weights)
     num_features = model.classifier[2].in_features
 
     # Modify the classifier for binary classification
@@ -51,24 +35,29 @@ def initialize_cnn_model():
 
     return model
 
-def load_cnn_model():
-    """Loads the CNN model from the saved file or uses the default pretrained model if not found."""
-    global cnn_model
-    try:
-        # Initialize model (this already gets a pretrained model)
-        model = initialize_cnn_model()
+def load_cnn_model(allow_download=False):
+    """Loads the CNN model from the saved file.
 
-        # Load the model weights (if the file exists)
+    Only local files are used unless allow_download is set, in which case a
+    missing checkpoint falls back to the ImageNet-pretrained backbone.
+    """
+    global cnn_model, cnn_input_device
+    try:
         if CNN_MODEL_PATH.exists():
-            model.load_state_dict(torch.load(CNN_MODEL_PATH, map_location=device))
+            model = initialize_cnn_model()
+            model.load_state_dict(torch.load(CNN_MODEL_PATH, map_location=device, weights_only=True))
             print("✅ PyTorch CNN model loaded successfully.")
-        else:
+        elif allow_download:
             print(f"⚠️ No model found at '{CNN_MODEL_PATH}'. Using default pretrained model.")
+            model = initialize_cnn_model(pretrained=True)
             # save_cnn_model(model)  # Do NOT save here. Only save after training.
+        else:
+            raise FileNotFoundError(f"Model file not found at {CNN_MODEL_PATH}")
 
         model.to(device)  # Move to device (CPU or CUDA)
         model.eval()      # Set to evaluation mode
         cnn_model = model # Set the global variable
+        cnn_input_device = device
 
     except Exception as e:
         print(f"❌ Error loading PyTorch CNN model: {e}")
@@ -78,6 +67,25 @@ def load_cnn_model():
 
     return cnn_model
 
+def load_quantized_cnn_model():
+    """Loads the INT8 quantized CNN (CPU only) built by models/quantize.py."""
+    global cnn_model, cnn_input_device
+    try:
+        if not CNN_QUANTIZED_MODEL_PATH.exists():
+            raise FileNotFoundError(f"Quantized model not found at {CNN_QUANTIZED_MODEL_PATH}; run 'python -m models.quantize build'")
+
+        model = torch.jit.load(str(CNN_QUANTIZED_MODEL_PATH), map_location="cpu")
+        model.eval()
+        cnn_model = model
+        cnn_input_device = torch.device("cpu")
+        print("✅ INT8 CNN model loaded successfully.")
+
+    except Exception as e:
+        print(f"❌ Error loading INT8 CNN model: {e}")
+        cnn_model = None
+
+    return cnn_model
+
 def save_cnn_model(model):
     """Saves the pretrained CNN model state dictionary."""
     CNN_MODEL_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -86,22 +94,30 @@ def save_cnn_model(model):
 
 def predict_with_cnn(input_tensor): # Changed the argument
     """Performs inference using the CNN model and returns the fire probability."""
+    return predict_with_cnn_batch(input_tensor)[0]
+
+def predict_with_cnn_batch(input_tensor):
+    """Performs one forward pass over an (N, C, H, W) tensor.
+
+    Returns a list of N fire probabilities (-1.0 for every item on failure).
+    """
     global cnn_model
     if cnn_model is None:
         cnn_model = load_cnn_model()
     if cnn_model is None:
-        return -1.0  # Model failed to load
+        return [-1.0] * input_tensor.shape[0]  # Model failed to load
 
     try:
         # No preprocessing here!  input_tensor is *already* preprocessed.
+        # Preprocessing puts it on the default device; the INT8 model needs it on the CPU
         with torch.no_grad():
-            prediction = cnn_model(input_tensor).item()
+            predictions = cnn_model(input_tensor.to(cnn_input_device)).view(-1).tolist()
 
-        return float(prediction)
+        return [float(p) for p in predictions]
 
     except Exception as e:
         print(f"❌ Error during CNN prediction: {e}")
-        return -1.0
+        return [-1.0] * input_tensor.shape[0]
 
 def main():
     """Main function to test the CNN model with an image."""
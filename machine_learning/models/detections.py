@@ -0,0 +1,166 @@
+"""Array-backed detection results.
+
+A Detections holds every box of one image in three contiguous arrays
+(float32 xyxy boxes, float32 confidences, int32 class ids), so
+post-processing, filtering and merging are whole-array NumPy operations
+and results cross process boundaries as one small buffer instead of a
+list of dicts. The API's JSON contract is produced at the edge:
+
+    [{'bbox': [x1, y1, x2, y2], 'confidence': 0.87, 'class': 'smoke'}, ...]
+
+merge_views() maps the Detections of several views of one frame (the
+tiles of sliced inference) back to frame coordinates and merges the
+duplicates with NMS or weighted box fusion.
+
+Binary layout (little-endian): uint32 count, then count*4 float32 boxes,
+count float32 confidences and count int32 class ids.
+"""
+import json
+import struct
+
+import numpy as np
+
+_COUNT = struct.Struct('<I')
+
+
+def box_iou(a, b):
+    """Pairwise IoU of (N, 4) and (M, 4) xyxy boxes as an (N, M) array."""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2:] - a[:, :2]).clip(0).prod(axis=1)
+    area_b = (b[:, 2:] - b[:, :2]).clip(0).prod(axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+def merge_views(parts, mappings, method='nms', iou_threshold=0.5, max_det=None):
+    """Maps per-view Detections (tiles of one frame) to frame coordinates and merges the duplicates.
+
+    mappings[i] = (x_offset, y_offset, x_scale, y_scale) for parts[i], as
+    returned by preprocessing.tile_image_for_yolo. method is 'nms' or 'wbf'.
+    """
+    merged = Detections.concatenate(part.transformed(*mapping) for part, mapping in zip(parts, mappings))
+    merged = merged.fuse(iou_threshold) if method == 'wbf' else merged.nms(iou_threshold)
+    return merged.filter(max_det=max_det)
+
+
+class Detections:
+    __slots__ = ('boxes', 'confidences', 'classes', 'class_names')
+
+    def __init__(self, boxes, confidences, classes, class_names=()):
+        self.boxes = np.ascontiguousarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.confidences = np.ascontiguousarray(confidences, dtype=np.float32).reshape(-1)
+        self.classes = np.ascontiguousarray(classes, dtype=np.int32).reshape(-1)
+        self.class_names = tuple(class_names)
+
+    @classmethod
+    def empty(cls, class_names=()):
+        return cls(np.empty((0, 4)), np.empty(0), np.empty(0), class_names)
+
+    def __len__(self):
+        return len(self.confidences)
+
+    def __getitem__(self, index):
+        """Subset by boolean mask or index array (order preserved)."""
+        return Detections(self.boxes[index], self.confidences[index], self.classes[index], self.class_names)
+
+    def filter(self, min_confidence=None, max_det=None):
+        """Boxes at or above min_confidence, highest confidence first, at most max_det of them."""
+        order = np.argsort(-self.confidences, kind='stable')
+        if min_confidence is not None:
+            order = order[self.confidences[order] >= min_confidence]
+        if max_det is not None:
+            order = order[:max_det]
+        return self[order]
+
+    def transformed(self, x_offset, y_offset, x_scale, y_scale):
+        """Boxes mapped to another frame: box * scale + offset (e.g. tile -> full frame)."""
+        scale = np.array([x_scale, y_scale, x_scale, y_scale], dtype=np.float32)
+        offset = np.array([x_offset, y_offset, x_offset, y_offset], dtype=np.float32)
+        return Detections(self.boxes * scale + offset, self.confidences, self.classes, self.class_names)
+
+    @classmethod
+    def concatenate(cls, parts, class_names=()):
+        parts = list(parts)
+        if not parts:
+            return cls.empty(class_names)
+        return cls(np.concatenate([p.boxes for p in parts]), np.concatenate([p.confidences for p in parts]),
+                   np.concatenate([p.classes for p in parts]), class_names or parts[0].class_names)
+
+    def nms(self, iou_threshold=0.5):
+        """Per-class non-maximum suppression (torchvision's batched kernel), highest confidence first."""
+        if len(self) < 2:
+            return self
+        import torch
+        import torchvision
+
+        keep = torchvision.ops.batched_nms(torch.from_numpy(self.boxes), torch.from_numpy(self.confidences),
+                                           torch.from_numpy(self.classes.astype(np.int64)), iou_threshold)
+        return self[keep.numpy()]
+
+    def fuse(self, iou_threshold=0.5):
+        """Weighted box fusion: every cluster of same-class boxes overlapping its highest-confidence
+        member by iou_threshold becomes one box, the confidence-weighted mean of the cluster, with
+        the cluster's highest confidence (duplicates from overlapping views are not extra evidence).
+        """
+        if len(self) < 2:
+            return self
+        order = np.argsort(-self.confidences, kind='stable')
+        boxes, confidences, classes = self.boxes[order], self.confidences[order], self.classes[order]
+        overlaps = (box_iou(boxes, boxes) >= iou_threshold) & (classes[:, None] == classes[None, :])
+
+        assigned = np.zeros(len(boxes), dtype=bool)
+        fused_boxes, fused_confidences, fused_classes = [], [], []
+        for i in range(len(boxes)):  # One iteration per cluster; members found with one vector op
+            if assigned[i]:
+                continue
+            members = overlaps[i] & ~assigned
+            assigned |= members
+            weights = confidences[members]
+            fused_boxes.append((boxes[members] * weights[:, None]).sum(axis=0) / weights.sum())
+            fused_confidences.append(confidences[i])
+            fused_classes.append(classes[i])
+        return Detections(np.stack(fused_boxes), fused_confidences, fused_classes, self.class_names)
+
+    def max_confidence(self):
+        return float(self.confidences.max()) if len(self) else None
+
+    def to_list(self):
+        """The API's list of {'bbox', 'confidence', 'class'} dicts (one tolist() per array)."""
+        names = self.class_names
+        labels = [names[c] if 0 <= c < len(names) else str(c) for c in self.classes.tolist()]
+        return [{'bbox': bbox, 'confidence': conf, 'class': label}
+                for bbox, conf, label in zip(self.boxes.tolist(), self.confidences.tolist(), labels)]
+
+    def to_json(self):
+        return json.dumps(self.to_list())
+
+    def to_bytes(self):
+        return b''.join((_COUNT.pack(len(self)), self.boxes.astype('<f4', copy=False).tobytes(),
+                         self.confidences.astype('<f4', copy=False).tobytes(),
+                         self.classes.astype('<i4', copy=False).tobytes()))
+
+    @classmethod
+    def from_bytes(cls, data, class_names=()):
+        (count,) = _COUNT.unpack_from(data)
+        offset = _COUNT.size
+        boxes = np.frombuffer(data, '<f4', count * 4, offset)
+        offset += boxes.nbytes
+        confidences = np.frombuffer(data, '<f4', count, offset)
+        offset += confidences.nbytes
+        classes = np.frombuffer(data, '<i4', count, offset)
+        return cls(boxes, confidences, classes, class_names)
+
+    # Pickled (e.g. through the inference process pool) as the binary form
+    def __getstate__(self):
+        return self.to_bytes(), self.class_names
+
+    def __setstate__(self, state):
+        data, class_names = state
+        restored = Detections.from_bytes(data, class_names)
+        for name in self.__slots__:
+            object.__setattr__(self, name, getattr(restored, name))
+
+    def __repr__(self):
+        return f"Detections({len(self)} boxes)"
@@ -0,0 +1,258 @@
+"""ONNX Runtime inference backend for the YOLOv8 and ConvNeXt models.
+
+Export both models once (run from machine_learning/):
+
+    python -m models.onnx_backend export
+
+Check that ONNX Runtime matches the PyTorch models on test_images/:
+
+    python -m models.onnx_backend verify
+
+The API serves through this backend when INFERENCE_BACKEND=onnx.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+try:
+    import onnxruntime as ort
+except ImportError:  # Optional dependency, only needed for INFERENCE_BACKEND=onnx
+    ort = None
+
+from models.detections import Detections
+from models.yolo import YOLO_MODEL_PATH, YOLO_CONFIDENCE_THRESHOLD, YOLO_MAX_DET, CLASS_NAMES
+from models.cnn import CNN_MODEL_PATH, CNN_INPUT_SIZE
+
+YOLO_ONNX_PATH = str(Path(YOLO_MODEL_PATH).with_suffix(".onnx"))
+CNN_ONNX_PATH = CNN_MODEL_PATH.with_suffix(".onnx")
+YOLO_IMGSZ = 352  # Training image size (see models/yolo/model_info.json)
+ONNX_OPSET = 17
+
+# Ultralytics NMS IoU default, mirrored so both backends keep the same boxes
+YOLO_NMS_IOU = 0.7
+
+yolo_session = None
+cnn_session = None
+
+
+# --- Export ---
+
+def export_yolo_onnx(model=None, path=YOLO_ONNX_PATH, simplify=True):
+    """Exports the YOLOv8 checkpoint (or the given ultralytics YOLO) to ONNX with a dynamic batch axis."""
+    from ultralytics import YOLO
+
+    model = model or YOLO(YOLO_MODEL_PATH)
+    exported = model.export(format="onnx", imgsz=YOLO_IMGSZ, dynamic=True, opset=ONNX_OPSET, simplify=simplify)
+    if os.path.abspath(exported) != os.path.abspath(path):
+        os.replace(exported, path)
+    print(f"✅ YOLO exported to '{path}'.")
+    return path
+
+
+def export_cnn_onnx(model=None, path=CNN_ONNX_PATH):
+    """Exports the fine-tuned ConvNeXt classifier (or the given model) to ONNX with a dynamic batch axis."""
+    from models.cnn import load_cnn_model
+
+    model = model or load_cnn_model()
+    if model is None:
+        raise RuntimeError("CNN model failed to load, nothing to export")
+    model = model.to("cpu").eval()
+
+    dummy = torch.zeros(1, 3, *CNN_INPUT_SIZE)
+    torch.onnx.export(
+        model,
+        dummy,
+        str(path),
+        input_names=["input"],
+        output_names=["probability"],
+        dynamic_axes={"input": {0: "batch"}, "probability": {0: "batch"}},
+        opset_version=ONNX_OPSET,
+    )
+    print(f"✅ CNN exported to '{path}'.")
+    return path
+
+
+# --- Sessions ---
+
+def create_session(model_path, intra_op_threads=None, inter_op_threads=None):
+    """Creates a CPU InferenceSession with full graph optimisation and explicit thread counts."""
+    if ort is None:
+        raise ImportError("onnxruntime is not installed")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"ONNX model not found at {model_path}; run 'python -m models.onnx_backend export'")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = intra_op_threads or os.cpu_count() or 1
+    options.inter_op_num_threads = inter_op_threads or 1
+    return ort.InferenceSession(str(model_path), sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def load_sessions(intra_op_threads=None, inter_op_threads=None):
+    """Loads (once) the YOLO and CNN sessions; missing models are reported and left as None."""
+    global yolo_session, cnn_session
+    if yolo_session is None:
+        try:
+            yolo_session = create_session(YOLO_ONNX_PATH, intra_op_threads, inter_op_threads)
+        except Exception as e:
+            print(f"❌ Error loading YOLO ONNX session: {e}")
+    if cnn_session is None:
+        try:
+            cnn_session = create_session(CNN_ONNX_PATH, intra_op_threads, inter_op_threads)
+        except Exception as e:
+            print(f"❌ Error loading CNN ONNX session: {e}")
+    return yolo_session, cnn_session
+
+
+# --- YOLO ---
+
+def _yolo_input(image_arrays):
+    """Stacks HWC uint8 arrays into the NCHW float32 [0, 1] tensor the exported model expects.
+
+    Ultralytics treats numpy inputs as BGR and flips them to RGB before the
+    forward pass, so the same flip is applied here to keep outputs identical.
+    """
+    batch = np.stack([np.asarray(a)[..., ::-1] for a in image_arrays])
+    batch = batch.transpose(0, 3, 1, 2).astype(np.float32) / 255.0
+    return np.ascontiguousarray(batch)
+
+
+def _nms(boxes, scores, iou_threshold):
+    import torchvision
+
+    keep = torchvision.ops.nms(torch.from_numpy(boxes), torch.from_numpy(scores), iou_threshold)
+    return keep.numpy()
+
+
+def _yolo_postprocess(prediction, conf=YOLO_CONFIDENCE_THRESHOLD, max_det=YOLO_MAX_DET):
+    """Turns one raw (4 + nc, anchors) output into Detections, like ultralytics' NMS."""
+    prediction = prediction.T  # (anchors, 4 + nc)
+    class_scores = prediction[:, 4:]
+    classes = class_scores.argmax(axis=1)
+    confidences = class_scores.max(axis=1)
+
+    mask = confidences > conf
+    if not mask.any():
+        return Detections.empty(CLASS_NAMES)
+    xywh, confidences, classes = prediction[mask, :4], confidences[mask], classes[mask]
+
+    half = xywh[:, 2:] / 2
+    boxes = np.concatenate((xywh[:, :2] - half, xywh[:, :2] + half), axis=1)
+
+    # Offset boxes per class so NMS never suppresses across classes
+    offsets = classes[:, None].astype(np.float32) * 7680.0
+    keep = _nms(boxes + offsets, confidences, YOLO_NMS_IOU)[:max_det]
+    return Detections(boxes[keep], confidences[keep], classes[keep], CLASS_NAMES)
+
+
+def detect_batch(image_arrays, conf=YOLO_CONFIDENCE_THRESHOLD, max_det=YOLO_MAX_DET):
+    """Same contract as models.yolo.detect_batch, served by ONNX Runtime.
+
+    Inputs are expected at YOLO_IMGSZ x YOLO_IMGSZ (what preprocess_image_for_yolo produces).
+    """
+    if yolo_session is None:
+        print("YOLO ONNX session not loaded")
+        return [Detections.empty(CLASS_NAMES) for _ in image_arrays]
+
+    try:
+        batch = _yolo_input(image_arrays)
+        outputs = yolo_session.run(None, {yolo_session.get_inputs()[0].name: batch})[0]
+        return [_yolo_postprocess(prediction, conf, max_det) for prediction in outputs]
+    except Exception as e:
+        print(f"Error during YOLO ONNX prediction: {e}")
+        return [Detections.empty(CLASS_NAMES) for _ in image_arrays]
+
+
+def predict_with_yolo_batch(image_arrays, conf=YOLO_CONFIDENCE_THRESHOLD, max_det=YOLO_MAX_DET):
+    """Same contract as models.yolo.predict_with_yolo_batch, served by ONNX Runtime."""
+    return [detections.to_list() for detections in detect_batch(image_arrays, conf, max_det)]
+
+
+# --- CNN ---
+
+def predict_with_cnn_batch(input_tensor):
+    """Same contract as models.cnn.predict_with_cnn_batch, served by ONNX Runtime."""
+    if cnn_session is None:
+        print("CNN ONNX session not loaded")
+        return [-1.0] * input_tensor.shape[0]
+
+    try:
+        batch = input_tensor.detach().cpu().numpy().astype(np.float32, copy=False)
+        outputs = cnn_session.run(None, {cnn_session.get_inputs()[0].name: batch})[0]
+        return [float(p) for p in outputs.reshape(-1)]
+    except Exception as e:
+        print(f"❌ Error during CNN ONNX prediction: {e}")
+        return [-1.0] * input_tensor.shape[0]
+
+
+# --- Equivalence check ---
+
+def verify(test_dir="test_images", prob_tolerance=1e-3, box_tolerance=1.0, conf_tolerance=1e-2):
+    """Runs every image in test_dir through both backends and reports the largest differences.
+
+    Returns True when every output agrees within tolerance.
+    """
+    from models import yolo as torch_yolo
+    from models import cnn as torch_cnn
+    from preprocessing import preprocess_image_for_yolo, preprocess_image_for_cnn
+
+    load_sessions()
+    ok = True
+    for name in sorted(os.listdir(test_dir)):
+        with open(os.path.join(test_dir, name), "rb") as f:
+            image_bytes = f.read()
+
+        cnn_input = preprocess_image_for_cnn(image_bytes).cpu()
+        start = time.perf_counter()
+        torch_prob = torch_cnn.predict_with_cnn_batch(cnn_input)[0]
+        torch_cnn_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        onnx_prob = predict_with_cnn_batch(cnn_input)[0]
+        onnx_cnn_ms = (time.perf_counter() - start) * 1000
+        prob_diff = abs(torch_prob - onnx_prob)
+
+        yolo_input = preprocess_image_for_yolo(image_bytes)
+        start = time.perf_counter()
+        torch_dets = torch_yolo.predict_with_yolo_batch([yolo_input])[0]
+        torch_yolo_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        onnx_dets = predict_with_yolo_batch([yolo_input])[0]
+        onnx_yolo_ms = (time.perf_counter() - start) * 1000
+
+        same_count = len(torch_dets) == len(onnx_dets)
+        box_diff = conf_diff = 0.0
+        if same_count and torch_dets:
+            torch_sorted = sorted(torch_dets, key=lambda d: -d['confidence'])
+            onnx_sorted = sorted(onnx_dets, key=lambda d: -d['confidence'])
+            box_diff = max(float(np.abs(np.subtract(a['bbox'], b['bbox'])).max()) for a, b in zip(torch_sorted, onnx_sorted))
+            conf_diff = max(abs(a['confidence'] - b['confidence']) for a, b in zip(torch_sorted, onnx_sorted))
+
+        image_ok = (prob_diff <= prob_tolerance and same_count
+                    and box_diff <= box_tolerance and conf_diff <= conf_tolerance)
+        ok = ok and image_ok
+        print(f"{'✅' if image_ok else '❌'} {name}: "
+              f"cnn |Δp|={prob_diff:.2e} ({torch_cnn_ms:.0f}ms torch / {onnx_cnn_ms:.0f}ms onnx), "
+              f"yolo {len(torch_dets)} vs {len(onnx_dets)} boxes, max |Δbox|={box_diff:.2f}px, "
+              f"max |Δconf|={conf_diff:.2e} ({torch_yolo_ms:.0f}ms torch / {onnx_yolo_ms:.0f}ms onnx)")
+    return ok
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command == "export":
+        export_yolo_onnx()
+        export_cnn_onnx()
+    elif command == "verify":
+        sys.exit(0 if verify() else 1)
+    else:
+        print("Usage: python -m models.onnx_backend [export|verify]")
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Post-training INT8 quantization of the ConvNeXt fire classifier.
+
+Build the quantized checkpoint next to cnn/best_model.pth (run from machine_learning/):
+
+    # dynamic: INT8 weights for every Linear layer (ConvNeXt's pointwise convs), no data needed
+    python -m models.quantize build --mode dynamic
+
+    # static: INT8 weights and activations, calibrated on the training split
+    python -m models.quantize build --mode static --data /path/to/dataset_image_classification
+
+Compare accuracy, latency and memory against the FP32 model on the test split:
+
+    python -m models.quantize report --data /path/to/dataset_image_classification
+
+The dataset uses the training layout: <data>/{train,val,test}/<class_name>/<image>.
+The API serves the quantized model when CNN_QUANTIZED=1.
+"""
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+import psutil
+import torch
+import torch.nn as nn
+
+from config import Config
+from models.cnn import (
+    CNN_INPUT_SIZE,
+    CNN_QUANTIZED_MODEL_PATH,
+    CNN_MODEL_PATH,
+    load_cnn_model,
+    load_quantized_cnn_model,
+)
+from preprocessing import preprocess_image_for_cnn
+
+REPORT_PATH = CNN_MODEL_PATH.parent / "quantization_report.json"
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif'}
+
+
+def list_split(data_dir, split, positive_class):
+    """Returns [(path, label)] for <data_dir>/<split>/<class>/*, label 1 for the positive class."""
+    split_dir = os.path.join(data_dir, split)
+    samples = []
+    for class_name in sorted(os.listdir(split_dir)):
+        class_dir = os.path.join(split_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        label = 1 if class_name == positive_class else 0
+        for name in sorted(os.listdir(class_dir)):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                samples.append((os.path.join(class_dir, name), label))
+    return samples
+
+
+def load_input(path):
+    with open(path, 'rb') as f:
+        return preprocess_image_for_cnn(f.read()).cpu()
+
+
+def quantize_dynamic(model):
+    """INT8 weights for nn.Linear; activations are quantized on the fly at runtime."""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantize_static(model, calibration_inputs):
+    """FX graph-mode static quantization calibrated on the given input tensors."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    example = torch.zeros(1, 3, *CNN_INPUT_SIZE)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(torch.backends.quantized.engine), (example,))
+    with torch.no_grad():
+        for input_tensor in calibration_inputs:
+            prepared(input_tensor)
+    return convert_fx(prepared)
+
+
+def build(mode, data_dir=None, calibration_size=256, positive_class='fire'):
+    """Quantizes the FP32 checkpoint and saves it as TorchScript at CNN_QUANTIZED_MODEL_PATH."""
+    model = load_cnn_model()
+    if model is None:
+        raise RuntimeError("FP32 CNN model failed to load")
+    model = model.to('cpu').eval()
+
+    if mode == 'dynamic':
+        quantized = quantize_dynamic(model)
+    else:
+        if data_dir is None:
+            raise ValueError("static quantization needs --data for calibration")
+        samples = list_split(data_dir, 'train', positive_class)
+        random.Random(0).shuffle(samples)
+        calibration = (load_input(path) for path, _ in samples[:calibration_size])
+        quantized = quantize_static(model, calibration)
+
+    example = torch.zeros(1, 3, *CNN_INPUT_SIZE)
+    with torch.no_grad():
+        scripted = torch.jit.trace(quantized, example)
+    torch.jit.save(scripted, str(CNN_QUANTIZED_MODEL_PATH))
+    print(f"✅ {mode} INT8 model saved at '{CNN_QUANTIZED_MODEL_PATH}'.")
+
+
+def _rss_mb():
+    return psutil.Process().memory_info().rss / (1024 * 1024)
+
+
+def evaluate(model, samples):
+    """Accuracy/precision/recall and per-image latency (batch size 1) on the given samples."""
+    latencies, predictions, labels, probabilities = [], [], [], []
+    with torch.no_grad():
+        model(torch.zeros(1, 3, *CNN_INPUT_SIZE))  # warm-up
+        for path, label in samples:
+            input_tensor = load_input(path)
+            start = time.perf_counter()
+            probability = float(model(input_tensor).view(-1)[0])
+            latencies.append(time.perf_counter() - start)
+            probabilities.append(probability)
+            predictions.append(int(probability >= Config.CNN_CONFIDENCE_THRESHOLD))
+            labels.append(label)
+
+    predictions, labels = np.array(predictions), np.array(labels)
+    tp = int(((predictions == 1) & (labels == 1)).sum())
+    fp = int(((predictions == 1) & (labels == 0)).sum())
+    fn = int(((predictions == 0) & (labels == 1)).sum())
+    return {
+        'accuracy': float((predictions == labels).mean()) if len(labels) else 0.0,
+        'precision': tp / (tp + fp) if tp + fp else 0.0,
+        'recall': tp / (tp + fn) if tp + fn else 0.0,
+        'latency_ms_mean': float(np.mean(latencies) * 1000) if latencies else 0.0,
+        'latency_ms_p95': float(np.percentile(latencies, 95) * 1000) if latencies else 0.0,
+    }, np.array(probabilities)
+
+
+def report(data_dir, positive_class='fire', limit=None):
+    """Evaluates FP32 and INT8 models on the test split and writes quantization_report.json."""
+    samples = list_split(data_dir, 'test', positive_class)
+    if limit:
+        samples = samples[:limit]
+
+    rss_before = _rss_mb()
+    fp32 = load_cnn_model().to('cpu').eval()
+    fp32_rss = _rss_mb() - rss_before
+    fp32_metrics, fp32_probs = evaluate(fp32, samples)
+    del fp32
+
+    rss_before = _rss_mb()
+    int8 = load_quantized_cnn_model()
+    int8_rss = _rss_mb() - rss_before
+    int8_metrics, int8_probs = evaluate(int8, samples)
+
+    fp32_metrics.update({'checkpoint_mb': os.path.getsize(CNN_MODEL_PATH) / 1e6, 'load_rss_mb': fp32_rss})
+    int8_metrics.update({'checkpoint_mb': os.path.getsize(CNN_QUANTIZED_MODEL_PATH) / 1e6, 'load_rss_mb': int8_rss})
+    results = {
+        'samples': len(samples),
+        'torch_threads': torch.get_num_threads(),
+        'fp32': fp32_metrics,
+        'int8': int8_metrics,
+        'max_abs_probability_diff': float(np.abs(fp32_probs - int8_probs).max()) if len(samples) else 0.0,
+    }
+
+    with open(REPORT_PATH, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'':<8}{'acc':>8}{'prec':>8}{'recall':>8}{'mean ms':>10}{'p95 ms':>10}{'ckpt MB':>10}{'RSS MB':>10}")
+    for name in ('fp32', 'int8'):
+        m = results[name]
+        print(f"{name:<8}{m['accuracy']:>8.3f}{m['precision']:>8.3f}{m['recall']:>8.3f}"
+              f"{m['latency_ms_mean']:>10.1f}{m['latency_ms_p95']:>10.1f}{m['checkpoint_mb']:>10.1f}{m['load_rss_mb']:>10.1f}")
+    print(f"Max |Δp| = {results['max_abs_probability_diff']:.4f}; report written to '{REPORT_PATH}'.")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 quantization of the ConvNeXt fire classifier")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="quantize best_model.pth")
+    build_parser.add_argument('--mode', choices=['dynamic', 'static'], default='dynamic')
+    build_parser.add_argument('--data', help="dataset root with train/val/test splits (static mode)")
+    build_parser.add_argument('--calibration-size', type=int, default=256)
+    build_parser.add_argument('--positive-class', default='fire')
+
+    report_parser = subparsers.add_parser('report', help="compare FP32 and INT8 on the test split")
+    report_parser.add_argument('--data', required=True)
+    report_parser.add_argument('--positive-class', default='fire')
+    report_parser.add_argument('--limit', type=int)
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        build(args.mode, args.data, args.calibration_size, args.positive_class)
+    else:
+        report(args.data, args.positive_class, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -24,12 +24,15 @@ from PIL import Image, ImageDraw
 import numpy as np
 import io
 
+from models.detections import Detections
+
 # Relative paths from project root (machine_learning/)
 YOLO_MODEL_PATH = "models/yolo/best_yolov8_model.pt"
 HARD_CODED_IMAGE_PATH = "test_images/test_yolo_smoke_1.jpg"
 OUTPUT_IMAGE_PATH = "models/processed_images/detected_test.jpg"
 
 YOLO_CONFIDENCE_THRESHOLD = 0.1
+YOLO_MAX_DET = 300
 CLASS_NAMES = ["smoke"]
 
 yolo_model = None
@@ -61,33 +64,39 @@ def ensure_model_loaded():
 
 def predict_with_yolo(image_array):
     """Performs inference with YOLOv8."""
+    return predict_with_yolo_batch([image_array])[0]
+
+def detect_batch(image_arrays, conf=YOLO_CONFIDENCE_THRESHOLD, max_det=YOLO_MAX_DET):
+    """Single batched YOLOv8 forward; one Detections per input image, in the same order.
+
+    conf and max_det are applied inside ultralytics' NMS, so low-confidence
+    candidates never reach Python.
+    """
     if not ensure_model_loaded():
         print("Failed to load YOLO model")
-        return []
+        return [Detections.empty(CLASS_NAMES) for _ in image_arrays]
 
     try:
-        # Inference
-        results = yolo_model(image_array, verbose=False)
-        detections = []
-
+        # Inference (ultralytics stacks a list of arrays into one batch)
+        results = yolo_model(list(image_arrays), conf=conf, max_det=max_det, verbose=False)
+        batch_detections = []
         for result in results:
-            # Each 'result.boxes' is a Boxes object with .xyxy, .conf, and .cls
-            boxes = result.boxes.cpu().numpy()
-            for box in boxes:
-                xyxy = box.xyxy[0].tolist()
-                conf = float(box.conf[0])
-                cls = int(box.cls[0])
-
-                if conf >= YOLO_CONFIDENCE_THRESHOLD:
-                    detections.append({
-                        'bbox': xyxy,
-                        'confidence': conf,
-                        'class': CLASS_NAMES[cls]
-                    })
-        return detections
+            # One device-to-host copy per array, no per-box work
+            boxes = result.boxes
+            batch_detections.append(Detections(
+                boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy(), CLASS_NAMES
+            ))
+        return batch_detections
     except Exception as e:
         print(f"Error during YOLO prediction: {e}")
-        return []
+        return [Detections.empty(CLASS_NAMES) for _ in image_arrays]
+
+def predict_with_yolo_batch(image_arrays, conf=YOLO_CONFIDENCE_THRESHOLD, max_det=YOLO_MAX_DET):
+    """Performs a single batched YOLOv8 forward over a list of images.
+
+    Returns one detection list per input image, in the same order.
+    """
+    return [detections.to_list() for detections in detect_batch(image_arrays, conf, max_det)]
 
 def draw_boxes_on_image(image_bytes, detections):
     """Draws bounding boxes on the image."""
@@ -6,12 +6,55 @@ import torchvision.transforms as transforms
 
 CNN_INPUT_SIZE = (224, 224)
 YOLO_INPUT_SIZE = (352, 352)
+CNN_MEAN = [0.485, 0.456, 0.406]
+CNN_STD = [0.229, 0.224, 0.225]
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-def preprocess_image_for_yolo(image_bytes):
-    """Preprocesses an image for YOLOv8."""
+
+# Reference torchvision pipeline, built once (the vectorized path below produces the same tensor)
+CNN_TRANSFORM = transforms.Compose([
+    transforms.Resize(CNN_INPUT_SIZE, antialias=True),
+    transforms.ToTensor(),  # Converts to tensor AND changes order to (C, H, W)
+    transforms.Normalize(mean=CNN_MEAN, std=CNN_STD)
+])
+
+# ToTensor + Normalize folded into one multiply-add: (x / 255 - mean) / std == x * scale + bias
+_CNN_SCALE = (1.0 / (255.0 * np.array(CNN_STD, dtype=np.float32))).reshape(3, 1, 1)
+_CNN_BIAS = (-np.array(CNN_MEAN, dtype=np.float32) / np.array(CNN_STD, dtype=np.float32)).reshape(3, 1, 1)
+
+def decode_image(data, min_size=None):
+    """Decodes image bytes (or a binary file object) to RGB, at reduced resolution when only min_size (w, h) is needed.
+
+    JPEGs are decoded with libjpeg's DCT scaling (Image.draft) straight to the
+    smallest 1/2, 1/4 or 1/8 scale still covering min_size, so a 4K frame is
+    never materialised at full size; other formats (PNG, GIF) are fully
+    decoded. Either way, an integer box reduce (Image.reduce) then brings the
+    image to within 2x of min_size, so the final resize stays cheap.
+    """
+    image = Image.open(data if hasattr(data, "read") else io.BytesIO(data))
+    if min_size is not None and image.format == "JPEG":
+        image.draft("RGB", min_size)
+    image = image.convert("RGB") if image.mode != "RGB" else image
+    image.load()
+    return reduce_image(image, min_size) if min_size is not None else image
+
+def reduce_image(image, min_size):
+    """Integer box reduce of a decoded image to within 2x of min_size (w, h), so the final resize stays cheap."""
+    factor = min(image.width // min_size[0], image.height // min_size[1])
+    return image.reduce(factor) if factor >= 2 else image
+
+def to_rgb_image(image, min_size=None):
+    """Accepts raw image bytes or an already-decoded PIL image and returns an RGB PIL image.
+
+    With min_size, bytes are decoded only as large as needed (see decode_image).
+    """
+    if isinstance(image, Image.Image):
+        return image if image.mode == "RGB" else image.convert("RGB")
+    return decode_image(image, min_size)
+
+def preprocess_image_for_yolo(image):
+    """Preprocesses an image (bytes or decoded PIL image) for YOLOv8."""
     try:
-        image = Image.open(io.BytesIO(image_bytes))
-        image = image.convert("RGB")
+        image = to_rgb_image(image, YOLO_INPUT_SIZE)
         image = image.resize(YOLO_INPUT_SIZE, Image.BILINEAR)  # Use explicit size and antialiasing
         img_array = np.array(image)
         return img_array
@@ -19,22 +62,94 @@ def preprocess_image_for_yolo(image_bytes):
         print(f"Error preprocessing image for YOLO: {e}")
         return None
 
-def preprocess_image_for_cnn(image_bytes):
-    """Preprocesses an image for the CNN (using torchvision.transforms)."""
-    try:
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+def yolo_frame_mapping(width, height):
+    """(x_offset, y_offset, x_scale, y_scale) mapping boxes on a YOLO_INPUT_SIZE input (a plain resize
+    of the frame, see preprocess_image_for_yolo) back to the pixels of the width x height frame.
+    """
+    return 0.0, 0.0, width / YOLO_INPUT_SIZE[0], height / YOLO_INPUT_SIZE[1]
 
-        transform = transforms.Compose([
-            transforms.Resize(CNN_INPUT_SIZE, antialias=True),
-            transforms.ToTensor(),  # Converts to tensor AND changes order to (C, H, W)
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+def _tile_offsets(length, side, stride):
+    if side >= length:
+        return [0]  # One tile spans this axis, padded past the edge
+    offsets = list(range(0, length - side + 1, stride))
+    if offsets[-1] + side < length:
+        offsets.append(length - side)
+    return offsets
 
-        input_tensor = transform(image)  # Apply transformations
-        input_tensor = input_tensor.unsqueeze(0).to(device)  # Add batch dimension and move to device
+def tile_grid(width, height, tile_size, overlap=0.2, max_tiles=16):
+    """Top-left corners and side of the square tiles covering a width x height frame.
 
-        return input_tensor
+    Tiles overlap by at least overlap * side so objects on a seam appear whole
+    in one of them. If the grid would exceed max_tiles the side grows until
+    it fits, past the short side if need be (those tiles are letterboxed, see
+    tile_image_for_yolo), so very wide or tall frames stay within max_tiles
+    too. Frames no larger than one tile get a single tile.
+    """
+    if width <= tile_size and height <= tile_size:
+        return [(0, 0)], max(width, height)
+    side = tile_size
+    while True:
+        stride = max(1, int(side * (1 - overlap)))
+        xs = _tile_offsets(width, side, stride)
+        ys = _tile_offsets(height, side, stride)
+        if len(xs) * len(ys) <= max(1, max_tiles) or side >= max(width, height):
+            return [(x, y) for y in ys for x in xs], side
+        side = min(int(side * 1.25) + 1, max(width, height))
+
+def tile_image_for_yolo(image, tile_size=640, overlap=0.2, max_tiles=16):
+    """Cuts a frame into overlapping tiles, each resized to YOLO_INPUT_SIZE, for sliced inference.
+
+    The whole frame (resized like preprocess_image_for_yolo) comes first so
+    objects larger than a tile are still seen. Tiles reaching past the frame
+    edge are padded with black rather than stretched. Returns (arrays,
+    mappings) where mappings[i] = (x_offset, y_offset, x_scale, y_scale)
+    maps boxes from input i back to full-frame pixels: frame = box * scale + offset.
+    """
+    image = to_rgb_image(image)
+    width, height = image.size
+    input_w, input_h = YOLO_INPUT_SIZE
+    arrays = [np.array(image.resize(YOLO_INPUT_SIZE, Image.BILINEAR))]
+    mappings = [yolo_frame_mapping(width, height)]
+
+    corners, side = tile_grid(width, height, tile_size, overlap, max_tiles)
+    if len(corners) > 1:
+        for x, y in corners:
+            box = (x, y, x + side, y + side)
+            if box[2] <= width and box[3] <= height:
+                tile = image.resize(YOLO_INPUT_SIZE, Image.BILINEAR, box=box)
+            else:
+                tile = image.crop(box).resize(YOLO_INPUT_SIZE, Image.BILINEAR)  # crop() pads with black
+            arrays.append(np.array(tile))
+            mappings.append((float(x), float(y), side / input_w, side / input_h))
+    return arrays, np.array(mappings, dtype=np.float32)
+
+def _cnn_normalize_into(image, out):
+    """Resizes an RGB PIL image to CNN_INPUT_SIZE and writes the normalized (C, H, W) float32 result into out."""
+    height, width = CNN_INPUT_SIZE
+    resized = image.resize((width, height), Image.BILINEAR)  # Same filter torchvision uses for PIL inputs
+    chw = np.asarray(resized).transpose(2, 0, 1)  # (H, W, C) uint8 view -> (C, H, W), no copy
+    np.multiply(chw, _CNN_SCALE, out=out)
+    out += _CNN_BIAS
+
+def preprocess_image_for_cnn(image):
+    """Preprocesses an image (bytes or decoded PIL image) into a (1, C, H, W) CNN input tensor."""
+    try:
+        input_tensor = torch.empty((1, 3, *CNN_INPUT_SIZE), dtype=torch.float32)
+        _cnn_normalize_into(to_rgb_image(image, CNN_INPUT_SIZE), input_tensor[0].numpy())
+        return input_tensor.to(device)  # Move to device
 
     except Exception as e:
         print(f"Error in preprocess_image_for_cnn: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def preprocess_batch_for_cnn(images):
+    """Preprocesses a list of images (bytes or decoded PIL images) into one contiguous (N, C, H, W) tensor.
+
+    Raises if any image cannot be decoded; callers that need per-image errors
+    should decode first and pass PIL images.
+    """
+    batch = torch.empty((len(images), 3, *CNN_INPUT_SIZE), dtype=torch.float32)
+    buffer = batch.numpy()  # Shares memory with the tensor
+    for i, image in enumerate(images):
+        _cnn_normalize_into(to_rgb_image(image, CNN_INPUT_SIZE), buffer[i])
+    return batch.to(device)
@@ -0,0 +1,11 @@
+# tests/conftest.py
+"""Shared test setup: run from machine_learning/ with ``python -m pytest``.
+
+config.Config reads DATABASE_URL at import time; the tests never connect,
+so a placeholder is enough when it is not set.
+"""
+import os
+import sys
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://test@localhost:1/test')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,93 @@
+# tests/test_batch_archive.py
+import io
+import zipfile
+
+import pytest
+from flask import Flask
+from PIL import Image
+
+from app import api
+from app.api import BatchBudget, iter_archive_images
+from app.utils import UploadError
+
+
+def jpeg_bytes(size=(32, 32)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def zip_of(count, data):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for i in range(count):
+            archive.writestr(f'frame_{i}.jpg', data)
+    buffer.seek(0)
+    return buffer
+
+
+def test_member_count_is_enforced_while_reading():
+    images = iter_archive_images(zip_of(50, jpeg_bytes()), 'application/zip', BatchBudget(max_images=3))
+    read = []
+    with pytest.raises(UploadError) as error:
+        for image in images:
+            read.append(image)
+    assert error.value.status == 413
+    assert len(read) == 3  # Aborted at the fourth member, before reading it
+
+
+def test_cumulative_size_is_enforced_while_reading():
+    data = jpeg_bytes()
+    budget = BatchBudget(max_images=100, max_bytes=len(data) * 2)
+    with pytest.raises(UploadError) as error:
+        list(iter_archive_images(zip_of(10, data), 'application/zip', budget))
+    assert error.value.status == 413
+    assert budget.images == 3
+
+
+def test_archive_within_limits_is_read_in_full():
+    images = list(iter_archive_images(zip_of(4, jpeg_bytes()), 'application/zip', BatchBudget(max_images=4)))
+    assert [image.filename for image in images] == [f'frame_{i}.jpg' for i in range(4)]
+
+
+class NonSeekable(io.RawIOBase):
+    """A request body that can only be read forward, counting what was read."""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+        self.read_bytes = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._data.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        self.read_bytes += len(chunk)
+        return len(chunk)
+
+
+def test_non_seekable_zip_body_is_spooled_up_to_the_byte_limit(monkeypatch):
+    monkeypatch.setattr(api.Config, 'UPLOAD_CHUNK_SIZE', 1024)
+    data = zip_of(50, jpeg_bytes()).getvalue()
+    body = NonSeekable(data)
+    with pytest.raises(UploadError) as error:
+        list(iter_archive_images(body, 'application/zip', BatchBudget(max_bytes=len(data) // 4)))
+    assert error.value.status == 413
+    assert body.read_bytes < len(data)  # Stopped reading once past the limit
+
+    images = list(iter_archive_images(NonSeekable(data), 'application/zip', BatchBudget(max_images=50)))
+    assert len(images) == 50
+
+
+def test_oversized_raw_zip_post_is_refused(monkeypatch):
+    monkeypatch.setattr(api.Config, 'BATCH_MAX_BYTES', 4096)
+    monkeypatch.setattr(api.Config, 'UPLOAD_CHUNK_SIZE', 1024)
+    app = Flask(__name__)
+    app.register_blueprint(api.bp)
+    data = zip_of(50, jpeg_bytes()).getvalue()
+    assert len(data) > 4096
+
+    response = app.test_client().post('/predict/batch?model_type=yolo', data=data, content_type='application/zip')
+    assert response.status_code == 413
+    assert 'Archive too large' in response.get_json()['error']
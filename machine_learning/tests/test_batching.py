@@ -0,0 +1,87 @@
+# tests/test_batching.py
+import threading
+import time
+
+import pytest
+
+from app.batching import MicroBatcher, QueueFullError
+
+
+def test_concurrent_submissions_share_a_forward():
+    calls = []
+
+    def predict_batch(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher('test', predict_batch, max_batch_size=4, max_wait_ms=200)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher.submit(i, timeout=5)))
+               for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {i: i * 2 for i in range(4)}
+    assert sum(len(batch) for batch in calls) == 4
+    assert len(calls) < 4  # At least two requests were served by one forward
+    stats = batcher.stats()
+    assert stats['items'] == 4 and stats['batches'] == len(calls)
+
+
+def test_batch_is_capped_at_max_batch_size():
+    sizes = []
+    release = threading.Event()
+
+    def predict_batch(items):
+        release.wait(5)
+        sizes.append(len(items))
+        return list(items)
+
+    batcher = MicroBatcher('test', predict_batch, max_batch_size=2, max_wait_ms=50)
+    threads = [threading.Thread(target=batcher.submit, args=(i, 5)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert max(sizes) <= 2 and sum(sizes) == 5
+
+
+def test_forward_errors_reach_every_caller():
+    def predict_batch(items):
+        raise RuntimeError('boom')
+
+    batcher = MicroBatcher('test', predict_batch, max_batch_size=2, max_wait_ms=0)
+    with pytest.raises(RuntimeError, match='boom'):
+        batcher.submit(1, timeout=5)
+
+
+def test_full_queue_rejects_instead_of_blocking():
+    release = threading.Event()
+    started = threading.Event()
+
+    def predict_batch(items):
+        started.set()
+        release.wait(5)
+        return list(items)
+
+    batcher = MicroBatcher('test', predict_batch, max_batch_size=1, max_wait_ms=0, max_queue=1)
+    first = threading.Thread(target=batcher.submit, args=(0, 5))
+    first.start()
+    started.wait(5)  # The collector holds item 0; the queue is empty again
+    second = threading.Thread(target=batcher.submit, args=(1, 5))
+    second.start()
+    deadline = time.monotonic() + 5
+    while batcher.stats()['queue_depth'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    with pytest.raises(QueueFullError):
+        batcher.submit(2, timeout=5)
+    release.set()
+    first.join()
+    second.join()
+    assert batcher.stats()['rejected'] == 1
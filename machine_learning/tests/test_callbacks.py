@@ -0,0 +1,47 @@
+# tests/test_callbacks.py
+import socket
+
+import pytest
+
+from app import jobs
+from config import Config
+
+
+def resolves_to(monkeypatch, *addresses):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port)) for address in addresses]
+    monkeypatch.setattr(jobs.socket, 'getaddrinfo', getaddrinfo)
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1/hook',
+    'http://localhost:8080/hook',
+    'http://169.254.169.254/latest/meta-data/',
+    'http://10.0.0.5/hook',
+    'http://192.168.1.1/hook',
+    'http://[::1]/hook',
+])
+def test_internal_addresses_are_rejected(url):
+    assert not jobs.callback_allowed(url)
+
+
+def test_hostname_resolving_to_a_private_address_is_rejected(monkeypatch):
+    resolves_to(monkeypatch, '93.184.216.34', '10.1.2.3')
+    assert not jobs.callback_allowed('https://hooks.example.com/fire')
+
+
+def test_public_hostname_is_allowed(monkeypatch):
+    resolves_to(monkeypatch, '93.184.216.34')
+    assert jobs.callback_allowed('https://hooks.example.com/fire')
+
+
+def test_allow_listed_host_may_be_internal(monkeypatch):
+    monkeypatch.setattr(Config, 'ASYNC_CALLBACK_ALLOWED_HOSTS', ['alerts.internal'])
+    resolves_to(monkeypatch, '10.1.2.3')
+    assert jobs.callback_allowed('http://alerts.internal/fire')
+    assert not jobs.callback_allowed('http://other.internal/fire')
+
+
+@pytest.mark.parametrize('url', ['ftp://example.com/hook', 'file:///etc/passwd', 'http:///hook'])
+def test_non_http_urls_are_rejected(url):
+    assert not jobs.callback_allowed(url)
@@ -0,0 +1,92 @@
+# tests/test_db.py
+import threading
+
+import psycopg2.extensions
+import psycopg2.pool
+import pytest
+
+from app import db
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.prepared = []
+
+    @property
+    def info(self):
+        return self
+
+    @property
+    def transaction_status(self):
+        return self.status
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        if sql.startswith('PREPARE'):
+            self.connection.prepared.append(sql)
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+
+    def connect(*args, **kwargs):
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(psycopg2.pool.psycopg2, 'connect', connect)
+    monkeypatch.setattr(db.Config, 'DB_PREPARED_STATEMENTS', True)
+    db.register_statement('test_select', "SELECT $1")
+    yield opened
+    db.forget_prepared()
+
+
+def test_concurrent_checkouts_beyond_minconn_reuse_connections(connections):
+    pool = db.DatabasePool('dbname=test', minconn=1, maxconn=5)
+    barrier = threading.Barrier(3)
+
+    def checkout():
+        conn = pool.getconn()
+        db.execute_prepared(conn.cursor(), 'test_select', (1,))
+        barrier.wait()  # All three held at once
+        pool.putconn(conn)
+
+    for _ in range(200):
+        threads = [threading.Thread(target=checkout) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(connections) == 3  # Idle connections are kept, not closed and reopened
+    assert sum(len(conn.prepared) for conn in connections) == 3  # PREPAREd once per connection
+    assert len(pool._returned_at) == 3
+    assert all(not conn.closed for conn in pool._returned_at)
+    assert set(db._prepared) <= set(pool._returned_at)
+
+
+def test_connection_closed_on_return_is_forgotten(connections):
+    pool = db.DatabasePool('dbname=test', minconn=1, maxconn=5)
+    conn = pool.getconn()
+    db.execute_prepared(conn.cursor(), 'test_select', (1,))
+    conn.status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN  # Server connection lost
+    pool.putconn(conn)
+
+    assert conn.closed
+    assert conn not in pool._returned_at
+    assert conn not in db._prepared
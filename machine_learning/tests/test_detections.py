@@ -0,0 +1,66 @@
+# tests/test_detections.py
+import pickle
+
+import numpy as np
+
+from models.detections import Detections, box_iou, merge_views
+
+NAMES = ('fire', 'smoke')
+
+
+def sample():
+    return Detections([[0, 0, 10, 10], [20, 20, 40, 40], [1, 1, 11, 11]], [0.4, 0.9, 0.7], [0, 1, 0], NAMES)
+
+
+def test_to_list_matches_the_api_contract():
+    assert Detections([[1, 2, 3, 4]], [0.5], [1], NAMES).to_list() == [
+        {'bbox': [1.0, 2.0, 3.0, 4.0], 'confidence': 0.5, 'class': 'smoke'}
+    ]
+    assert Detections([[1, 2, 3, 4]], [0.5], [7], NAMES).to_list()[0]['class'] == '7'  # Unknown id
+    assert Detections.empty(NAMES).to_list() == []
+
+
+def test_filter_orders_by_confidence_and_caps():
+    filtered = sample().filter(min_confidence=0.5, max_det=5)
+    assert filtered.confidences.tolist() == np.float32([0.9, 0.7]).tolist()
+    assert len(sample().filter(max_det=1)) == 1
+    assert sample().max_confidence() == np.float32(0.9)
+    assert Detections.empty().max_confidence() is None
+
+
+def test_bytes_and_pickle_round_trip():
+    detections = sample()
+    for restored in (Detections.from_bytes(detections.to_bytes(), NAMES), pickle.loads(pickle.dumps(detections))):
+        np.testing.assert_array_equal(restored.boxes, detections.boxes)
+        np.testing.assert_array_equal(restored.confidences, detections.confidences)
+        np.testing.assert_array_equal(restored.classes, detections.classes)
+        assert restored.class_names == NAMES
+    assert len(Detections.from_bytes(Detections.empty().to_bytes())) == 0
+
+
+def test_box_iou():
+    iou = box_iou(np.float32([[0, 0, 10, 10]]), np.float32([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]]))
+    np.testing.assert_allclose(iou, [[1.0, 1 / 3, 0.0]], rtol=1e-6)
+
+
+def test_nms_is_per_class():
+    kept = sample().nms(0.5)
+    assert sorted(kept.confidences.tolist()) == sorted(np.float32([0.9, 0.7]).tolist())
+    # Same boxes, different classes: both survive
+    assert len(Detections([[0, 0, 10, 10]] * 2, [0.9, 0.8], [0, 1], NAMES).nms(0.5)) == 2
+
+
+def test_fuse_weights_boxes_and_keeps_the_top_confidence():
+    fused = Detections([[0, 0, 10, 10], [2, 0, 12, 10]], [0.75, 0.25], [0, 0], NAMES).fuse(0.5)
+    assert len(fused) == 1
+    np.testing.assert_allclose(fused.boxes[0], [0.5, 0, 10.5, 10])
+    assert fused.confidences[0] == np.float32(0.75)
+
+
+def test_merge_views_maps_tiles_to_frame_coordinates():
+    whole = Detections([[50, 25, 70, 45]], [0.6], [0], NAMES)  # Frame downscaled by 2
+    tile = Detections([[0, 0, 40, 40]], [0.8], [0], NAMES)  # Same object in a tile at (100, 50)
+    merged = merge_views([whole, tile], [(0, 0, 2.0, 2.0), (100, 50, 1.0, 1.0)], 'nms', 0.5)
+    assert len(merged) == 1
+    np.testing.assert_allclose(merged.boxes[0], [100, 50, 140, 90])
+    assert merged.confidences[0] == np.float32(0.8)
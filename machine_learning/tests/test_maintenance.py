@@ -0,0 +1,88 @@
+# tests/test_maintenance.py
+import hashlib
+import os
+import time
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from app import maintenance, storage
+from app.cache import result_cache
+from config import Config
+
+
+class FakeConnection:
+    """Answers the two usage queries _remove_files runs from a set of referenced hashes."""
+
+    def __init__(self, referenced=()):
+        self.referenced = set(referenced)
+        self._result = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, params):
+        if 'EXISTS' in sql:
+            self._result = [(params[0] in self.referenced,)]
+        else:
+            self._result = [(h,) for h in params[0] if h in self.referenced]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'blob_store', storage.LocalBlobStore(str(tmp_path)))
+    monkeypatch.setattr(Config, 'RETENTION_DAYS', 30)
+    with Flask(__name__).app_context():
+        yield storage.blob_store
+
+
+def old_blob(store, data):
+    digest = hashlib.sha256(data).hexdigest()
+    key = store.put(data, '.jpg', digest)
+    long_ago = time.time() - 90 * 86400
+    os.utime(store.local_path(key), (long_ago, long_ago))
+    return key, digest
+
+
+CUTOFF = datetime.utcnow().replace(microsecond=0)
+
+
+def test_unused_blob_is_deleted_and_its_cache_entries_evicted(store):
+    key, digest = old_blob(store, b'frame-a')
+    cache_key = result_cache.make_key(digest, 'yolo', 'v1')
+    result_cache.put(cache_key, {'id': 1, 'image_path': key})
+
+    assert maintenance._remove_files(FakeConnection(), [(key, None, digest)], CUTOFF) == 1
+    assert not store.exists(key)
+    assert result_cache.get(cache_key, shared=False) is None
+
+
+def test_blob_uploaded_again_since_the_cutoff_is_kept(store):
+    key, digest = old_blob(store, b'frame-b')
+    store.put(b'frame-b', '.jpg', digest)  # Deduplicated upload whose row is not inserted yet
+
+    assert maintenance._remove_files(FakeConnection(), [(key, None, digest)], CUTOFF) == 0
+    assert store.exists(key)
+
+
+def test_blob_referenced_again_at_delete_time_is_kept(store, monkeypatch):
+    key, digest = old_blob(store, b'frame-c')
+    in_use = maintenance._in_use
+
+    def referenced_meanwhile(conn, table, content_hash):
+        conn.referenced.add(content_hash)  # A row sharing the blob landed after the first check
+        return in_use(conn, table, content_hash)
+
+    monkeypatch.setattr(maintenance, '_in_use', referenced_meanwhile)
+    assert maintenance._remove_files(FakeConnection(), [(key, None, digest)], CUTOFF) == 0
+    assert store.exists(key)
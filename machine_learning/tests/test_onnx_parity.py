@@ -0,0 +1,85 @@
+# tests/test_onnx_parity.py
+"""ONNX Runtime vs PyTorch output parity (the check ``python -m models.onnx_backend verify`` runs on the real weights).
+
+Small models with random weights are exported with the backend's own export
+functions: YOLOv8n, and a ConvNeXt-Tiny carrying the served classifier head.
+"""
+import glob
+import os
+
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+import torchvision.models as tv_models
+from PIL import Image
+
+pytest.importorskip('onnx')
+pytest.importorskip('onnxruntime')
+
+from models import onnx_backend, cnn as torch_cnn  # noqa: E402
+from preprocessing import preprocess_image_for_yolo, preprocess_batch_for_cnn  # noqa: E402
+
+TEST_IMAGES = sorted(glob.glob(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                            'test_images', '*.jpg')))
+
+
+def small_cnn():
+    torch.manual_seed(0)
+    model = tv_models.convnext_tiny(weights=None)
+    model.classifier[2] = nn.Sequential(nn.Linear(model.classifier[2].in_features, 1), nn.Sigmoid())
+    return model.eval()
+
+
+def test_cnn_onnx_matches_torch(tmp_path, monkeypatch):
+    model = small_cnn()
+    path = onnx_backend.export_cnn_onnx(model, tmp_path / 'cnn.onnx')
+    monkeypatch.setattr(onnx_backend, 'cnn_session', onnx_backend.create_session(path))
+    monkeypatch.setattr(torch_cnn, 'cnn_model', model)
+
+    batch = preprocess_batch_for_cnn([Image.open(p) for p in TEST_IMAGES]).cpu()
+    expected = torch_cnn.predict_with_cnn_batch(batch)
+    actual = onnx_backend.predict_with_cnn_batch(batch)
+    assert len(actual) == len(TEST_IMAGES)
+    assert -1.0 not in actual
+    np.testing.assert_allclose(actual, expected, atol=1e-4)
+
+
+def test_yolo_onnx_matches_torch(tmp_path):
+    from ultralytics import YOLO
+
+    torch.manual_seed(0)
+    model = YOLO('yolov8n.yaml')
+    path = onnx_backend.export_yolo_onnx(model, str(tmp_path / 'yolo.onnx'), simplify=False)
+    session = onnx_backend.create_session(path)
+
+    # Raw head output on identical input tensors
+    batch = onnx_backend._yolo_input([preprocess_image_for_yolo(Image.open(p)) for p in TEST_IMAGES])
+    with torch.no_grad():
+        expected = model.model.float().eval()(torch.from_numpy(batch))[0].numpy()
+    actual = session.run(None, {session.get_inputs()[0].name: batch})[0]
+    np.testing.assert_allclose(actual, expected, rtol=1e-3, atol=1e-3)
+
+
+def test_yolo_postprocess_matches_ultralytics_nms():
+    try:
+        from ultralytics.utils.nms import non_max_suppression
+    except ImportError:
+        from ultralytics.utils.ops import non_max_suppression
+
+    # A raw (4 + nc, anchors) output with distinct scores (untrained models score every anchor alike)
+    rng = np.random.default_rng(0)
+    anchors, classes = 2000, 3
+    centres = rng.uniform(0, 352, (2, anchors))
+    sizes = rng.uniform(10, 120, (2, anchors))
+    scores = rng.uniform(0, 1, (classes, anchors)) ** 4
+    raw = np.concatenate([centres, sizes, scores]).astype(np.float32)
+
+    ours = onnx_backend._yolo_postprocess(raw, conf=0.25, max_det=300)
+    reference = non_max_suppression(torch.from_numpy(raw[None]), conf_thres=0.25, iou_thres=onnx_backend.YOLO_NMS_IOU,
+                                    max_det=300)[0].numpy()
+    assert len(ours) == len(reference) > 0
+    order = np.argsort(-reference[:, 4], kind='stable')
+    np.testing.assert_allclose(ours.boxes, reference[order, :4], atol=1e-3)
+    np.testing.assert_allclose(ours.confidences, reference[order, 4], atol=1e-6)
+    np.testing.assert_array_equal(ours.classes, reference[order, 5].astype(np.int32))
@@ -0,0 +1,58 @@
+# tests/test_queries.py
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import queries
+
+
+def test_cursor_round_trip():
+    timestamp = datetime(2024, 7, 1, 12, 30, 5, 123456)
+    assert queries.decode_cursor(queries.encode_cursor(timestamp, 42)) == (timestamp, 42)
+
+
+@pytest.mark.parametrize('cursor', ['not-base64!', 'bm90IGpzb24=', queries.encode_cursor(datetime(2024, 1, 1), 1)[:-4]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        queries.decode_cursor(cursor)
+
+
+def test_keyset_condition_follows_the_index_order():
+    after = (datetime(2024, 1, 1), 7)
+    where, params = queries._where(model_type='yolo', after=after)
+    assert where == " WHERE model_type = %s AND (timestamp, id) < (%s, %s)"
+    assert params == ['yolo', after[0], 7]
+
+
+@pytest.fixture
+def table(monkeypatch):
+    """Seven rows, several sharing a timestamp, served by a fake that applies the keyset condition."""
+    base = datetime(2024, 1, 1)
+    rows = [(result_id, f'{result_id}.jpg', 'yolo', base + timedelta(seconds=result_id // 3), 'done', None, 0.5, 0.1, 1)
+            for result_id in range(1, 8)]
+
+    def fetch_all(sql, params):
+        ordered = sorted(rows, key=lambda row: (row[3], row[0]), reverse=True)
+        if '(timestamp, id) <' in sql:
+            after = (params[-3], params[-2])
+            ordered = [row for row in ordered if (row[3], row[0]) < after]
+        return ordered[:params[-1]]
+
+    monkeypatch.setattr(queries, '_fetch_all', fetch_all)
+    return rows
+
+
+def test_pages_cover_every_row_once_in_order(table):
+    seen, cursor = [], None
+    while True:
+        page, cursor = queries.list_results(limit=3, cursor=cursor)
+        assert len(page) <= 3
+        seen.extend(row['id'] for row in page)
+        if cursor is None:
+            break
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_last_full_page_has_no_next_cursor(table):
+    page, cursor = queries.list_results(limit=7)
+    assert len(page) == 7 and cursor is None
@@ -0,0 +1,50 @@
+# tests/test_tiling.py
+import numpy as np
+import pytest
+from PIL import Image
+
+from models.detections import Detections
+from preprocessing import tile_grid, tile_image_for_yolo, yolo_frame_mapping, YOLO_INPUT_SIZE
+
+
+def assert_covers(width, height, corners, side):
+    covered = np.zeros((height, width), dtype=bool)
+    for x, y in corners:
+        assert 0 <= x < width and 0 <= y < height
+        covered[y:y + side, x:x + side] = True
+    assert covered.all()
+
+
+@pytest.mark.parametrize('width, height', [
+    (5000, 200), (200, 5000), (641, 100), (100000, 50), (1920, 1080), (3840, 2160), (8000, 6000), (641, 641),
+])
+def test_grid_respects_max_tiles_and_covers_the_frame(width, height):
+    corners, side = tile_grid(width, height, 640, overlap=0.2, max_tiles=16)
+    assert 1 <= len(corners) <= 16
+    assert_covers(width, height, corners, side)
+
+
+def test_extreme_aspect_ratio_keeps_tiles_at_least_tile_size():
+    corners, side = tile_grid(5000, 200, 640, max_tiles=16)
+    assert side >= 640 and len(corners) <= 16
+    assert {y for _, y in corners} == {0}  # One row, letterboxed below the frame
+
+
+def test_small_frame_is_one_tile():
+    assert tile_grid(600, 400, 640) == ([(0, 0)], 600)
+
+
+def test_tiles_are_model_sized_and_mappings_reach_frame_pixels():
+    image = Image.new('RGB', (3000, 150), 'white')
+    arrays, mappings = tile_image_for_yolo(image, tile_size=640, overlap=0.2, max_tiles=16)
+    assert len(arrays) == len(mappings) <= 17
+    assert all(array.shape == (YOLO_INPUT_SIZE[1], YOLO_INPUT_SIZE[0], 3) for array in arrays)
+    # Letterboxed tiles: the part past the frame edge is black, not stretched image
+    assert arrays[1][-1].max() == 0 and arrays[1][0].min() == 255
+
+    box = Detections([[0, 0, *YOLO_INPUT_SIZE]], [0.9], [0])
+    np.testing.assert_allclose(box.transformed(*mappings[0]).boxes[0], [0, 0, 3000, 150], rtol=1e-6)
+
+
+def test_whole_frame_mapping():
+    assert yolo_frame_mapping(1920, 1080) == (0.0, 0.0, 1920 / YOLO_INPUT_SIZE[0], 1080 / YOLO_INPUT_SIZE[1])
@@ -0,0 +1,80 @@
+# tests/test_uploads.py
+import io
+import zipfile
+
+import pytest
+from flask import Flask
+from PIL import Image
+
+from app import api
+from app.api import BatchBudget, iter_archive_images
+from app.utils import UploadedImage, UploadError
+
+
+def png_bytes(size=(64, 48)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'green').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_valid_upload_is_spooled_hashed_and_sized():
+    data = png_bytes()
+    with UploadedImage.from_stream(io.BytesIO(data), 'frame.png', chunk_size=7) as upload:
+        assert upload.extension == '.png'
+        assert upload.size == len(data)
+        assert upload.dimensions == (64, 48)
+        assert upload.open().read() == data
+    assert upload._file.closed
+
+
+def test_size_limit():
+    with pytest.raises(UploadError) as error:
+        UploadedImage.from_stream(io.BytesIO(png_bytes()), 'frame.png', max_bytes=10)
+    assert error.value.status == 413
+
+
+@pytest.mark.parametrize('data', [b'', b'not an image at all', b'\x89PNG\r\n\x1a\n' + b'\x00' * 32])
+def test_empty_or_invalid_content_is_rejected(data):
+    with pytest.raises(UploadError) as error:
+        UploadedImage.from_stream(io.BytesIO(data), 'frame.jpg')
+    assert error.value.status == 400
+
+
+def test_pixel_limit_is_explicit_and_not_process_global():
+    pillow_limit = Image.MAX_IMAGE_PIXELS
+    with pytest.raises(UploadError) as error:
+        UploadedImage.from_stream(io.BytesIO(png_bytes((100, 100))), 'frame.png', max_pixels=100 * 99)
+    assert error.value.status == 413
+    assert UploadedImage.from_stream(io.BytesIO(png_bytes((100, 100))), 'frame.png', max_pixels=100 * 100)
+    assert Image.MAX_IMAGE_PIXELS == pillow_limit
+
+
+def zip_with(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def test_archive_members_go_through_the_same_checks(monkeypatch):
+    monkeypatch.setattr(api.Config, 'MAX_IMAGE_PIXELS', 50 * 50)
+    images = list(iter_archive_images(zip_with([('ok.png', png_bytes((40, 40))), ('fake.jpg', b'plain text')]),
+                                      'application/zip', BatchBudget()))
+    assert [image.filename for image in images] == ['ok.png']  # Not an image: skipped like a multipart file
+    assert images[0].extension == '.png'
+
+    with pytest.raises(UploadError) as error:
+        list(iter_archive_images(zip_with([('huge.png', png_bytes((60, 60)))]), 'application/zip', BatchBudget()))
+    assert error.value.status == 413 and error.value.message.startswith('huge.png')
+
+
+def test_uploads_are_closed_when_the_request_ends():
+    app = Flask(__name__)
+    app.register_blueprint(api.bp)
+    with app.test_request_context('/health'):
+        upload = api.track_upload(UploadedImage.from_stream(io.BytesIO(png_bytes()), 'frame.png'))
+        assert not upload._file.closed
+        app.do_teardown_request()
+    assert upload._file.closed
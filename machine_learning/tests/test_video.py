@@ -0,0 +1,213 @@
+# tests/test_video.py
+import io
+import json
+import os
+import runpy
+import sys
+
+import cv2
+import numpy as np
+import pytest
+from flask import Flask
+
+import app.inference
+from app import api, video
+from app.video import VideoError, VideoIngestor, spool_video
+from config import Config
+from models.detections import Detections
+from preprocessing import yolo_frame_mapping, YOLO_INPUT_SIZE
+
+
+def write_clip(path, frames=10, fps=10, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), fps, size)
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), i * 20, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+@pytest.fixture
+def clip(tmp_path):
+    return write_clip(tmp_path / 'clip.avi')
+
+
+@pytest.fixture
+def cnn(monkeypatch):
+    """Stub CNN forward: records batch sizes and hands out the queued probabilities in frame order."""
+    calls = {'sizes': [], 'probabilities': []}
+
+    def predict_cnn_batch(input_tensor):
+        calls['sizes'].append(input_tensor.shape[0])
+        return [calls['probabilities'].pop(0) if calls['probabilities'] else 0.0 for _ in range(input_tensor.shape[0])]
+
+    monkeypatch.setattr(video, 'predict_cnn_batch', predict_cnn_batch)
+    monkeypatch.setattr(video, 'model_version', lambda name: f'{name}-test')
+    monkeypatch.setattr(Config, 'CNN_CONFIDENCE_THRESHOLD', 0.5)
+    return calls
+
+
+def test_every_stride_th_frame_is_scored_in_batches(clip, cnn):
+    cnn['probabilities'] = [0.1, 0.2, 0.9, 0.6]
+    ingestor = VideoIngestor()
+    result = ingestor.score(clip, 'cnn', stride=3, batch_size=3)
+
+    assert [f['frame_index'] for f in result['frames']] == [0, 3, 6, 9]
+    assert [f['time_seconds'] for f in result['frames']] == [0.0, 0.3, 0.6, 0.9]
+    assert cnn['sizes'] == [3, 1]  # The last partial batch is flushed at the end of the clip
+    assert result['model_version'] == 'cnn-test'
+    assert (result['frame_stride'], result['fps'], result['width'], result['height']) == (3, 10.0, 64, 48)
+    assert result['duration_seconds'] == pytest.approx(1.0)
+    assert result['frames_decoded'] == 10
+    assert result['frames_scored'] == 4
+    assert result['positive_frames'] == 2
+    assert result['first_positive_seconds'] == 0.6
+    assert result['max_cnn_probability'] == 0.9
+    assert result['mean_cnn_probability'] == pytest.approx(0.45)
+    assert result['max_confidence'] is None
+
+    stats = ingestor.stats()
+    assert (stats['clips'], stats['failed'], stats['frames_decoded'], stats['frames_scored'], stats['batches']) == \
+        (1, 0, 10, 4, 2)
+
+
+def test_max_frames_stops_decoding_early(clip, cnn):
+    result = VideoIngestor().score(clip, 'cnn', stride=2, max_frames=2, batch_size=8)
+    assert [f['frame_index'] for f in result['frames']] == [0, 2]
+    assert cnn['sizes'] == [2]
+    assert result['frames_decoded'] == 3  # Nothing past the last scored frame is read
+    assert result['positive_frames'] == 0 and result['first_positive_seconds'] is None
+
+
+def test_yolo_boxes_are_reported_in_frame_pixels(clip, monkeypatch):
+    sizes = []
+
+    def detect_yolo_batch(image_arrays):
+        sizes.append(len(image_arrays))
+        return [Detections([[0, 0, *YOLO_INPUT_SIZE]], [0.8], [0]) if i == 1 else Detections.empty()
+                for i in range(len(image_arrays))]
+
+    monkeypatch.setattr(video, 'detect_yolo_batch', detect_yolo_batch)
+    monkeypatch.setattr(video, 'model_version', lambda name: f'{name}-test')
+    result = VideoIngestor().score(clip, 'yolo', stride=5, batch_size=4)
+
+    assert sizes == [2]
+    assert [f['frame_index'] for f in result['frames']] == [0, 5]
+    assert result['frames'][0]['yolo_detections'] == [] and result['frames'][0]['max_confidence'] is None
+    box = result['frames'][1]['yolo_detections'][0]['bbox']
+    expected = Detections([[0, 0, *YOLO_INPUT_SIZE]], [0.8], [0]).transformed(*yolo_frame_mapping(64, 48))
+    np.testing.assert_allclose(box, expected.boxes[0], rtol=1e-6)
+    np.testing.assert_allclose(box, [0, 0, 64, 48], rtol=1e-6)
+    assert result['positive_frames'] == 1 and result['first_positive_seconds'] == 0.5
+    assert result['max_confidence'] == pytest.approx(0.8)
+    assert result['max_cnn_probability'] is None and result['mean_cnn_probability'] is None
+
+
+@pytest.mark.parametrize('data', [b'', b'not a video at all'])
+def test_unreadable_video_is_rejected(tmp_path, cnn, data):
+    path = tmp_path / 'broken.mp4'
+    path.write_bytes(data)
+    ingestor = VideoIngestor()
+    with pytest.raises(VideoError) as error:
+        ingestor.score(str(path), 'cnn')
+    assert error.value.message == 'Invalid video' and error.value.status == 400
+    assert ingestor.stats()['failed'] == 1 and ingestor.stats()['clips'] == 0
+    assert cnn['sizes'] == []
+
+
+def test_decoder_failure_is_reported(clip, cnn, monkeypatch):
+    def frame_input(frame, model_type):
+        raise ValueError('bad frame')
+
+    monkeypatch.setattr(video, 'frame_input', frame_input)
+    with pytest.raises(VideoError) as error:
+        VideoIngestor().score(clip, 'cnn')
+    assert error.value.message == 'Failed to decode video: bad frame'
+
+
+def test_unloaded_cnn_fails_the_clip(clip, cnn):
+    cnn['probabilities'] = [-1.0]
+    with pytest.raises(VideoError) as error:
+        VideoIngestor().score(clip, 'cnn', stride=5)
+    assert error.value.status == 500
+
+
+def test_spool_hashes_and_enforces_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(video.tempfile, 'tempdir', str(tmp_path))
+    path, digest = spool_video(io.BytesIO(b'x' * 100), 'mp4', max_bytes=100, chunk_size=7)
+    with open(path, 'rb') as f:
+        assert f.read() == b'x' * 100
+    assert path.endswith('.mp4') and digest == video.file_digest(path)
+    os.remove(path)
+
+    with pytest.raises(VideoError) as error:
+        spool_video(io.BytesIO(b'x' * 101), 'mp4', max_bytes=100, chunk_size=7)
+    assert error.value.status == 413
+    with pytest.raises(VideoError) as error:
+        spool_video(io.BytesIO(b''), 'mp4')
+    assert error.value.message == 'No video provided'
+    assert os.listdir(tmp_path) == []  # Rejected spools are removed
+
+
+@pytest.fixture
+def client(monkeypatch):
+    saved = []
+
+    def save_clip(clip, *args):
+        saved.append(([f['frame_index'] for f in clip['frames']], args))  # The endpoint drops 'frames' afterwards
+        return len(saved)
+
+    monkeypatch.setattr(api, 'store_video', lambda path, extension, digest: f'videos/{digest}.{extension}')
+    monkeypatch.setattr(api, 'save_clip', save_clip)
+    app = Flask(__name__)
+    app.register_blueprint(api.bp)
+    test_client = app.test_client()
+    test_client.saved = saved
+    return test_client
+
+
+def test_endpoint_scores_stores_and_summarizes(clip, cnn, client):
+    cnn['probabilities'] = [0.7, 0.1]
+    with open(clip, 'rb') as f:
+        response = client.post('/predict/video', data={'model_type': 'cnn', 'stride': '5', 'video': (f, 'clip.avi')})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['id'] == 1 and body['frames_url'] == '/videos/1'
+    assert body['original_filename'] == 'clip.avi'
+    assert body['frames_scored'] == 2 and body['positive_frames'] == 1
+    assert 'frames' not in body  # Served by /videos/<id>
+    (frame_indices, (filename, video_path, content_hash)), = client.saved
+    assert frame_indices == [0, 5]
+    assert filename == 'clip.avi' and video_path == f'videos/{content_hash}.avi'
+    assert content_hash == video.file_digest(clip)
+
+
+@pytest.mark.parametrize('data, error', [
+    ({'model_type': 'svm'}, 'model_type must be "cnn" or "yolo"'),
+    ({'model_type': 'cnn'}, 'No video provided'),
+    ({'model_type': 'cnn', 'video': (io.BytesIO(b'x'), 'clip.gif')}, 'Invalid video format'),
+    ({'model_type': 'cnn', 'stride': '0', 'video': (io.BytesIO(b'x'), 'clip.mp4')},
+     'stride and max_frames must be positive'),
+    ({'model_type': 'cnn', 'video': (io.BytesIO(b'not a video'), 'clip.mp4')}, 'Invalid video'),
+])
+def test_endpoint_rejects_bad_requests(cnn, client, data, error):
+    response = client.post('/predict/video', data=data)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+    assert client.saved == []
+
+
+@pytest.mark.filterwarnings('ignore::RuntimeWarning')  # runpy re-executes the already imported app.video
+def test_cli_prints_the_summary_without_saving(clip, monkeypatch, capsys):
+    monkeypatch.setattr(app.inference, 'load_models', lambda: None)
+    monkeypatch.setattr(app.inference, 'model_version', lambda name: f'{name}-test')
+    monkeypatch.setattr(app.inference, 'predict_cnn_batch', lambda input_tensor: [0.8] * input_tensor.shape[0])
+    monkeypatch.setattr(sys, 'argv', ['app.video', clip, '--model-type', 'cnn', '--stride', '4', '--batch-size', '2',
+                                      '--no-save'])
+    runpy.run_module('app.video', run_name='__main__')
+
+    output = json.loads(capsys.readouterr().out)
+    assert 'frames' not in output['clip'] and 'id' not in output['clip']
+    assert output['clip']['frames_scored'] == 3 and output['clip']['positive_frames'] == 3
+    assert output['clip']['model_version'] == 'cnn-test'
+    assert output['pipeline']['clips'] == 1 and output['pipeline']['batches'] == 2
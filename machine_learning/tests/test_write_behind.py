@@ -0,0 +1,74 @@
+# tests/test_write_behind.py
+import json
+
+import psycopg2
+import pytest
+from flask import Flask
+
+from app import write_behind
+
+
+class FakeConnection:
+    closed = 0
+
+    def __init__(self):
+        self.rows = []
+        self.statements = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def db(monkeypatch):
+    conn = FakeConnection()
+
+    def execute_values(cur, sql, rows, page_size=None):
+        if any(row[1] == 'bad' for row in rows):
+            raise psycopg2.DataError('invalid input syntax')
+        conn.rows.extend(rows)
+
+    monkeypatch.setattr(write_behind, 'execute_values', execute_values)
+    monkeypatch.setattr(write_behind, 'get_db_connection', lambda: conn)
+    monkeypatch.setattr(write_behind, 'close_db_connection', lambda c: None)
+    return conn
+
+
+@pytest.fixture
+def writer(tmp_path):
+    app = Flask(__name__)
+    writer = write_behind.ResultWriter(app, 'original_filename', spill_path=str(tmp_path / 'spill.jsonl'))
+    with app.app_context():
+        yield writer
+
+
+def buffer_rows(writer, rows):
+    writer._buffer.extend(rows)
+    writer._pending_ids.update(row[0] for row in rows)
+
+
+def test_rejected_row_is_spilled_and_the_rest_written(db, writer):
+    buffer_rows(writer, [(1, 'a.jpg'), (2, 'bad'), (3, 'c.jpg')])
+    assert writer.flush()
+    assert db.rows == [(1, 'a.jpg'), (3, 'c.jpg')]
+    with open(writer.spill_path) as f:
+        assert [json.loads(line) for line in f] == [[2, 'bad']]
+    stats = writer.stats()
+    assert stats['buffered'] == 0 and stats['rejected_rows'] == 1 and stats['flushed_rows'] == 2
+    assert not writer._pending_ids
+
+
+def test_unreachable_database_keeps_the_batch(monkeypatch, writer):
+    monkeypatch.setattr(write_behind, 'get_db_connection', lambda: None)
+    buffer_rows(writer, [(1, 'a.jpg'), (2, 'b.jpg')])
+    assert not writer.flush()
+    assert writer.stats()['buffered'] == 2